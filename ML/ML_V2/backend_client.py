@@ -1,19 +1,74 @@
 # backend_client.py
+import os
+import time
+import asyncio
 import httpx
 from datetime import datetime
 
 BACKEND_URL = "http://127.0.0.1:3000/api/results"
 
-async def send_results_to_backend(filename: str, result: dict):
+# ----> Forwarding settings
+# BACKEND_MAX_CONNECTIONS / BACKEND_MAX_KEEPALIVE: limits of the shared client
+# BACKEND_BATCH_WINDOW_MS: > 0 merges the results of images finished within this window into one call
+# BACKEND_BATCH_MAX_IMAGES: a batch is sent early once it holds this many images
+BACKEND_MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", "20"))
+BACKEND_MAX_KEEPALIVE = int(os.getenv("BACKEND_MAX_KEEPALIVE", "10"))
+BACKEND_BATCH_WINDOW_MS = float(os.getenv("BACKEND_BATCH_WINDOW_MS", "0"))
+BACKEND_BATCH_MAX_IMAGES = int(os.getenv("BACKEND_BATCH_MAX_IMAGES", "16"))
+
+_client = None
+_pending = []
+_flush_timer = None
+_metrics = {"calls": 0, "images": 0, "errors": 0, "latency_sum_ms": 0.0, "latency_max_ms": 0.0, "last_error": None}
+
+
+def get_client() -> httpx.AsyncClient:
     """
-    Send structured detection results to Go backend.
+    Shared client for the lifetime of the server, so calls reuse keep-alive connections.
+    Returns:
+        httpx.AsyncClient: Client limited to BACKEND_MAX_CONNECTIONS connections.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=40.0,
+            limits=httpx.Limits(max_connections=BACKEND_MAX_CONNECTIONS,
+                                max_keepalive_connections=BACKEND_MAX_KEEPALIVE),
+        )
+    return _client
+
+
+async def close_client():
+    """Send any pending batch and close the shared client (call on shutdown)."""
+    global _client
+    if _pending:
+        await _flush()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def backend_stats() -> dict:
+    """
+    Latency and error metrics of the calls to the Go backend.
+    Returns:
+        dict: Call/image/error counts and average/max latency in milliseconds.
+    """
+    stats = dict(_metrics)
+    stats["avg_latency_ms"] = round(stats["latency_sum_ms"] / stats["calls"], 1) if stats["calls"] else None
+    return stats
+
+
+def build_structured_result(filename: str, result: dict) -> dict:
+    """
+    Build the backend payload for one image.
     Args:
         filename (str): Name of the processed image.
         result (dict): Detection result from YOLO + OCR.
     Returns:
-        dict: Status and message of the backend call.
+        dict: Payload with meta, images and annotations.
     """
-    structured_result = {
+    return {
         "meta": {
             "tool": "Khmer Data Annotation Tool",
             "lang": "khm",
@@ -35,23 +90,79 @@ async def send_results_to_backend(filename: str, result: dict):
         }
     }
 
+
+async def _post(structured_result: dict, images: int):
     backend_status = "skipped"
     backend_message = "Backend call skipped or failed"
 
+    started = time.perf_counter()
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                BACKEND_URL,
-                json=structured_result,
-                headers={"Content-Type": "application/json"},
-                timeout=40.0
-            )
-            response.raise_for_status()
-            backend_status = "success"
-            backend_message = "Results sent to backend successfully"
-            print("Backend response:", response.text)
+        response = await get_client().post(
+            BACKEND_URL,
+            json=structured_result,
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+        backend_status = "success"
+        backend_message = "Results sent to backend successfully"
+        print("Backend response:", response.text)
     except Exception as e:
         backend_status = "failed"
         backend_message = f"Failed to send to backend: {str(e)}"
+        _metrics["errors"] += 1
+        _metrics["last_error"] = str(e)
+
+    latency_ms = (time.perf_counter() - started) * 1000
+    _metrics["calls"] += 1
+    _metrics["images"] += images
+    _metrics["latency_sum_ms"] += latency_ms
+    _metrics["latency_max_ms"] = max(_metrics["latency_max_ms"], latency_ms)
+    return backend_status, backend_message
+
+
+async def _flush():
+    """Merge the pending payloads into one (images list + annotations map) and send it."""
+    global _pending, _flush_timer
+    batch, _pending = _pending, []
+    if _flush_timer is not None:
+        _flush_timer.cancel()
+        _flush_timer = None
+    if not batch:
+        return
+
+    merged = {"meta": batch[0][0]["meta"], "images": [], "annotations": {}}
+    for structured_result, _ in batch:
+        merged["images"].extend(structured_result["images"])
+        merged["annotations"].update(structured_result["annotations"])
+    outcome = await _post(merged, len(batch))
+    for _, future in batch:
+        if not future.done():
+            future.set_result(outcome)
+
+
+async def send_results_to_backend(filename: str, result: dict):
+    """
+    Send structured detection results to Go backend.
+    With BACKEND_BATCH_WINDOW_MS > 0, results of several images are sent in one call.
+    Args:
+        filename (str): Name of the processed image.
+        result (dict): Detection result from YOLO + OCR.
+    Returns:
+        dict: Status and message of the backend call.
+    """
+    global _flush_timer
+    structured_result = build_structured_result(filename, result)
+
+    if BACKEND_BATCH_WINDOW_MS > 0:
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        _pending.append((structured_result, future))
+        if len(_pending) >= BACKEND_BATCH_MAX_IMAGES:
+            asyncio.ensure_future(_flush())
+        elif _flush_timer is None:
+            _flush_timer = loop.call_later(BACKEND_BATCH_WINDOW_MS / 1000.0, lambda: asyncio.ensure_future(_flush()))
+        backend_status, backend_message = await future
+    else:
+        backend_status, backend_message = await _post(structured_result, 1)
 
     return {"status": backend_status, "message": backend_message, "structured_result": structured_result}
@@ -0,0 +1,185 @@
+# detection_batcher.py
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+import cv2
+from model_registry import get_model_registry
+
+# ----> Micro-batching settings
+# YOLO_BATCH_MAX_SIZE: images detected together in one forward pass (1 disables batching)
+# YOLO_BATCH_WAIT_MS: how long the first image of a batch waits for others to join (0 disables batching)
+# YOLO_BATCH_IMGSZ: side of the square every image is letterboxed to, so the batch stacks into one tensor
+YOLO_BATCH_MAX_SIZE = int(os.getenv("YOLO_BATCH_MAX_SIZE", "8"))
+YOLO_BATCH_WAIT_MS = float(os.getenv("YOLO_BATCH_WAIT_MS", "5"))
+YOLO_BATCH_IMGSZ = int(os.getenv("YOLO_BATCH_IMGSZ", "640"))
+
+LETTERBOX_COLOR = (114, 114, 114)  # ultralytics' own padding value
+
+
+def letterbox(image: np.ndarray, size: int):
+    """
+    Resize an image to fit a size x size square, keeping its aspect ratio, and pad the rest.
+    Args:
+        image (np.ndarray): HxWx3 image.
+        size (int): Side of the output square.
+    Returns:
+        tuple: (square image, scale, (pad_left, pad_top)).
+    """
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    new_width, new_height = max(1, round(width * scale)), max(1, round(height * scale))
+    if (new_width, new_height) != (width, height):
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        image = cv2.resize(image, (new_width, new_height), interpolation=interpolation)
+    pad_left, pad_top = (size - new_width) // 2, (size - new_height) // 2
+    padded = cv2.copyMakeBorder(image, pad_top, size - new_height - pad_top, pad_left, size - new_width - pad_left,
+                                cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    return padded, scale, (pad_left, pad_top)
+
+
+def unletterbox(detections: np.ndarray, scale: float, pad, shape) -> np.ndarray:
+    """Map (N, 6) [x1, y1, x2, y2, conf, cls] rows from the letterboxed square back to the original image."""
+    detections = detections.copy()
+    detections[:, [0, 2]] = ((detections[:, [0, 2]] - pad[0]) / scale).clip(0, shape[1])
+    detections[:, [1, 3]] = ((detections[:, [1, 3]] - pad[1]) / scale).clip(0, shape[0])
+    return detections
+
+
+class DetectionBatcher:
+    """
+    Collects concurrent detection calls and runs them as one batched YOLO inference.
+    The first pending image opens a batch; images that arrive within YOLO_BATCH_WAIT_MS join it
+    until YOLO_BATCH_MAX_SIZE is reached. Every image is letterboxed to YOLO_BATCH_IMGSZ, the batch
+    goes through the model once, and each caller gets its own boxes in its own image coordinates.
+    Callers block in detect() (they run in executor threads, like run_yolo_ocr).
+    """
+
+    def __init__(self, max_size: int = YOLO_BATCH_MAX_SIZE, wait_ms: float = YOLO_BATCH_WAIT_MS,
+                 imgsz: int = YOLO_BATCH_IMGSZ):
+        self.max_size = max(1, max_size)
+        self.wait = wait_ms / 1000.0
+        self.imgsz = imgsz
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._batch_sizes = [0] * (self.max_size + 1)
+        self._metrics = {"batches": 0, "images": 0, "errors": 0, "wait_ms_sum": 0.0, "inference_ms_sum": 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 1 and self.wait > 0
+
+    def detect(self, image: np.ndarray, model_name: str = None) -> np.ndarray:
+        """
+        Detect text regions in one image.
+        Args:
+            image (np.ndarray): HxWx3 image, as passed to the model before.
+            model_name (str): Model from YOLO_MODELS (default: YOLO_DEFAULT_MODEL).
+        Returns:
+            np.ndarray: (N, 6) rows of [x1, y1, x2, y2, confidence, class id] in image coordinates.
+        """
+        if not self.enabled:
+            started = time.perf_counter()
+            results = get_model_registry().get(model_name).predict(image)
+            self._record(1, 0.0, (time.perf_counter() - started) * 1000)
+            return results[0].boxes.data.cpu().numpy()
+
+        future = Future()
+        self._queue.put((image, model_name, time.perf_counter(), future))
+        self._ensure_worker()
+        return future.result()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="yolo-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[2] + self.wait
+        while len(batch) < self.max_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[1], []).append(item)
+            for model_name, items in groups.items():
+                self._infer(model_name, items)
+
+    def _infer(self, model_name, items):
+        started = time.perf_counter()
+        wait_ms = sum((started - enqueued) * 1000 for _, _, enqueued, _ in items)
+        try:
+            model = get_model_registry().get(model_name)
+            boxed = [letterbox(image, self.imgsz) for image, _, _, _ in items]
+            results = model.predict([square for square, _, _ in boxed], imgsz=self.imgsz, verbose=False)
+            outputs = [unletterbox(result.boxes.data.cpu().numpy(), scale, pad, image.shape)
+                       for (image, _, _, _), (_, scale, pad), result in zip(items, boxed, results)]
+        except Exception as e:
+            with self._lock:
+                self._metrics["errors"] += 1
+            for _, _, _, future in items:
+                future.set_exception(e)
+            return
+        self._record(len(items), wait_ms, (time.perf_counter() - started) * 1000)
+        for (_, _, _, future), output in zip(items, outputs):
+            future.set_result(output)
+
+    def _record(self, size, wait_ms, inference_ms):
+        with self._lock:
+            self._batch_sizes[min(size, self.max_size)] += 1
+            self._metrics["batches"] += 1
+            self._metrics["images"] += size
+            self._metrics["wait_ms_sum"] += wait_ms
+            self._metrics["inference_ms_sum"] += inference_ms
+
+    def stats(self) -> dict:
+        """
+        Batch-size histogram and timings.
+        Returns:
+            dict: Batches per batch size, average batch size, queue wait per image and inference time per batch.
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+            sizes = list(self._batch_sizes)
+        batches, images = metrics["batches"], metrics["images"]
+        return {
+            "enabled": self.enabled,
+            "max_size": self.max_size,
+            "wait_ms": self.wait * 1000,
+            "imgsz": self.imgsz,
+            "batches": batches,
+            "images": images,
+            "errors": metrics["errors"],
+            "batch_size_histogram": {str(size): count for size, count in enumerate(sizes) if size > 0},
+            "avg_batch_size": round(images / batches, 2) if batches else None,
+            "avg_wait_ms": round(metrics["wait_ms_sum"] / images, 2) if images else None,
+            "avg_inference_ms": round(metrics["inference_ms_sum"] / batches, 1) if batches else None,
+        }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_detection_batcher() -> DetectionBatcher:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = DetectionBatcher()
+        return _batcher
@@ -1,6 +1,6 @@
 import cv2
 import json
-from ultralytics import YOLO
+from model_registry import get_model_registry
 import httpx
 
 async def send_results_to_backend(structured_result):
@@ -16,11 +16,12 @@ async def send_results_to_backend(structured_result):
         return response.json()
 
 def run_yolo_detection(image_path, model_path, output_image_path, output_json_path, conf=0.25):
-    model = YOLO(model_path)
+    # the registry keeps the model loaded between calls instead of reloading best.pt per image
+    model = get_model_registry().get(model_path)
     img = cv2.imread(image_path)
     img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
-    results = model.predict(source=image_path, conf=conf)
+    results = model.predict(image_path, conf=conf)
 
     detections_data = {
         "image_path": image_path,
@@ -35,7 +36,7 @@ def run_yolo_detection(image_path, model_path, output_image_path, output_json_pa
             x1, y1, x2, y2 = map(int, box)
             confidence = float(r.boxes.conf[i].cpu().numpy())
             class_id = int(r.boxes.cls[i].cpu().numpy())
-            class_name = model.names[class_id] if hasattr(model, "names") else None
+            class_name = model.names[class_id] if model.names else None
 
             detection_info = {
                 "detection_id": detection_id,
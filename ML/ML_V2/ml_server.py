@@ -4,7 +4,9 @@ import pytesseract
 import os
 import asyncio
 from utils.detection_utils import run_yolo_detection
-from backend_client import send_results_to_backend
+from backend_client import send_results_to_backend, close_client, backend_stats
+from model_registry import get_model_registry
+from detection_batcher import get_detection_batcher
 
 # ----> Setup Tesseract
 pytesseract.pytesseract.tesseract_cmd = r"/opt/homebrew/bin/tesseract"
@@ -51,6 +53,28 @@ async def process_image(image: UploadFile = File(...)):
             "message": f"Processing error: {str(e)}"
         }
 
+@app.get("/backend/stats")
+async def get_backend_stats():
+    return backend_stats()
+
+@app.get("/models/stats")
+async def get_model_stats():
+    return get_model_registry().stats()
+
+@app.get("/detection/stats")
+async def get_detection_stats():
+    return get_detection_batcher().stats()
+
+@app.on_event("startup")
+async def load_models():
+    # Load and warm up the detector before the first request instead of inside it
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, get_model_registry().warm_up)
+
+@app.on_event("shutdown")
+async def shutdown_backend_client():
+    await close_client()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,187 @@
+# model_registry.py
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from ultralytics import YOLO
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(SCRIPT_DIR, "../best.pt")
+
+# ----> Model registry settings
+# YOLO_MODELS: named detectors as "name=path,name=path" (default: "default=../best.pt")
+# YOLO_DEFAULT_MODEL: name used when a caller does not ask for a specific model
+# YOLO_MAX_RESIDENT: models kept loaded at once; the least recently used one is dropped beyond that
+# YOLO_WARMUP_SIZE: side of the blank image used for the warm-up inference (0 disables warm-up)
+YOLO_MODELS = os.getenv("YOLO_MODELS", f"default={DEFAULT_MODEL_PATH}")
+YOLO_DEFAULT_MODEL = os.getenv("YOLO_DEFAULT_MODEL", "default")
+YOLO_MAX_RESIDENT = int(os.getenv("YOLO_MAX_RESIDENT", "2"))
+YOLO_WARMUP_SIZE = int(os.getenv("YOLO_WARMUP_SIZE", "640"))
+
+
+def parse_model_paths(spec: str) -> dict:
+    """
+    Parse the YOLO_MODELS setting.
+    Args:
+        spec (str): "name=path,name=path"; relative paths are relative to this folder.
+    Returns:
+        dict: Model name -> absolute weights path.
+    """
+    models = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, path = entry.partition("=")
+        models[name.strip()] = os.path.abspath(os.path.join(SCRIPT_DIR, path.strip()))
+    return models
+
+
+def weights_version(path: str) -> str:
+    """Version of a weights file: its modification time and size, so a retrained best.pt counts as new."""
+    stat = os.stat(path)
+    return f"{int(stat.st_mtime)}-{stat.st_size}"
+
+
+class LoadedModel:
+    """
+    One resident detector.
+    ultralytics keeps per-call state on the model (the predictor), so calls are serialised
+    with a lock; the model itself is shared by every request.
+    """
+
+    def __init__(self, name: str, path: str, version: str):
+        self.name = name
+        self.path = path
+        self.version = version
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.last_used = None
+
+        started = time.perf_counter()
+        self.model = YOLO(path)
+        self.load_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.warmup_ms = None
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def warm_up(self, size: int = YOLO_WARMUP_SIZE):
+        """Run one inference on a blank image, so the first real request doesn't pay for lazy setup."""
+        if size <= 0 or self.warmup_ms is not None:
+            return
+        started = time.perf_counter()
+        self.predict(np.zeros((size, size, 3), dtype=np.uint8), verbose=False)
+        self.warmup_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    def predict(self, source, **kwargs):
+        """
+        Thread-safe model.predict.
+        Args:
+            source: Image path, numpy array, PIL image or a list of them.
+            **kwargs: Passed to ultralytics (conf, iou, imgsz, verbose...).
+        Returns:
+            list: ultralytics Results, one per image.
+        """
+        with self.lock:
+            self.calls += 1
+            self.last_used = time.time()
+            return self.model.predict(source=source, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "path": self.path,
+            "version": self.version,
+            "load_ms": self.load_ms,
+            "warmup_ms": self.warmup_ms,
+            "calls": self.calls,
+            "last_used": self.last_used,
+        }
+
+
+class ModelRegistry:
+    """
+    Loads each detector once per process and keeps up to YOLO_MAX_RESIDENT of them in memory.
+    Models are looked up by name (YOLO_MODELS) or by weights path, and keyed by
+    (path, version): a changed weights file is loaded next to the old one instead of replacing it
+    under requests that are still using it.
+    """
+
+    def __init__(self, models: dict = None, max_resident: int = YOLO_MAX_RESIDENT):
+        self.models = parse_model_paths(YOLO_MODELS) if models is None else dict(models)
+        self.max_resident = max(1, max_resident)
+        self._resident = OrderedDict()  # (path, version) -> LoadedModel, least recently used first
+        self._loading = {}              # (path, version) -> lock held while that model loads
+        self._lock = threading.Lock()
+
+    def resolve(self, name_or_path: str = None):
+        name = name_or_path or YOLO_DEFAULT_MODEL
+        if name in self.models:
+            return name, self.models[name]
+        path = os.path.abspath(name)
+        if not os.path.isfile(path):
+            raise KeyError(f"Unknown YOLO model {name!r}; configured: {sorted(self.models)}")
+        return os.path.basename(path), path
+
+    def get(self, name_or_path: str = None, warm_up: bool = True) -> LoadedModel:
+        """
+        Resident model, loaded (and warmed up) on first use.
+        Args:
+            name_or_path (str): Name from YOLO_MODELS or a weights path; None for YOLO_DEFAULT_MODEL.
+            warm_up (bool): Run the warm-up inference after loading.
+        Returns:
+            LoadedModel: Shared model; call .predict() on it.
+        """
+        name, path = self.resolve(name_or_path)
+        key = (path, weights_version(path))
+        with self._lock:
+            entry = self._resident.get(key)
+            if entry is not None:
+                self._resident.move_to_end(key)
+                return entry
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        # Only the first caller loads; the others wait for it instead of loading a second copy
+        with loading:
+            with self._lock:
+                entry = self._resident.get(key)
+            if entry is None:
+                entry = LoadedModel(name, path, key[1])
+                if warm_up:
+                    entry.warm_up()
+                print(f"[YOLO] Loaded {name} ({path}, version {key[1]}) in {entry.load_ms} ms, "
+                      f"warm-up {entry.warmup_ms} ms")
+                with self._lock:
+                    self._resident[key] = entry
+                    self._loading.pop(key, None)
+                    while len(self._resident) > self.max_resident:
+                        evicted_key, evicted = self._resident.popitem(last=False)
+                        print(f"[YOLO] Unloaded {evicted.name} (version {evicted.version})")
+        return entry
+
+    def warm_up(self, names=None):
+        """Load and warm up the given models (default: YOLO_DEFAULT_MODEL), e.g. at server startup."""
+        for name in names or [YOLO_DEFAULT_MODEL]:
+            self.get(name)
+
+    def stats(self) -> dict:
+        """
+        Resident models and their load/warm-up times.
+        Returns:
+            dict: Configured model names and one entry per resident model.
+        """
+        with self._lock:
+            resident = [entry.stats() for entry in self._resident.values()]
+        return {"configured": self.models, "max_resident": self.max_resident, "resident": resident}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -0,0 +1,127 @@
+import threading
+import numpy as np
+import pytest
+
+pytest.importorskip("ultralytics")
+import detection_batcher
+from detection_batcher import DetectionBatcher, letterbox, unletterbox
+
+
+class FakeBoxes:
+    def __init__(self, rows):
+        self.data = self
+        self._rows = np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._rows
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.boxes = FakeBoxes(rows)
+
+
+'''Stand-in for a resident YOLO model
+    - Finds one box around everything that is not letterbox padding, and records the size of every predict call
+'''
+class FakeModel:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def predict(self, source, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        self.batches.append(len(images))
+        if self.fail:
+            raise RuntimeError("CUDA out of memory")
+        return [FakeResult([self.content_box(image) + [0.9, 0]]) for image in images]
+
+    @staticmethod
+    def content_box(image):
+        ys, xs = np.nonzero((image != detection_batcher.LETTERBOX_COLOR).any(axis=2))
+        return [xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]
+
+
+class FakeRegistry:
+    def __init__(self, model):
+        self.model = model
+
+    def get(self, name=None):
+        return self.model
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(detection_batcher, "get_model_registry", lambda: FakeRegistry(model))
+    return model
+
+
+def detect_concurrently(batcher, images):
+    results, errors = [None] * len(images), []
+
+    def call(index):
+        try:
+            results[index] = batcher.detect(images[index])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(len(images))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_letterbox_round_trip_restores_image_coordinates():
+    image = np.zeros((300, 600, 3), dtype=np.uint8)
+    square, scale, pad = letterbox(image, 640)
+
+    assert square.shape == (640, 640, 3)
+    assert pad == (0, 160)
+    # A box found on the square maps back onto the same region of the original image
+    box = np.array([[100 * scale, 50 * scale + pad[1], 500 * scale, 250 * scale + pad[1], 0.8, 0]])
+    np.testing.assert_allclose(unletterbox(box, scale, pad, image.shape)[0, :4], [100, 50, 500, 250], atol=0.01)
+
+
+def test_unletterbox_clips_to_the_image():
+    box = np.array([[-10.0, -10.0, 700.0, 700.0, 0.5, 0]])
+    restored = unletterbox(box, 1.0, (0, 0), (200, 400, 3))
+    assert restored[0, :4].tolist() == [0, 0, 400, 200]
+
+
+def test_concurrent_calls_share_one_forward_pass(model):
+    batcher = DetectionBatcher(max_size=4, wait_ms=200, imgsz=320)
+    images = [np.zeros((100 * (i + 1), 200, 3), dtype=np.uint8) for i in range(4)]
+    results, errors = detect_concurrently(batcher, images)
+
+    assert not errors
+    assert model.batches == [4]
+    # Each caller gets the box around its whole image back in its own coordinates
+    for image, rows in zip(images, results):
+        height, width = image.shape[:2]
+        np.testing.assert_allclose(rows[0, :4], [0, 0, width, height], atol=2)
+    assert batcher.stats()["batch_size_histogram"]["4"] == 1
+
+
+def test_failed_batch_raises_in_every_caller(model):
+    model.fail = True
+    batcher = DetectionBatcher(max_size=3, wait_ms=200, imgsz=320)
+    results, errors = detect_concurrently(batcher, [np.zeros((64, 64, 3), dtype=np.uint8)] * 3)
+
+    assert len(errors) == 3
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert batcher.stats()["errors"] == 1
+
+
+def test_size_one_runs_each_call_directly(model):
+    batcher = DetectionBatcher(max_size=1, wait_ms=5)
+    assert not batcher.enabled
+    rows = batcher.detect(np.zeros((80, 120, 3), dtype=np.uint8))
+
+    assert model.batches == [1]
+    assert rows.shape == (1, 6)
@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+import pytest
+
+pytest.importorskip("ultralytics")
+import model_registry
+
+
+'''Stand-in for ultralytics.YOLO
+    - Counts constructions and predictions, and takes a while to load so concurrent callers overlap
+'''
+class CountingYOLO:
+    loads = []
+
+    def __init__(self, path):
+        time.sleep(0.05)
+        CountingYOLO.loads.append(path)
+        self.predictions = 0
+        self.names = {0: "text"}
+
+    def predict(self, source=None, **kwargs):
+        self.predictions += 1
+        return []
+
+
+@pytest.fixture
+def weights(tmp_path, monkeypatch):
+    CountingYOLO.loads = []
+    monkeypatch.setattr(model_registry, "YOLO", CountingYOLO)
+    paths = {}
+    for name in ("a", "b"):
+        path = tmp_path / f"{name}.pt"
+        path.write_bytes(name.encode())
+        paths[name] = str(path)
+    return paths
+
+
+def test_concurrent_first_callers_share_one_load(weights):
+    registry = model_registry.ModelRegistry(weights)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("a"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert CountingYOLO.loads == [weights["a"]]
+    assert len({id(entry) for entry in results}) == 1
+    # Warm-up ran once, on the single load
+    assert results[0].model.predictions == 1
+    assert results[0].warmup_ms is not None
+
+
+def test_least_recently_used_model_is_unloaded(weights):
+    registry = model_registry.ModelRegistry(weights, max_resident=1)
+    registry.get("a", warm_up=False)
+    registry.get("b", warm_up=False)
+    registry.get("a", warm_up=False)
+
+    assert CountingYOLO.loads == [weights["a"], weights["b"], weights["a"]]
+    assert [entry["name"] for entry in registry.stats()["resident"]] == ["a"]
+
+
+def test_changed_weights_file_loads_a_new_version(weights):
+    registry = model_registry.ModelRegistry(weights)
+    first = registry.get("a", warm_up=False)
+    with open(weights["a"], "ab") as f:
+        f.write(b"retrained")
+    second = registry.get("a", warm_up=False)
+
+    assert first is not second
+    assert first.version != second.version
+    assert len(registry.stats()["resident"]) == 2
+
+
+def test_unknown_model_name_is_rejected(weights):
+    registry = model_registry.ModelRegistry(weights)
+    with pytest.raises(KeyError):
+        registry.get("missing")
@@ -5,21 +5,16 @@ import re
 from fastapi import HTTPException
 from PIL import Image
 import numpy as np
-from ultralytics import YOLO
-
-# Load YOLO model once
-script_dir = os.path.dirname(os.path.abspath(__file__))
-model_path = os.path.join(script_dir, "../best.pt")
-try:
-    yolo_model = YOLO(model_path)
-    print(f"[YOLO] Successfully loaded model: {model_path}")
-except Exception as e:
-    raise RuntimeError(f"Failed to load YOLO model: {e}")
-
-def run_yolo_ocr(image_bytes: bytes, filename: str = "uploaded_image"):
+from detection_batcher import get_detection_batcher
+
+# The YOLO model is loaded once per process by the registry (YOLO_DEFAULT_MODEL, ../best.pt by default);
+# concurrent calls are detected together in micro-batches (see detection_batcher.py)
+
+def run_yolo_ocr(image_bytes: bytes, filename: str = "uploaded_image", model_name: str = None):
     """
     Fallback OCR using YOLO detection + bounding box crops.
     No Gemini API used here.
+    model_name selects a model from YOLO_MODELS (default: YOLO_DEFAULT_MODEL).
     """
     try:
         pil_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
@@ -27,13 +22,12 @@ def run_yolo_ocr(image_bytes: bytes, filename: str = "uploaded_image"):
         raise ValueError("Invalid image file provided.")
 
     np_image = np.array(pil_image)
-    results = yolo_model(np_image)
-    boxes = results[0].boxes
+    boxes = get_detection_batcher().detect(np_image, model_name)
 
     detections = []
 
     if len(boxes) > 0:
-        for box in boxes.xyxy:
+        for box in boxes[:, :4]:
             x1, y1, x2, y2 = map(int, box)
 
             cropped_pil_image = pil_image.crop((x1, y1, x2, y2))
@@ -0,0 +1,125 @@
+"""
+Local stand-in for the Go backend, so benchmarks measure the ML server and not the network
+
+Accepts POST /images/upload (multipart, one or many images) and POST /images/annotate-by-hash
+(JSON; answers 404 for hashes not in known_hashes, so the ML server falls back to uploading the
+bytes) like the real backend. Every request waits latency_ms (+ up to jitter_ms); uploads fail
+with HTTP 500 at failure_rate, hash calls for a hash in failing_hashes always do.
+
+Standalone, on the port BACKEND_URL points at (run from ML_V3_Final/):
+    python -m benchmarks.backend_stub --port 3000 --latency-ms 80 --jitter-ms 40 --failure-rate 0.02
+"""
+import json, time, random, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+
+        delay = stub.latency_ms + (stub.rng.uniform(0, stub.jitter_ms) if stub.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+        if self.path.endswith("/annotate-by-hash"):
+            content_hash = json.loads(body or b"{}").get("content_hash")
+            if content_hash in stub.failing_hashes:
+                status = 500
+            else:
+                status = 200 if content_hash in stub.known_hashes else 404
+        elif self.path.endswith("/upload"):
+            status = 500 if stub.rng.random() < stub.failure_rate else 200
+        else:
+            status = 404
+        stub.record(self.path, status, length)
+
+        body = b'{"message": "ok"}' if status == 200 else b'{"error": "stub"}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+'''Backend stub server
+    - Runs in a background thread on 127.0.0.1 (port 0 = any free port); use as a context manager
+    - .url is the upload URL to put in BACKEND_URL
+    - .stats() counts requests, uploads, upload failures, hash calls and bytes received
+'''
+class BackendStub:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, failure_rate=0.0, port=0, seed=0,
+                 known_hashes=(), failing_hashes=()):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.known_hashes = set(known_hashes)
+        self.failing_hashes = set(failing_hashes)
+        self.rng = random.Random(seed)
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "uploads": 0, "failures": 0, "hash_calls": 0, "bytes": 0}
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/images/upload"
+
+    def record(self, path, status, length):
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["bytes"] += length
+            if path.endswith("/upload"):
+                self._stats["uploads"] += 1
+                self._stats["failures"] += status != 200
+            elif path.endswith("/annotate-by-hash"):
+                self._stats["hash_calls"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of uploads answered with HTTP 500")
+    args = parser.parse_args()
+
+    with BackendStub(args.latency_ms, args.jitter_ms, args.failure_rate, port=args.port) as stub:
+        print(f"Backend stub listening on {stub.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(10)
+                print(stub.stats())
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
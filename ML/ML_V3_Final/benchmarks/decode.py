@@ -0,0 +1,51 @@
+"""
+Benchmark: page decode cost per request (full RGB decode vs grayscale region decode)
+
+Renders a large synthetic page (phone photo size by default), keeps only some of its boxes
+and reports decode time and the bytes held after decoding for each decode mode.
+
+Run from ML_V3_Final/ (no Tesseract needed):
+    python -m benchmarks.decode --width 4000 --box-counts 5 20 --format JPEG PNG
+"""
+import argparse, time
+from benchmarks.synthetic import render_page
+from utils.image_decode import decode_page, open_page
+
+
+def run(image_bytes, boxes, mode, min_box_height, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pil_image = open_page(image_bytes)
+        page = decode_page(pil_image, boxes, mode=mode, min_box_height=min_box_height)
+        timings.append(time.perf_counter() - start)
+    return min(timings), page.nbytes, page
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4000, help="Page width; 4000 with 80 boxes gives a ~12 MP page")
+    parser.add_argument("--page-boxes", type=int, default=80, help="Boxes rendered on the page")
+    parser.add_argument("--box-counts", type=int, nargs="+", default=[5, 20, 80], help="Boxes sent with the request")
+    parser.add_argument("--format", nargs="+", default=["JPEG", "PNG"])
+    parser.add_argument("--min-box-height", type=int, default=20, help="OCR_DECODE_MIN_BOX_HEIGHT for the reduced run")
+    parser.add_argument("--font", help="TrueType font used to render the page (a Khmer font for khm)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    for image_format in args.format:
+        image_bytes, page_boxes, _ = render_page(args.page_boxes, width=args.width, line_height=70, font_size=42,
+                                                 font_path=args.font, image_format=image_format)
+        for box_count in args.box_counts:
+            boxes = page_boxes[:box_count]
+            for mode, min_box_height in (("full", 0), ("region", 0), ("region", args.min_box_height)):
+                seconds, held, page = run(image_bytes, boxes, mode, min_box_height, args.repeat)
+                rows.append((image_format, box_count, f"{mode}/{page.factor}x", page.size, seconds, held))
+
+    print(f"\n{'format':>6} {'boxes':>6} {'decode':>10} {'page':>11} {'time (ms)':>10} {'held (MB)':>10}")
+    for image_format, box_count, label, (width, height), seconds, held in rows:
+        print(f"{image_format:>6} {box_count:>6} {label:>10} {f'{width}x{height}':>11} "
+              f"{seconds * 1000:>10.1f} {held / 2 ** 20:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Load test: how many concurrent annotators one ML server handles before latency collapses
+
+Replays /images/ multipart requests (synthetic form pages with a mix of box counts) against a
+running server, step by step:
+    closed loop  --concurrency 1 2 4 8   N annotators, each sending its next page as soon as the last one returned
+    open loop    --rates 0.5 1 2 4       Poisson arrivals at R requests/s, whatever the server's response time
+A local stand-in for the Go backend (benchmarks/backend_stub.py) listens on --backend-port with
+configurable latency and failure rate, so forwarding costs what it would in production. The
+server must forward inside the request for that to count: --spawn-server starts it with
+BACKEND_OUTBOX=0 (unless --outbox) and BACKEND_URL on the stand-in; a server started by hand
+needs the same settings, or its responses only measure the outbox enqueue.
+
+During every step GET /ocr/stats is polled for the depth of the request executor's queue. The
+report is the saturation curve (throughput, p50/p95/p99, errors and queue depth per step), the
+first step where the queue starts to build up and the first step where p99 exceeds
+--p99-collapse times the p99 of the lightest step.
+
+Run from ML_V3_Final/:
+    python -m benchmarks.loadtest --spawn-server --concurrency 1 2 4 8 16 --duration 30 --output load.json
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --rates 0.5 1 2 4 --backend-latency-ms 80
+"""
+import os, sys, json, time, random, asyncio, argparse, subprocess
+import httpx
+from benchmarks.synthetic import render_page
+from benchmarks.backend_stub import BackendStub
+from benchmarks.latency import latency_summary
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+except ImportError:
+    plt = None
+
+
+def build_requests(args):
+    # A pool of distinct pages; annotators pick from it at random
+    requests = []
+    for box_count in args.box_counts:
+        for seed in range(args.pages):
+            image_bytes, boxes, _ = render_page(box_count, width=args.width, font_path=args.font,
+                                                noise=args.noise, seed=seed, image_format="JPEG")
+            requests.append((f"page_{box_count}_{seed}.jpg", image_bytes, json.dumps(boxes), box_count))
+    return requests
+
+
+'''Queue sampler
+    - Polls GET /ocr/stats while a step runs and keeps (seconds since step start, queued tasks)
+    of the request executor
+'''
+class QueueSampler:
+    def __init__(self, client, url, interval):
+        self.client = client
+        self.url = url
+        self.interval = interval
+        self.samples = []
+
+    async def run(self, started):
+        while True:
+            try:
+                response = await self.client.get(self.url + "/ocr/stats")
+                executors = response.json().get("executors") or {}
+                queued = executors.get("request", {}).get("queued", 0)
+                self.samples.append((time.perf_counter() - started, queued))
+            except Exception:
+                pass
+            await asyncio.sleep(self.interval)
+
+    def summary(self):
+        if not self.samples:
+            return {"mean": None, "max": None, "growth_per_s": None}
+        times = [t for t, _ in self.samples]
+        depths = [q for _, q in self.samples]
+        mean_t, mean_q = sum(times) / len(times), sum(depths) / len(depths)
+        variance = sum((t - mean_t) ** 2 for t in times)
+        # least-squares slope: > 0 means requests arrive faster than they are served
+        slope = sum((t - mean_t) * (q - mean_q) for t, q in self.samples) / variance if variance else 0.0
+        return {"mean": round(mean_q, 2), "max": max(depths), "growth_per_s": round(slope, 3)}
+
+
+class Step:
+    def __init__(self):
+        self.latencies = []
+        self.boxes = 0
+        self.errors = 0
+        self.backend_failures = 0
+
+    async def send(self, client, url, request, project_id, started=None):
+        name, image_bytes, annotations, box_count = request
+        started = time.perf_counter() if started is None else started
+        try:
+            response = await client.post(url + "/images/", data={"annotations": annotations, "project_id": project_id},
+                                         files={"image": (name, image_bytes, "image/jpeg")})
+            response.raise_for_status()
+            if response.json().get("backend_status") == "failed":
+                self.backend_failures += 1
+        except Exception:
+            self.errors += 1
+            return
+        self.latencies.append(time.perf_counter() - started)
+        self.boxes += box_count
+
+async def closed_loop(client, args, requests, concurrency, step, rng):
+    deadline = time.perf_counter() + args.duration
+
+    async def annotator(index):
+        while time.perf_counter() < deadline:
+            await step.send(client, args.url, rng.choice(requests), f"annotator-{index}")
+
+    await asyncio.gather(*(annotator(i) for i in range(concurrency)))
+
+async def open_loop(client, args, requests, rate, step, rng):
+    # latency is measured from the scheduled arrival, so a backed-up server is not hidden
+    # by the generator waiting for it (coordinated omission)
+    deadline = time.perf_counter() + args.duration
+    tasks = []
+    next_arrival = time.perf_counter()
+    while next_arrival < deadline:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(step.send(client, args.url, rng.choice(requests), "open-loop", next_arrival)))
+        next_arrival += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+
+async def run_steps(args, requests):
+    rng = random.Random(args.seed)
+    mode, levels = ("rate", args.rates) if args.rates else ("concurrency", args.concurrency)
+    limits = httpx.Limits(max_connections=None if args.rates else max(levels) + 2)
+    results = []
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        for request in requests[:args.warmup]:
+            await Step().send(client, args.url, request, "warmup")
+
+        print(f"\n{mode:>11} {'requests':>9} {'req/s':>7} {'boxes/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+              f"{'p99 (ms)':>9} {'errors':>7} {'queue':>6} {'q max':>6} {'q/s':>6}")
+        for level in levels:
+            step = Step()
+            sampler = QueueSampler(client, args.url, args.poll_interval)
+            started = time.perf_counter()
+            polling = asyncio.ensure_future(sampler.run(started))
+            if args.rates:
+                await open_loop(client, args, requests, level, step, rng)
+            else:
+                await closed_loop(client, args, requests, level, step, rng)
+            elapsed = time.perf_counter() - started
+            polling.cancel()
+
+            result = {mode: level, "requests": len(step.latencies), "errors": step.errors,
+                      "backend_failures": step.backend_failures,
+                      "throughput_rps": round(len(step.latencies) / elapsed, 2),
+                      "boxes_per_s": round(step.boxes / elapsed, 2),
+                      **latency_summary(step.latencies), "queue": sampler.summary()}
+            results.append(result)
+            queue = result["queue"]
+            print(f"{level:>11} {result['requests']:>9} {result['throughput_rps']:>7.2f} {result['boxes_per_s']:>8.1f} "
+                  f"{result['p50_ms'] or 0:>9.0f} {result['p95_ms'] or 0:>9.0f} {result['p99_ms'] or 0:>9.0f} "
+                  f"{step.errors:>7} {queue['mean'] or 0:>6.1f} {queue['max'] or 0:>6} {queue['growth_per_s'] or 0:>6.2f}")
+    return mode, results
+
+
+'''Saturation points
+    - queue_onset: first step whose request queue holds --queue-threshold tasks on average, or
+    (open loop) keeps growing by more than --queue-growth tasks per second
+    - p99_collapse: first step whose p99 exceeds --p99-collapse x the p99 of the first step
+'''
+def saturation(mode, results, args):
+    queue_onset = next((r[mode] for r in results if r["queue"]["mean"] is not None and (
+        r["queue"]["mean"] >= args.queue_threshold or r["queue"]["growth_per_s"] > args.queue_growth)), None)
+    baseline = next((r["p99_ms"] for r in results if r["p99_ms"]), None)
+    p99_collapse = next((r[mode] for r in results if baseline and r["p99_ms"]
+                         and r["p99_ms"] > args.p99_collapse * baseline), None)
+    return {"queue_onset": queue_onset, "p99_collapse": p99_collapse}
+
+def plot(mode, results, path):
+    levels = [r[mode] for r in results]
+    figure, (latency_axis, queue_axis) = plt.subplots(2, 1, sharex=True, figsize=(8, 7))
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        latency_axis.plot(levels, [r[key] for r in results], marker="o", label=key.replace("_ms", ""))
+    latency_axis.set_ylabel("latency (ms)")
+    latency_axis.legend()
+    throughput_axis = latency_axis.twinx()
+    throughput_axis.plot(levels, [r["throughput_rps"] for r in results], "k--", label="req/s")
+    throughput_axis.set_ylabel("requests/s")
+    queue_axis.plot(levels, [r["queue"]["mean"] for r in results], marker="o", label="mean")
+    queue_axis.plot(levels, [r["queue"]["max"] for r in results], marker="o", label="max")
+    queue_axis.set_ylabel("request executor queue")
+    queue_axis.set_xlabel(mode)
+    queue_axis.legend()
+    figure.tight_layout()
+    figure.savefig(path)
+
+
+def spawn_server(args):
+    # OCR cache off: the same pages are replayed over and over
+    env = dict(os.environ)
+    env.setdefault("OCR_CACHE", "0")
+    # Outbox off: the response then waits for the backend stand-in, so its latency and failures count
+    env["BACKEND_OUTBOX"] = "1" if args.outbox else "0"
+    env["BACKEND_URL"] = f"http://127.0.0.1:{args.backend_port}/images/upload"
+    port = args.url.rsplit(":", 1)[-1].strip("/")
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main_server:app", "--host", "127.0.0.1", "--port", port],
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(args.url + "/ocr/stats", timeout=2).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        if server.poll() is not None:
+            raise SystemExit("ML server exited during startup")
+        time.sleep(0.5)
+    server.terminate()
+    raise SystemExit("ML server did not come up within 60 s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="ML server base URL")
+    parser.add_argument("--spawn-server", action="store_true", help="Start main_server with uvicorn for the run")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Closed-loop annotators per step")
+    load.add_argument("--rates", type=float, nargs="+", help="Open-loop arrival rates (requests/s) per step")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per step")
+    parser.add_argument("--warmup", type=int, default=2, help="Requests sent before the first step")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--box-counts", type=int, nargs="+", default=[5, 20, 50], help="Box counts of the replayed pages")
+    parser.add_argument("--pages", type=int, default=4, help="Distinct pages per box count")
+    parser.add_argument("--width", type=int, default=1654)
+    parser.add_argument("--noise", type=float, default=0.002)
+    parser.add_argument("--font", help="TrueType font used to render the pages (a Khmer font for khm)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend-port", type=int, default=3000, help="Port of the backend stand-in (BACKEND_URL of a spawned server)")
+    parser.add_argument("--backend-latency-ms", type=float, default=50.0)
+    parser.add_argument("--backend-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--backend-failure-rate", type=float, default=0.0)
+    parser.add_argument("--no-backend-stub", action="store_true", help="Forward to whatever listens on the backend port")
+    parser.add_argument("--outbox", action="store_true", help="Keep the backend outbox on in a spawned server (responses are \"queued\")")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between /ocr/stats samples")
+    parser.add_argument("--queue-threshold", type=float, default=1.0, help="Mean queued requests that mark saturation")
+    parser.add_argument("--queue-growth", type=float, default=0.1, help="Queue growth (tasks/s) that marks saturation")
+    parser.add_argument("--p99-collapse", type=float, default=3.0, help="p99 factor over the first step that marks collapse")
+    parser.add_argument("--output", help="Write the saturation curve to this JSON file")
+    parser.add_argument("--plot", help="Save the curves as an image (needs matplotlib)")
+    args = parser.parse_args()
+    args.url = args.url.rstrip("/")
+
+    requests = build_requests(args)
+    stub = None if args.no_backend_stub else BackendStub(args.backend_latency_ms, args.backend_jitter_ms,
+                                                          args.backend_failure_rate, port=args.backend_port).start()
+    server = spawn_server(args) if args.spawn_server else None
+    try:
+        mode, results = asyncio.run(run_steps(args, requests))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if stub is not None:
+            stub.stop()
+
+    points = saturation(mode, results, args)
+    print(f"\nRequest queue starts building up at {mode} = {points['queue_onset'] or 'never (within the tested range)'}")
+    print(f"p99 collapses (> {args.p99_collapse:g}x) at {mode} = {points['p99_collapse'] or 'never (within the tested range)'}")
+    if stub is not None:
+        print(f"Backend stub: {stub.stats()}")
+
+    if args.output:
+        report = {"arguments": vars(args), "mode": mode, "results": results, "saturation": points,
+                  "backend_stub": stub.stats() if stub is not None else None}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.plot:
+        if plt is None:
+            print("matplotlib is not installed, skipping --plot")
+        else:
+            plot(mode, results, args.plot)
+            print(f"Curves saved to {args.plot}")
+
+if __name__ == "__main__":
+    main()
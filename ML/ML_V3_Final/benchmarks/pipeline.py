@@ -0,0 +1,175 @@
+"""
+Benchmark suite: OCR pipeline throughput, latency and memory on synthetic pages
+
+Renders synthetic form pages for every combination of box count, font size (box height), noise
+and page width, then times three levels of the pipeline in-process:
+    preprocess  preprocess_for_ocr() on every box crop of the page
+    process     process_user_boxes() on the whole page
+    endpoint    POST /images/ through the FastAPI app, forwarding to a local backend stub
+For each it reports throughput (boxes/s), p50/p95/p99 latency per call and peak Python memory
+(tracemalloc, measured in a separate run so it does not slow down the timed calls).
+
+The OCR cache and the backend outbox are disabled unless set in the environment, so every
+call does the full work. Results are written as JSON; pass an earlier file as --baseline to
+compare, the run fails (exit code 1) when a case got slower than --tolerance allows.
+
+Run from ML_V3_Final/ (needs Tesseract with khm):
+    python -m benchmarks.pipeline --box-counts 10 50 --font path/to/KhmerOS.ttf --output bench.json
+    python -m benchmarks.pipeline --box-counts 10 50 --font path/to/KhmerOS.ttf --baseline bench.json
+"""
+import os
+# read by utils/ when imported, so they are set before the imports below
+os.environ.setdefault("OCR_CACHE", "0")
+os.environ.setdefault("BACKEND_OUTBOX", "0")
+
+import io, sys, json, time, argparse, platform, itertools, tracemalloc
+from PIL import Image
+from benchmarks.synthetic import render_page
+from benchmarks.backend_stub import BackendStub
+from benchmarks.latency import latency_summary
+from utils.ocr_utils import preprocess_for_ocr, process_user_boxes
+from utils.page_preprocess import resolve_profile
+
+STAGES = ("preprocess", "process", "endpoint")
+CASE_KEYS = ("stage", "boxes", "width", "font_size", "noise", "profile")
+
+
+def measure(fn, box_count, repeat, warmup):
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "calls": repeat,
+        **latency_summary(latencies),
+        "boxes_per_s": round(box_count * repeat / sum(latencies), 2),
+        "peak_memory_mb": round(peak / 2 ** 20, 2),
+    }
+
+'''Timed callables per stage for one synthetic page
+    - client is a FastAPI TestClient for main_server.app (None when the endpoint is not benchmarked)
+'''
+def stage_calls(image_bytes, boxes, profile, client):
+    page = Image.open(io.BytesIO(image_bytes))
+    page.load()
+    crops = [page.crop(tuple(box)) for box in boxes]
+    annotations = json.dumps(boxes)
+
+    def endpoint():
+        response = client.post("/images/", data={"annotations": annotations, "project_id": "benchmark",
+                                                  "preprocess_profile": profile},
+                               files={"image": ("page.png", image_bytes, "image/png")})
+        response.raise_for_status()
+
+    return {
+        "preprocess": lambda: [preprocess_for_ocr(crop, profile) for crop in crops],
+        "process": lambda: process_user_boxes(image_bytes, boxes, profile=profile),
+        "endpoint": endpoint,
+    }
+
+
+def environment():
+    info = {"python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    try:
+        import pytesseract
+        info["tesseract"] = str(pytesseract.get_tesseract_version())
+    except Exception:
+        info["tesseract"] = None
+    info["settings"] = {name: value for name, value in os.environ.items()
+                        if name.startswith(("OCR_", "BACKEND_", "STITCH_"))}
+    return info
+
+def run_cases(args, client):
+    results = []
+    for box_count, width, font_size, noise in itertools.product(args.box_counts, args.widths, args.font_sizes, args.noise):
+        image_bytes, boxes, _ = render_page(box_count, width=width, line_height=int(font_size * 1.7),
+                                            font_path=args.font, font_size=font_size, noise=noise)
+        calls = stage_calls(image_bytes, boxes, args.profile, client)
+        for stage in args.stages:
+            case = {"stage": stage, "boxes": box_count, "width": width, "font_size": font_size,
+                    "noise": noise, "profile": args.profile}
+            case.update(measure(calls[stage], box_count, args.repeat, args.warmup))
+            results.append(case)
+            print(f"{stage:>10} {box_count:>6} {width:>6} {font_size:>5} {noise:>6} "
+                  f"{case['p50_ms']:>9.1f} {case['p95_ms']:>9.1f} {case['p99_ms']:>9.1f} "
+                  f"{case['boxes_per_s']:>9.1f} {case['peak_memory_mb']:>8.1f}")
+    return results
+
+
+'''Comparison against a stored run
+    - Cases are matched by CASE_KEYS; cases missing on either side are ignored
+    - A case regresses when its p95 latency grew or its throughput fell by more than tolerance
+'''
+def compare(results, baseline, tolerance):
+    stored = {tuple(case[key] for key in CASE_KEYS): case for case in baseline["results"]}
+    regressions = []
+    print(f"\n{'stage':>10} {'boxes':>6} {'width':>6} {'font':>5} {'noise':>6} {'p95 before':>11} {'p95 now':>9} {'boxes/s':>9}")
+    for case in results:
+        before = stored.get(tuple(case[key] for key in CASE_KEYS))
+        if before is None:
+            continue
+        p95_change = case["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        rate_change = case["boxes_per_s"] / before["boxes_per_s"] - 1 if before["boxes_per_s"] else 0.0
+        regressed = p95_change > tolerance or rate_change < -tolerance
+        if regressed:
+            regressions.append(case)
+        print(f"{case['stage']:>10} {case['boxes']:>6} {case['width']:>6} {case['font_size']:>5} {case['noise']:>6} "
+              f"{before['p95_ms']:>11.1f} {case['p95_ms']:>9.1f} {rate_change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--box-counts", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--widths", type=int, nargs="+", default=[1654], help="Page widths in pixels (1654 = A4 at 200 dpi)")
+    parser.add_argument("--font-sizes", type=int, nargs="+", default=[28], help="Font sizes; the box height follows")
+    parser.add_argument("--noise", type=float, nargs="+", default=[0.0], help="Share of pixels turned into salt-and-pepper noise")
+    parser.add_argument("--font", help="TrueType font used to render the page (a Khmer font for khm)")
+    parser.add_argument("--profile", default=None, help="Preprocessing profile (default: OCR_PREPROCESS_PROFILE)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=10, help="Timed calls per case")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed calls per case before timing")
+    parser.add_argument("--backend-latency-ms", type=float, default=0.0, help="Delay of the backend stub")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed p95/throughput change before a case regresses")
+    args = parser.parse_args()
+    args.profile = resolve_profile(args.profile)
+
+    print(f"\n{'stage':>10} {'boxes':>6} {'width':>6} {'font':>5} {'noise':>6} "
+          f"{'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'boxes/s':>9} {'peak MB':>8}")
+    if "endpoint" in args.stages:
+        from fastapi.testclient import TestClient
+        import main_server
+        with BackendStub(latency_ms=args.backend_latency_ms) as stub:
+            main_server.BACKEND_URL = stub.url
+            with TestClient(main_server.app) as client:
+                results = run_cases(args, client)
+    else:
+        results = run_cases(args, None)
+
+    report = {"environment": environment(), "arguments": vars(args), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark: stitched-page OCR vs per-box OCR on synthetic form pages
+
+The OCR cache is disabled unless set in the environment, so repeats and the second mode
+do not read back the first one's results.
+
+Run from ML_V3_Final/ (needs Tesseract with khm):
+    python -m benchmarks.stitched_vs_per_box --font path/to/KhmerOS.ttf
+"""
+import os
+# read by utils/ when imported, so it is set before the imports below
+os.environ.setdefault("OCR_CACHE", "0")
+
+import argparse, time
+from benchmarks.synthetic import render_page
+from utils.ocr_utils import process_user_boxes
+
+
+def run(mode, image_bytes, boxes, repeat):
+    timings, detections = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        detections = process_user_boxes(image_bytes, boxes, execution_mode=mode)
+        timings.append(time.perf_counter() - start)
+    return min(timings), detections
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--box-counts", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--font", help="TrueType font used to render the page (a Khmer font for khm)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    for box_count in args.box_counts:
+        image_bytes, boxes, _ = render_page(box_count, font_path=args.font)
+        per_box_time, per_box = run("serial", image_bytes, boxes, args.repeat)
+        stitched_time, stitched = run("stitched", image_bytes, boxes, args.repeat)
+        agree = sum(a["extracted_text"] == b["extracted_text"] for a, b in zip(per_box, stitched))
+        rows.append((box_count, per_box_time, stitched_time, agree))
+
+    print(f"\n{'boxes':>6} {'per-box (s)':>12} {'stitched (s)':>13} {'speedup':>8} {'same text':>10}")
+    for box_count, per_box_time, stitched_time, agree in rows:
+        print(f"{box_count:>6} {per_box_time:>12.3f} {stitched_time:>13.3f} "
+              f"{per_box_time / stitched_time:>7.2f}x {agree:>5}/{box_count}")
+
+if __name__ == "__main__":
+    main()
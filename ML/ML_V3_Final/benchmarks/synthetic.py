@@ -0,0 +1,55 @@
+import io, random
+from PIL import Image, ImageDraw, ImageFont
+
+
+# A few common Khmer words, mixed with digits like on real forms
+KHMER_WORDS = ["ខ្មែរ", "កម្ពុជា", "ភ្នំពេញ", "ឈ្មោះ", "អាសយដ្ឋាន", "ថ្ងៃ", "ខែ", "ឆ្នាំ", "លេខ", "ក្រសួង", "សាលា", "ការិយាល័យ"]
+LATIN_WORDS = ["Name", "Date", "Address", "Ministry", "Office", "Number", "Test"]
+
+
+def load_font(font_path=None, size=28):
+    if font_path:
+        return ImageFont.truetype(font_path, size)
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+'''Synthetic form page
+    - box_count single-line text boxes laid out in rows/columns on a white page
+    - Without a Khmer font (font_path) the words fall back to Latin so the page is still renderable
+    - Returns (encoded image bytes, boxes, ground-truth texts)
+'''
+def render_page(box_count, width=1654, line_height=48, font_path=None, font_size=28,
+                words_per_box=3, noise=0.0, seed=0, image_format="PNG"):
+    rng = random.Random(seed)
+    font = load_font(font_path, font_size)
+    words = KHMER_WORDS if font_path else LATIN_WORDS
+
+    columns = 2 if box_count > 40 else 1
+    column_width = width // columns
+    rows = -(-box_count // columns)
+    height = max(200, rows * line_height + 2 * line_height)
+
+    page = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    boxes, texts = [], []
+    for i in range(box_count):
+        column, row = i % columns, i // columns
+        x1 = column * column_width + 20
+        y1 = line_height + row * line_height
+        text = " ".join(rng.choice(words) for _ in range(words_per_box))
+        draw.text((x1 + 8, y1 + 6), text, fill=0, font=font)
+        text_width = int(draw.textlength(text, font=font))
+        boxes.append([x1, y1, min(x1 + text_width + 16, (column + 1) * column_width - 10), y1 + line_height - 4])
+        texts.append(text)
+
+    if noise > 0:
+        # Salt-and-pepper noise, as on a low quality scan
+        pixels = page.load()
+        for _ in range(int(width * height * noise)):
+            pixels[rng.randrange(width), rng.randrange(height)] = rng.choice((0, 255))
+
+    buffer = io.BytesIO()
+    page.convert("RGB").save(buffer, format=image_format)
+    return buffer.getvalue(), boxes, texts
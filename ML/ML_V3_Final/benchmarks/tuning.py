@@ -0,0 +1,243 @@
+"""
+Tuning harness: OCR accuracy vs speed over preprocessing, page segmentation / engine modes and rescale targets
+
+Every configuration (preprocessing profile x --psm x --oem x text height target) is run on every
+labelled box of the corpus. The harness reports character error rate (CER) and time per box
+(preprocessing + recognition), the Pareto frontier of the two and a recommended default: the
+fastest frontier configuration whose CER is at most --max-cer-loss above the best one.
+
+Corpus (one of):
+    --corpus images.json  Image documents with ground truth as saved by the backend's SaveGroundTruth
+                          (e.g. mongoexport --collection images --query '{"status": "final"}' --jsonArray).
+                          Each has "name" / "path" and "annotations" with "rect" {x, y, w, h} and "gt";
+                          images are looked up by file name in --images-dir (backend/uploads/final)
+    --crops-dir DIR       Crop images with the ground truth next to them in <name>.gt.txt (tesstrain layout)
+    --synthetic N         N synthetic pages from benchmarks/synthetic.py (use --font with a Khmer font)
+
+Run from ML_V3_Final/ (needs Tesseract with khm):
+    python -m benchmarks.tuning --corpus images.json --images-dir ../../backend/uploads/final --output tuning.json
+    python -m benchmarks.tuning --synthetic 5 --font path/to/KhmerOS.ttf --psm auto 6 7 --height-targets 0 28 40
+"""
+import io, os, json, time, argparse, itertools, unicodedata
+from pathlib import Path
+import numpy as np, cv2
+from PIL import Image
+import pytesseract
+from benchmarks.synthetic import render_page
+from utils.ocr_utils import clean_text
+from utils.page_preprocess import denoise, PREPROCESS_PROFILES, OCR_PREPROCESS_PROFILE
+from utils.text_scale import text_scale, rescale, OCR_TEXT_HEIGHT_TARGET, OCR_TEXT_HEIGHT_TOLERANCE
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp")
+
+
+# ---- Corpus ----
+def gray_crop(page, x1, y1, x2, y2):
+    x1, y1 = max(0, int(x1)), max(0, int(y1))
+    x2, y2 = min(page.shape[1], int(round(x2))), min(page.shape[0], int(round(y2)))
+    return page[y1:y2, x1:x2] if x2 > x1 and y2 > y1 else None
+
+def load_ground_truth(corpus_path, images_dir):
+    with open(corpus_path, encoding="utf-8") as f:
+        documents = json.load(f)
+    if isinstance(documents, dict):
+        documents = [documents]
+
+    samples = []
+    for document in documents:
+        # image documents use name/path, SaveGroundTruth request bodies use filename
+        name = Path(document.get("path") or document.get("name") or document.get("filename", "")).name
+        labelled = [a for a in document.get("annotations") or [] if (a.get("gt") or "").strip() and a.get("rect")]
+        image_path = Path(images_dir or ".") / name
+        if not labelled or not image_path.is_file():
+            continue
+        page = np.asarray(Image.open(image_path).convert("L"))
+        for annotation in labelled:
+            rect = annotation["rect"]
+            crop = gray_crop(page, rect["x"], rect["y"], rect["x"] + rect["w"], rect["y"] + rect["h"])
+            if crop is not None:
+                samples.append((crop, annotation["gt"]))
+    return samples
+
+def load_crops(crops_dir):
+    samples = []
+    for path in sorted(Path(crops_dir).iterdir()):
+        truth_path = path.with_suffix(".gt.txt")
+        if path.suffix.lower() in IMAGE_SUFFIXES and truth_path.is_file():
+            samples.append((np.asarray(Image.open(path).convert("L")), truth_path.read_text(encoding="utf-8")))
+    return samples
+
+def load_synthetic(pages, font_path, noise):
+    samples = []
+    for seed in range(pages):
+        image_bytes, boxes, texts = render_page(20, font_path=font_path, noise=noise, seed=seed)
+        page = np.asarray(Image.open(io.BytesIO(image_bytes)).convert("L"))
+        samples.extend((gray_crop(page, *box), text) for box, text in zip(boxes, texts))
+    return samples
+
+
+# ---- Scoring ----
+def normalize(text):
+    # NFC so that differently composed Khmer clusters compare equal, whitespace collapsed like the server does
+    return clean_text(unicodedata.normalize("NFC", text))
+
+def edit_distance(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+'''Pareto frontier of (cer, ms_per_box), both lower is better
+    - A configuration is on the frontier when no faster (or equally fast) one has a lower or equal CER
+'''
+def pareto_frontier(results):
+    frontier, best_cer = [], float("inf")
+    for result in sorted(results, key=lambda r: (r["ms_per_box"], r["cer"])):
+        if result["cer"] < best_cer:
+            frontier.append(result)
+            best_cer = result["cer"]
+    return frontier
+
+def recommend(frontier, max_cer_loss):
+    best_cer = min(result["cer"] for result in frontier)
+    return next(result for result in frontier if result["cer"] <= best_cer + max_cer_loss)
+
+
+# ---- Recognition ----
+'''Recognizer for a given engine mode
+    - The server's engine pool always uses the default OEM, so the harness keeps its own
+    tesserocr handle per OEM (or calls pytesseract with --oem when tesserocr is missing)
+'''
+class Recognizer:
+    def __init__(self, lang):
+        self.lang = lang
+        self._handles = {}
+
+    def __call__(self, image, psm, oem):
+        if tesserocr is not None:
+            handle = self._handles.get(oem)
+            if handle is None:
+                kwargs = {"lang": self.lang, "oem": tesserocr.OEM(oem)}
+                if os.getenv("TESSDATA_PREFIX"):
+                    kwargs["path"] = os.getenv("TESSDATA_PREFIX")
+                handle = self._handles[oem] = tesserocr.PyTessBaseAPI(**kwargs)
+            handle.SetPageSegMode(tesserocr.PSM.AUTO if psm is None else psm)
+            handle.SetImage(image)
+            return handle.GetUTF8Text()
+        config = f"--oem {oem}" + ("" if psm is None else f" --psm {psm}")
+        return pytesseract.image_to_string(image, lang=self.lang, config=config)
+
+    def close(self):
+        for handle in self._handles.values():
+            handle.End()
+
+def run_config(samples, recognizer, profile, psm, oem, height_target, tolerance):
+    edits = chars = exact = 0
+    start = time.perf_counter()
+    for gray, truth in samples:
+        scale = text_scale(gray, target=height_target, tolerance=tolerance)
+        scaled = np.ascontiguousarray(rescale(gray, scale))
+        _, binary = cv2.threshold(denoise(scaled, profile), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        predicted = normalize(recognizer(Image.fromarray(binary), psm, oem))
+        truth = normalize(truth)
+        distance = edit_distance(predicted, truth)
+        edits += distance
+        chars += len(truth)
+        exact += distance == 0
+    elapsed = time.perf_counter() - start
+    return {
+        "profile": profile, "psm": "auto" if psm is None else psm, "oem": oem, "height_target": height_target,
+        "cer": round(edits / max(1, chars), 4),
+        "exact_match": round(exact / len(samples), 4),
+        "ms_per_box": round(elapsed / len(samples) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    corpus = parser.add_mutually_exclusive_group(required=True)
+    corpus.add_argument("--corpus", help="JSON image documents with ground-truth annotations")
+    corpus.add_argument("--crops-dir", help="Directory of crops with <name>.gt.txt ground truth")
+    corpus.add_argument("--synthetic", type=int, help="Number of synthetic pages (20 boxes each)")
+    parser.add_argument("--images-dir", help="Where the images of --corpus are stored")
+    parser.add_argument("--font", help="TrueType font for --synthetic (a Khmer font for khm)")
+    parser.add_argument("--noise", type=float, default=0.0, help="Salt-and-pepper noise for --synthetic")
+    parser.add_argument("--lang", default="khm")
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PREPROCESS_PROFILES), default=sorted(PREPROCESS_PROFILES))
+    parser.add_argument("--psm", nargs="+", default=["auto", "6", "7"], help="Page segmentation modes; auto is what V3 uses")
+    parser.add_argument("--oem", type=int, nargs="+", default=[1, 3], help="Engine modes (0 needs legacy traineddata)")
+    parser.add_argument("--height-targets", type=int, nargs="+", default=[0, OCR_TEXT_HEIGHT_TARGET],
+                        help="OCR_TEXT_HEIGHT_TARGET values; 0 = no rescaling")
+    parser.add_argument("--tolerance", type=float, default=OCR_TEXT_HEIGHT_TOLERANCE)
+    parser.add_argument("--max-boxes", type=int, default=0, help="Use only the first N boxes (0 = all)")
+    parser.add_argument("--max-cer-loss", type=float, default=0.01,
+                        help="CER the recommended default may lose against the most accurate configuration")
+    parser.add_argument("--output", help="Write all results, the frontier and the recommendation to this JSON file")
+    args = parser.parse_args()
+
+    if args.corpus:
+        samples = load_ground_truth(args.corpus, args.images_dir)
+    elif args.crops_dir:
+        samples = load_crops(args.crops_dir)
+    else:
+        samples = load_synthetic(args.synthetic, args.font, args.noise)
+    samples = [(gray, truth) for gray, truth in samples if gray is not None and gray.size]
+    if args.max_boxes:
+        samples = samples[:args.max_boxes]
+    if not samples:
+        parser.error("the corpus holds no labelled boxes")
+    print(f"{len(samples)} labelled boxes")
+
+    psms = [None if psm == "auto" else int(psm) for psm in args.psm]
+    recognizer = Recognizer(args.lang)
+    results = []
+    print(f"\n{'profile':>9} {'psm':>5} {'oem':>4} {'height':>7} {'CER':>7} {'exact':>7} {'ms/box':>8}")
+    try:
+        for profile, psm, oem, height_target in itertools.product(args.profiles, psms, args.oem, args.height_targets):
+            try:
+                result = run_config(samples, recognizer, profile, psm, oem, height_target, args.tolerance)
+            except Exception as e:
+                print(f"{profile:>9} {psm or 'auto':>5} {oem:>4} {height_target:>7}  failed: {e}")
+                continue
+            results.append(result)
+            print(f"{profile:>9} {result['psm']:>5} {oem:>4} {height_target:>7} "
+                  f"{result['cer']:>7.2%} {result['exact_match']:>7.1%} {result['ms_per_box']:>8.1f}")
+    finally:
+        recognizer.close()
+    if not results:
+        raise SystemExit("every configuration failed")
+
+    frontier = pareto_frontier(results)
+    recommended = recommend(frontier, args.max_cer_loss)
+    print("\nPareto frontier (faster -> more accurate):")
+    for result in frontier:
+        marker = "  <- recommended" if result is recommended else ""
+        print(f"  {result['profile']:>9} psm={result['psm']} oem={result['oem']} height={result['height_target']}: "
+              f"CER {result['cer']:.2%}, {result['ms_per_box']:.1f} ms/box{marker}")
+
+    # psm / oem are not server settings yet: the first pass reads with automatic segmentation and the default engine
+    print("\nRecommended server settings:")
+    print(f"  OCR_PREPROCESS_PROFILE={recommended['profile']}  (currently {OCR_PREPROCESS_PROFILE})")
+    print(f"  OCR_TEXT_HEIGHT_TARGET={recommended['height_target']}  (currently {OCR_TEXT_HEIGHT_TARGET})")
+    if recommended["psm"] != "auto" or recommended["oem"] != 3:
+        print(f"  Tesseract --psm {recommended['psm']} --oem {recommended['oem']} (the server uses --psm auto --oem 3)")
+
+    if args.output:
+        report = {"boxes": len(samples), "lang": args.lang, "results": results,
+                  "frontier": frontier, "recommended": recommended}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
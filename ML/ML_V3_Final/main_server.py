@@ -1,10 +1,25 @@
-import io, json, asyncio
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import io, os, json, time, asyncio, functools
+from typing import List
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from utils.ocr_utils import process_user_boxes
-from utils.api_client import send_to_backend
+from utils.ocr_utils import process_user_boxes, iter_user_boxes, iter_batch_boxes, count_rejected
+from utils.api_client import (send_to_backend, send_batch_to_backend, send_batch_items_to_backend, send_job_callback,
+                              validate_callback_url, close_backend_client, backend_stats)
+from utils.tess_engine import get_engine_pool
+from utils.parallel_ocr import (shutdown_process_pool, get_box_executor, shutdown_box_executor, shutdown_line_executor,
+                                get_request_executor, shutdown_request_executor, executor_stats)
+from utils.page_preprocess import resolve_profile
+from utils.ocr_cache import get_ocr_cache
+from utils.crop_store import get_crop_store, resolve_crop_format, encode_crop, MEDIA_TYPES
+from utils.ocr_jobs import OcrJobQueue, JobQueueFull
+from utils.backend_outbox import get_outbox, OutboxDeliverer
+from utils.metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, timed, record_error
+from utils.log import get_logger, fields
 import uvicorn
 
+logger = get_logger("server")
+
 app = FastAPI(title="User Box OCR API")
 app.add_middleware(
     CORSMiddleware,
@@ -14,56 +29,534 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-BACKEND_URL = "http://127.0.0.1:3000/images/upload" 
+# BACKEND_URL : the backend's upload endpoint
+BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:3000/images/upload")
 
-@app.post("/images/")
-async def ocr_user_boxes(
-    image: UploadFile = File(...),
-    annotations: str = Form(...),
-    project_id: str = Form(...)
-):
-    print(f"\n{'='*60}")
-    print(f"[ML SERVER] New OCR request received")
-    print(f"[ML SERVER] Project ID: {project_id}")
-    print(f"[ML SERVER] Image filename: {image.filename}")
-    print(f"[ML SERVER] Image content type: {image.content_type}")
-    print(f"{'='*60}")
-    
+# /images/stream output: one JSON object per line, or server-sent events
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+'''Handing the detections over to the backend
+    - items: list of (filename, image_bytes, detections, content_type) of one project; several
+    items (a batch request) go out as one aggregated backend call
+    - With the outbox (BACKEND_OUTBOX=1) they are stored locally and the call returns right
+    away with status "queued"; the deliverer pushes them to the backend in the background
+    (again one call per project for everything that is due). The SQLite insert runs in the
+    default executor, so the image blobs are not written on the event loop
+    - Without it (default) the backend call happens here and its outcome is returned
+'''
+async def forward_batch(project_id, items):
+    outbox = get_outbox()
+    if outbox is not None:
+        # backend_forward is timed by the deliverer around the real call
+        with timed("outbox_enqueue"):
+            loop = asyncio.get_running_loop()
+            delivery_ids = await loop.run_in_executor(
+                None, lambda: [outbox.enqueue(BACKEND_URL, project_id, *item) for item in items])
+        get_deliverer().wake()
+        ids = ", ".join(str(delivery_id) for delivery_id in delivery_ids)
+        logger.info("Results queued for backend delivery", extra=fields(delivery_ids=ids))
+        return "queued", f"Results queued for delivery to backend (delivery {ids})"
+
+    with timed("backend_forward"):
+        logger.info("Sending results to backend", extra=fields(images=len(items), backend_url=BACKEND_URL))
+        if len(items) == 1:
+            backend_status, backend_message = await send_to_backend(BACKEND_URL, project_id, *items[0])
+        else:
+            backend_status, backend_message = await send_batch_to_backend(BACKEND_URL, project_id, items)
+    if backend_status != "success":
+        record_error("backend_forward")
+    logger.info("Backend response", extra=fields(status=backend_status, detail=backend_message))
+    return backend_status, backend_message
+
+async def forward_results(project_id, filename, image_bytes, detections, content_type):
+    return await forward_batch(project_id, [(filename, image_bytes, detections, content_type)])
+
+_deliverer = None
+
+def get_deliverer():
+    global _deliverer
+    if _deliverer is None:
+        _deliverer = OutboxDeliverer(get_outbox(), send_batch_items_to_backend)
+        _deliverer.start()
+    return _deliverer
+
+'''Validating the form fields shared by the OCR endpoints
+    - parse_ocr_options returns (profile, crop_format), parse_ocr_form (boxes, profile, crop_format)
+    - Both raise HTTPException(400) on bad input
+'''
+def parse_ocr_options(project_id, preprocess_profile, crop_format):
     if not project_id:
         raise HTTPException(status_code=400, detail="Project ID is required")
 
+    # fast / balanced / accurate; falls back to the server default (OCR_PREPROCESS_PROFILE)
+    # png / png1 / webp / ref / none; falls back to the server default (OCR_CROP_FORMAT)
+    try:
+        return resolve_profile(preprocess_profile), resolve_crop_format(crop_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def parse_ocr_form(project_id, annotations, preprocess_profile, crop_format):
+    profile, crop_format = parse_ocr_options(project_id, preprocess_profile, crop_format)
     try:
         boxes = json.loads(annotations)
         if not isinstance(boxes, list):
             raise ValueError("Annotations must be a list of boxes")
-        print(f"[ML SERVER] Parsed {len(boxes)} bounding boxes")
+        logger.debug("Parsed bounding boxes", extra=fields(boxes=len(boxes)))
     except Exception as e:
-        print(f"[ML SERVER] ✗ Error parsing annotations: {e}")
+        logger.warning("Error parsing annotations", extra=fields(error=str(e)))
         raise HTTPException(status_code=400, detail="Invalid annotations JSON")
+    return boxes, profile, crop_format
+
+def log_request(project_id, image):
+    logger.info("New OCR request received", extra=fields(
+        project_id=project_id, image=image.filename, content_type=image.content_type))
+
+@app.post("/images/")
+async def ocr_user_boxes(
+    image: UploadFile = File(...),
+    annotations: str = Form(...),
+    project_id: str = Form(...),
+    preprocess_profile: str = Form(None),
+    crop_format: str = Form(None)
+):
+    log_request(project_id, image)
+    boxes, profile, crop_format = parse_ocr_form(project_id, annotations, preprocess_profile, crop_format)
 
     image_bytes = await image.read()
-    print(f"[ML SERVER] Image loaded: {len(image_bytes)} bytes")
+    logger.debug("Image loaded", extra=fields(nbytes=len(image_bytes)))
     
     loop = asyncio.get_event_loop()
-    print(f"[ML SERVER] Starting OCR processing...")
-    detections = await loop.run_in_executor(None, process_user_boxes, image_bytes, boxes)
-    print(f"[ML SERVER] OCR processing completed - {len(detections)} results")
+    detections = await loop.run_in_executor(
+        get_request_executor(), functools.partial(process_user_boxes, image_bytes, boxes, profile=profile, crop_format=crop_format)
+    )
+    logger.info("OCR processing completed", extra=fields(results=len(detections), profile=profile))
 
-    print(f"[ML SERVER] Sending results to backend: {BACKEND_URL}")
-    backend_status, backend_message = await send_to_backend(
-        BACKEND_URL, project_id, image.filename, image_bytes, detections, image.content_type
+    backend_status, backend_message = await forward_results(
+        project_id, image.filename, image_bytes, detections, image.content_type
     )
-    print(f"[ML SERVER] Backend response: {backend_status} - {backend_message}")
 
     response_data = {
         "processing_result": detections,
         "filename": image.filename,
+        "rejected_boxes": count_rejected(detections),
         "backend_status": backend_status,
         "message": backend_message
     }
-    print(f"[ML SERVER] ✓ Request completed successfully\n")
+    logger.info("Request completed", extra=fields(image=image.filename))
     
     return response_data
 
+def format_stream_record(record, stream_format):
+    data = json.dumps(record, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {record['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+def resolve_stream_format(stream_format):
+    stream_format = (stream_format or "ndjson").lower()
+    if stream_format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown stream format, expected one of {sorted(STREAM_FORMATS)}")
+    return stream_format
+
+async def iterate_in_thread(generator_fn):
+    # Runs a blocking generator (the OCR) in an executor thread and yields its items on the event
+    # loop as they are produced; an exception raised by the generator is yielded as the last item
+    loop = asyncio.get_event_loop()
+    items = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for item in generator_fn():
+                loop.call_soon_threadsafe(items.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(items.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(items.put_nowait, done)
+
+    worker = loop.run_in_executor(get_request_executor(), produce)
+    while True:
+        item = await items.get()
+        if item is done:
+            break
+        yield item
+    await worker
+
+'''Streaming variant of /images/
+    - Same form fields, plus stream_format ("ndjson" or "sse")
+    - Every box is sent as soon as it is recognised, so records arrive in completion order,
+    not box order; each carries box_index, the position of the box in annotations:
+        {"type": "detection", "box_index": 3, "detection": {...same fields as processing_result...}}
+        {"type": "skipped", "box_index": 4}
+    - Once all boxes are done the detections are forwarded to the backend (in box order, exactly
+    like /images/) and the stream ends with
+        {"type": "summary", "filename", "total_boxes", "processed", "rejected_boxes", "backend_status", "message"}
+    - If OCR fails half-way an {"type": "error"} record is sent and nothing is forwarded
+'''
+@app.post("/images/stream")
+async def ocr_user_boxes_stream(
+    image: UploadFile = File(...),
+    annotations: str = Form(...),
+    project_id: str = Form(...),
+    preprocess_profile: str = Form(None),
+    crop_format: str = Form(None),
+    stream_format: str = Form("ndjson")
+):
+    log_request(project_id, image)
+    boxes, profile, crop_format = parse_ocr_form(project_id, annotations, preprocess_profile, crop_format)
+    stream_format = resolve_stream_format(stream_format)
+
+    image_bytes = await image.read()
+    logger.debug("Image loaded", extra=fields(nbytes=len(image_bytes)))
+
+    async def records():
+        logger.info("Starting streamed OCR processing", extra=fields(profile=profile, stream_format=stream_format))
+        results = [None] * len(boxes)
+        failed = None
+        ocr = functools.partial(iter_user_boxes, image_bytes, boxes, profile=profile, crop_format=crop_format)
+        async for item in iterate_in_thread(ocr):
+            if isinstance(item, Exception):
+                failed = item
+                logger.error("OCR processing failed", extra=fields(error=str(item)))
+                record_error("request")
+                yield format_stream_record({"type": "error", "message": str(item)}, stream_format)
+                continue
+            idx, detection = item
+            results[idx] = detection
+            if detection is None:
+                yield format_stream_record({"type": "skipped", "box_index": idx}, stream_format)
+            else:
+                yield format_stream_record({"type": "detection", "box_index": idx, "detection": detection}, stream_format)
+
+        detections = [d for d in results if d is not None]
+        logger.info("OCR processing completed", extra=fields(results=len(detections), profile=profile))
+        if failed is None:
+            backend_status, backend_message = await forward_results(
+                project_id, image.filename, image_bytes, detections, image.content_type
+            )
+        else:
+            backend_status, backend_message = "skipped", "OCR processing failed, nothing sent to backend"
+
+        yield format_stream_record({
+            "type": "summary",
+            "filename": image.filename,
+            "total_boxes": len(boxes),
+            "processed": len(detections),
+            "rejected_boxes": count_rejected(detections),
+            "backend_status": backend_status,
+            "message": backend_message
+        }, stream_format)
+        logger.info("Streamed request completed", extra=fields(image=image.filename))
+
+    return StreamingResponse(records(), media_type=STREAM_FORMATS[stream_format])
+
+'''Batch OCR: several images of one project in one request
+    - images: the files; annotations: either a JSON list with one box list per image (same order
+    as the files), or a JSON object mapping file name -> box list
+    - The boxes of all images are scheduled together (shared thread pool in "serial" mode, the
+    process pool in "process" mode, one stitched pass in "stitched" mode)
+    - All results go to the backend in one aggregated call
+    - Without stream_format the response is {"results": [{"image_index", "filename", "processing_result", "rejected_boxes"}],
+    "backend_status", "message"}; with stream_format ("ndjson" or "sse") every image is sent as
+        {"type": "image", "image_index", "filename", "processing_result", "rejected_boxes"}
+    as soon as its last box is done, followed by {"type": "summary", ...}
+'''
+def parse_batch_annotations(annotations, images):
+    try:
+        parsed = json.loads(annotations)
+        if isinstance(parsed, dict):
+            per_image = [parsed.get(image.filename, []) for image in images]
+        elif isinstance(parsed, list) and len(parsed) == len(images):
+            per_image = parsed
+        else:
+            raise ValueError("Annotations must be a list with one box list per image, or an object keyed by file name")
+        if not all(isinstance(boxes, list) for boxes in per_image):
+            raise ValueError("Every image needs a list of boxes")
+    except Exception as e:
+        logger.warning("Error parsing batch annotations", extra=fields(error=str(e)))
+        raise HTTPException(status_code=400, detail=f"Invalid annotations JSON: {e}")
+    return per_image
+
+@app.post("/images/batch")
+async def ocr_user_boxes_batch(
+    images: List[UploadFile] = File(...),
+    annotations: str = Form(...),
+    project_id: str = Form(...),
+    preprocess_profile: str = Form(None),
+    crop_format: str = Form(None),
+    stream_format: str = Form(None)
+):
+    logger.info("New batch OCR request received", extra=fields(images=len(images), project_id=project_id))
+    profile, crop_format = parse_ocr_options(project_id, preprocess_profile, crop_format)
+    per_image_boxes = parse_batch_annotations(annotations, images)
+    if stream_format:
+        stream_format = resolve_stream_format(stream_format)
+    if len({image.filename for image in images}) != len(images):
+        raise HTTPException(status_code=400, detail="File names in a batch must be unique")
+
+    pages = [(await image.read(), boxes) for image, boxes in zip(images, per_image_boxes)]
+    ocr = functools.partial(iter_batch_boxes, pages, profile=profile, crop_format=crop_format, executor=get_box_executor())
+    logger.debug("Starting batch OCR processing", extra=fields(profile=profile))
+
+    async def forward(results):
+        items = [
+            (image.filename, image_bytes, [d for d in page_results if d is not None], image.content_type)
+            for image, (image_bytes, _), page_results in zip(images, pages, results)
+        ]
+        return await forward_batch(project_id, items)
+
+    def image_result(page_index, page_results):
+        return {
+            "image_index": page_index,
+            "filename": images[page_index].filename,
+            "processing_result": [d for d in page_results if d is not None],
+            "rejected_boxes": count_rejected(page_results),
+        }
+
+    if not stream_format:
+        results = [[None] * len(boxes) for _, boxes in pages]
+        async for item in iterate_in_thread(ocr):
+            if isinstance(item, Exception):
+                raise HTTPException(status_code=500, detail=f"OCR processing failed: {item}")
+            page_index, idx, detection = item
+            results[page_index][idx] = detection
+
+        backend_status, backend_message = await forward(results)
+        logger.info("Batch request completed", extra=fields(images=len(images)))
+        return {
+            "results": [image_result(i, page_results) for i, page_results in enumerate(results)],
+            "backend_status": backend_status,
+            "message": backend_message
+        }
+
+    async def records():
+        results = [[None] * len(boxes) for _, boxes in pages]
+        remaining = [len(boxes) for _, boxes in pages]
+        failed = None
+        # images without boxes are complete straight away
+        for page_index, count in enumerate(remaining):
+            if count == 0:
+                yield format_stream_record({"type": "image", **image_result(page_index, [])}, stream_format)
+        async for item in iterate_in_thread(ocr):
+            if isinstance(item, Exception):
+                failed = item
+                logger.error("OCR processing failed", extra=fields(error=str(item)))
+                record_error("request")
+                yield format_stream_record({"type": "error", "message": str(item)}, stream_format)
+                continue
+            page_index, idx, detection = item
+            results[page_index][idx] = detection
+            remaining[page_index] -= 1
+            if remaining[page_index] == 0:
+                yield format_stream_record({"type": "image", **image_result(page_index, results[page_index])}, stream_format)
+
+        if failed is None:
+            backend_status, backend_message = await forward(results)
+        else:
+            backend_status, backend_message = "skipped", "OCR processing failed, nothing sent to backend"
+        yield format_stream_record({
+            "type": "summary",
+            "images": len(images),
+            "total_boxes": sum(len(boxes) for _, boxes in pages),
+            "processed": sum(d is not None for page_results in results for d in page_results),
+            "rejected_boxes": sum(count_rejected(page_results) for page_results in results),
+            "backend_status": backend_status,
+            "message": backend_message
+        }, stream_format)
+        logger.info("Streamed batch request completed", extra=fields(images=len(images)))
+
+    return StreamingResponse(records(), media_type=STREAM_FORMATS[stream_format])
+
+'''Asynchronous OCR jobs
+    - POST /jobs/ takes the same form as /images/ (plus an optional callback_url) and answers 202
+    with a job id as soon as the job is queued; 503 when the queue is full
+    - The job does exactly what /images/ does (OCR, then forward to the backend) on one of the
+    OCR_JOB_WORKERS workers
+    - GET /jobs/{id} for the status and timings, GET /jobs/{id}/result for the /images/ response
+    - With callback_url, the finished job (status, timings and result) is POSTed there as JSON;
+    the URL must pass validate_callback_url (400 otherwise)
+'''
+async def run_ocr_job(job, jobs):
+    payload = job["payload"]
+    timings = job["timings"]
+    loop = asyncio.get_event_loop()
+
+    started = time.perf_counter()
+    detections = await loop.run_in_executor(jobs.executor, functools.partial(
+        process_user_boxes, payload["image_bytes"], payload["boxes"],
+        profile=payload["profile"], crop_format=payload["crop_format"]
+    ))
+    timings["ocr_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    started = time.perf_counter()
+    backend_status, backend_message = await forward_results(
+        payload["project_id"], payload["filename"], payload["image_bytes"], detections, payload["content_type"]
+    )
+    timings["backend_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Job done", extra=fields(job_id=job["job_id"], results=len(detections), backend_status=backend_status))
+
+    return {
+        "processing_result": detections,
+        "filename": payload["filename"],
+        "rejected_boxes": count_rejected(detections),
+        "backend_status": backend_status,
+        "message": backend_message
+    }
+
+async def notify_job_finished(job):
+    return await send_job_callback(job["callback_url"], job_queue.describe(job, include_result=True))
+
+job_queue = OcrJobQueue(run_ocr_job, on_finish=notify_job_finished)
+
+@app.post("/jobs/", status_code=202)
+async def submit_ocr_job(
+    image: UploadFile = File(...),
+    annotations: str = Form(...),
+    project_id: str = Form(...),
+    preprocess_profile: str = Form(None),
+    crop_format: str = Form(None),
+    callback_url: str = Form(None)
+):
+    log_request(project_id, image)
+    boxes, profile, crop_format = parse_ocr_form(project_id, annotations, preprocess_profile, crop_format)
+    if callback_url:
+        try:
+            # resolves the host, so off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, validate_callback_url, callback_url)
+        except ValueError as e:
+            logger.warning("Callback URL rejected", extra=fields(callback_url=callback_url, error=str(e)))
+            raise HTTPException(status_code=400, detail=str(e))
+
+    image_bytes = await image.read()
+    payload = {
+        "image_bytes": image_bytes,
+        "boxes": boxes,
+        "profile": profile,
+        "crop_format": crop_format,
+        "project_id": project_id,
+        "filename": image.filename,
+        "content_type": image.content_type,
+    }
+    try:
+        job = job_queue.submit(payload, callback_url=callback_url or None)
+    except JobQueueFull as e:
+        logger.warning("Job rejected", extra=fields(error=str(e)))
+        raise HTTPException(status_code=503, detail=str(e))
+
+    stats = job_queue.stats()
+    logger.info("Queued job", extra=fields(job_id=job["job_id"], queue_depth=stats["queue_depth"], max_queue=stats["max_queue"]))
+    return {"job_id": job["job_id"], "status": job["status"], "queue_depth": stats["queue_depth"]}
+
+@app.get("/jobs/stats")
+async def ocr_job_stats():
+    return job_queue.stats()
+
+def find_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_ocr_job(job_id: str):
+    return job_queue.describe(find_job(job_id))
+
+@app.get("/jobs/{job_id}/result")
+async def get_ocr_job_result(job_id: str):
+    job = find_job(job_id)
+    if job["status"] not in ("done", "failed"):
+        raise HTTPException(status_code=409, detail=f"Job is still {job['status']}")
+    return job_queue.describe(job, include_result=True)
+
+@app.get("/crops/{crop_id}")
+async def get_crop(crop_id: str, format: str = "png"):
+    # Crops returned with crop_format=ref are only encoded here, when someone actually asks for them
+    crop = get_crop_store().get(crop_id)
+    if crop is None:
+        raise HTTPException(status_code=404, detail="Crop not found or expired")
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, expected one of {sorted(MEDIA_TYPES)}")
+    return Response(content=encode_crop(crop, format), media_type=MEDIA_TYPES[format])
+
+@app.get("/outbox")
+async def backend_outbox(limit: int = 50):
+    # Results not yet delivered to the backend: still retrying (pending) or out of attempts (failed)
+    outbox = get_outbox()
+    if outbox is None:
+        raise HTTPException(status_code=404, detail="Backend outbox is disabled")
+    return {
+        **outbox.stats(),
+        "circuit_breaker": get_deliverer().breaker.stats(),
+        "pending_deliveries": outbox.list("pending", limit),
+        "failed_deliveries": outbox.list("failed", limit),
+    }
+
+@app.post("/outbox/retry")
+async def retry_backend_outbox(delivery_id: int = None):
+    # Give failed deliveries (all, or just delivery_id) a fresh set of attempts
+    outbox = get_outbox()
+    if outbox is None:
+        raise HTTPException(status_code=404, detail="Backend outbox is disabled")
+    requeued = outbox.retry_failed(delivery_id)
+    get_deliverer().wake()
+    return {"requeued": requeued}
+
+@app.get("/ocr/stats")
+async def ocr_stats():
+    cache = get_ocr_cache()
+    return {
+        "engine_pool": get_engine_pool().stats(),
+        "cache": cache.stats() if cache is not None else None,
+        "jobs": job_queue.stats(),
+        "backend": backend_stats(),
+        "executors": executor_stats(),
+    }
+
+'''Prometheus-style metrics
+    - ocr_stage_duration_seconds{stage}: histogram per pipeline stage (decode, crop, preprocess, ocr,
+    encode, backend_forward); process-pool workers send their timings back with each detection
+    - ocr_boxes_processed_total{source}: boxes with a detection from OCR, the cache or a shared duplicate
+    - ocr_boxes_skipped_total{reason}: invalid, blank or non_text boxes
+    - ocr_errors_total{stage}: OCR, worker, request and backend forwarding errors
+    - ocr_executor_queue_depth{executor} / ocr_executor_threads{executor}: saturation of the request,
+    box and line thread pools
+'''
+@app.get("/metrics")
+async def metrics():
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.post("/ocr/cache/invalidate")
+async def invalidate_ocr_cache():
+    # Call after upgrading Tesseract or replacing khm.traineddata
+    cache = get_ocr_cache()
+    if cache is None:
+        raise HTTPException(status_code=404, detail="OCR cache is disabled")
+    cache.invalidate()
+    return {"status": "invalidated", "fingerprint": cache.fingerprint}
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_queue.start()
+    if get_outbox() is not None:
+        get_deliverer()
+
+@app.on_event("shutdown")
+async def shutdown_ocr_engines():
+    await job_queue.stop()
+    if _deliverer is not None:
+        await _deliverer.stop()
+    await close_backend_client()
+    shutdown_process_pool()
+    shutdown_box_executor()
+    shutdown_line_executor()
+    shutdown_request_executor()
+    get_engine_pool().close()
+    cache = get_ocr_cache()
+    if cache is not None:
+        cache.close()
+    outbox = get_outbox()
+    if outbox is not None:
+        outbox.close()
+
 if __name__ == "__main__":
     uvicorn.run("main_server:app", host="127.0.0.1", port=8000, reload=True)
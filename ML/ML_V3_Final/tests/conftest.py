@@ -0,0 +1,46 @@
+import os, sys
+import pytest
+
+# utils/ocr_utils.py refuses to import without these; the tests never start the tesseract binary
+os.environ.setdefault("TESSERACT_CMD", "tesseract")
+os.environ.setdefault("TESSERACT_TESSDATA_PREFIX", os.path.dirname(__file__))
+# results cached by one test would otherwise be served to the next
+os.environ.setdefault("OCR_CACHE", "0")
+# endpoint tests forward inside the request instead of writing to the outbox under data/
+os.environ.setdefault("BACKEND_OUTBOX", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+'''Stand-in for the Tesseract engine pool
+    - Reads every crop as "text", so the pipeline around OCR runs for real
+'''
+class FakeEnginePool:
+    def __init__(self):
+        self.calls = 0
+
+    def image_to_string(self, pil_image, lang="khm", psm=None):
+        self.calls += 1
+        return "text"
+
+    def image_to_text_conf(self, pil_image, lang="khm", psm=None):
+        self.calls += 1
+        return "text", 90.0
+
+    def image_to_lines(self, pil_image, lang="khm", psm=None):
+        # no lines: stitched pages map nothing, so every box falls back to per-box OCR
+        self.calls += 1
+        return []
+
+    def stats(self):
+        return {"warm_hits": self.calls, "cold_starts": 0, "subprocess_calls": 0, "engine_errors": 0,
+                "total_calls": self.calls, "backend": "fake"}
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def fake_engine(monkeypatch):
+    from utils import tess_engine
+    pool = FakeEnginePool()
+    monkeypatch.setattr(tess_engine, "_engine_pool", pool)
+    return pool
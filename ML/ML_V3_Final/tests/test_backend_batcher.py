@@ -0,0 +1,84 @@
+import json, asyncio
+import httpx
+import pytest
+from utils import api_client
+from utils.api_client import BackendBatcher
+
+
+def item(name):
+    return (name, b"png", [{"extracted_text": name}], "image/png")
+
+@pytest.fixture
+def backend(monkeypatch):
+    '''Shared client replaced by an in-memory backend; every call is recorded and answered with status'''
+    calls, state = [], {"status": 200}
+    def handler(request):
+        body = request.read().decode("latin-1")
+        files = [part.split('filename="')[1].split('"')[0] for part in body.split("\r\n--")[:-1] if 'filename="' in part]
+        calls.append((str(request.url), files))
+        return httpx.Response(state["status"])
+    monkeypatch.setattr(api_client, "get_backend_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return calls, state
+
+async def submit_all(batcher, submissions, spacing=0.0):
+    tasks = []
+    for url, project_id, name in submissions:
+        tasks.append(asyncio.ensure_future(batcher.submit(url, project_id, item(name))))
+        await asyncio.sleep(spacing)
+    return await asyncio.gather(*tasks)
+
+def test_images_within_window_share_one_call(backend):
+    calls, _ = backend
+    batcher = BackendBatcher(window_ms=50, max_images=16)
+    results = asyncio.run(submit_all(batcher, [("http://backend/upload", "p1", f"{i}.png") for i in range(3)]))
+    assert calls == [("http://backend/upload", ["0.png", "1.png", "2.png"])]
+    assert results == [("success", "Results sent to backend")] * 3
+
+def test_images_after_window_go_in_next_call(backend):
+    calls, _ = backend
+    batcher = BackendBatcher(window_ms=20, max_images=16)
+    asyncio.run(submit_all(batcher, [("http://backend/upload", "p1", f"{i}.png") for i in range(2)], spacing=0.1))
+    assert [files for _, files in calls] == [["0.png"], ["1.png"]]
+
+def test_batches_are_grouped_per_project(backend):
+    calls, _ = backend
+    batcher = BackendBatcher(window_ms=50, max_images=16)
+    asyncio.run(submit_all(batcher, [("http://backend/upload", "p1", "a.png"), ("http://backend/upload", "p2", "b.png"),
+                                     ("http://backend/upload", "p1", "c.png")]))
+    assert sorted(files for _, files in calls) == [["a.png", "c.png"], ["b.png"]]
+
+def test_full_batch_and_repeated_name_are_sent_early(backend):
+    calls, _ = backend
+    # the last c.png is alone in its batch and waits out the window
+    batcher = BackendBatcher(window_ms=200, max_images=2)
+    asyncio.run(asyncio.wait_for(submit_all(batcher, [("http://backend/upload", "p1", "a.png"), ("http://backend/upload", "p1", "b.png"),
+                                                      ("http://backend/upload", "p1", "c.png"), ("http://backend/upload", "p1", "c.png")]), 1.0))
+    assert [files for _, files in calls] == [["a.png", "b.png"], ["c.png"], ["c.png"]]
+
+def test_backend_error_reaches_every_waiter(backend):
+    calls, state = backend
+    state["status"] = 500
+    batcher = BackendBatcher(window_ms=50, max_images=16)
+    results = asyncio.run(submit_all(batcher, [("http://backend/upload", "p1", f"{i}.png") for i in range(3)]))
+    assert len(calls) == 1
+    assert [status for status, _ in results] == ["failed"] * 3
+    assert len({message for _, message in results}) == 1 and "500" in results[0][1]
+
+def test_unexpected_error_does_not_leave_waiters_hanging(monkeypatch):
+    async def broken(backend_url, project_id, items):
+        raise RuntimeError("encoder blew up")
+    monkeypatch.setattr(api_client, "_post_images", broken)
+    batcher = BackendBatcher(window_ms=10, max_images=16)
+    results = asyncio.run(asyncio.wait_for(submit_all(batcher, [("u", "p1", "a.png"), ("u", "p1", "b.png")]), 1.0))
+    assert results == [("failed", "encoder blew up")] * 2
+
+def test_flush_all_sends_pending_batches(backend):
+    calls, _ = backend
+    batcher = BackendBatcher(window_ms=60000, max_images=16)
+    async def run():
+        waiter = asyncio.ensure_future(batcher.submit("http://backend/upload", "p1", item("a.png")))
+        await asyncio.sleep(0)
+        await batcher.flush_all()
+        return await waiter
+    assert asyncio.run(asyncio.wait_for(run(), 1.0))[0] == "success"
+    assert [files for _, files in calls] == [["a.png"]]
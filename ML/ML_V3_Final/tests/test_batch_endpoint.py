@@ -0,0 +1,83 @@
+import io, json
+import pytest
+from PIL import Image, ImageDraw
+from fastapi.testclient import TestClient
+from utils import ocr_utils
+
+
+def page_bytes(lines):
+    page = Image.new("RGB", (400, 60 * len(lines) + 20), "white")
+    draw = ImageDraw.Draw(page)
+    for i, text in enumerate(lines):
+        draw.text((15, 60 * i + 25), text, fill="black")
+    buffer = io.BytesIO()
+    page.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+# a.png: two boxes, b.png: none, c.png: one box on the page and one outside it
+PAGES = {
+    "a.png": (page_bytes(["first", "second"]), [[10, 10, 200, 70], [10, 70, 200, 130]]),
+    "b.png": (page_bytes(["empty"]), []),
+    "c.png": (page_bytes(["third"]), [[10, 10, 300, 70], [500, 500, 600, 600]]),
+}
+
+@pytest.fixture
+def backend(fake_engine, monkeypatch):
+    '''Records every aggregated backend call'''
+    import main_server
+    calls = []
+    async def send_batch_to_backend(url, project_id, items):
+        calls.append((project_id, [(name, detections) for name, _, detections, _ in items]))
+        return "success", "stored"
+    monkeypatch.setattr(main_server, "send_batch_to_backend", send_batch_to_backend)
+    return calls
+
+@pytest.fixture(params=["serial", "stitched"])
+def execution_mode(request, monkeypatch):
+    monkeypatch.setattr(ocr_utils, "OCR_EXECUTION_MODE", request.param)
+    return request.param
+
+def post_batch(**form):
+    import main_server
+    files = [("images", (name, data, "image/png")) for name, (data, _) in PAGES.items()]
+    data = dict({"annotations": json.dumps({name: boxes for name, (_, boxes) in PAGES.items()}),
+                 "project_id": "p1", "crop_format": "none"}, **form)
+    return TestClient(main_server.app).post("/images/batch", data=data, files=files)
+
+def boxes_of(processing_result):
+    return [d["box_coordinates"] for d in processing_result]
+
+def test_results_follow_file_and_box_order(backend, execution_mode):
+    response = post_batch()
+    assert response.status_code == 200
+    body = response.json()
+    assert [(r["image_index"], r["filename"]) for r in body["results"]] == [(0, "a.png"), (1, "b.png"), (2, "c.png")]
+    assert [boxes_of(r["processing_result"]) for r in body["results"]] == [
+        [[10, 10, 200, 70], [10, 70, 200, 130]], [], [[10, 10, 300, 70]]]
+    assert (body["backend_status"], body["message"]) == ("success", "stored")
+
+    # the whole batch goes to the backend in one call, in file order
+    (project_id, items), = backend
+    assert project_id == "p1"
+    assert [(name, boxes_of(detections)) for name, detections in items] == [
+        (r["filename"], boxes_of(r["processing_result"])) for r in body["results"]]
+
+def test_streamed_images_come_once_each_then_summary(backend, execution_mode):
+    response = post_batch(stream_format="ndjson")
+    *images, summary = [json.loads(line) for line in response.text.splitlines()]
+    # b.png has no boxes, so it is complete before any OCR has run
+    assert images[0]["filename"] == "b.png"
+    assert sorted(r["image_index"] for r in images) == [0, 1, 2]
+    assert {r["filename"]: len(r["processing_result"]) for r in images} == {"a.png": 2, "b.png": 0, "c.png": 1}
+    assert summary == {"type": "summary", "images": 3, "total_boxes": 4, "processed": 3,
+                       "rejected_boxes": 0, "backend_status": "success", "message": "stored"}
+
+def test_annotations_as_list_follow_file_order(backend):
+    annotations = json.dumps([boxes for _, boxes in PAGES.values()])
+    body = post_batch(annotations=annotations).json()
+    assert [len(r["processing_result"]) for r in body["results"]] == [2, 0, 1]
+
+@pytest.mark.parametrize("annotations", ["[[]]", "{\"a.png\": 3}", "not json"])
+def test_bad_annotations_are_rejected(backend, annotations):
+    assert post_batch(annotations=annotations).status_code == 400
+    assert backend == []
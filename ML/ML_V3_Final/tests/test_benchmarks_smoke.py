@@ -0,0 +1,18 @@
+import sys, json
+from benchmarks import pipeline
+
+
+def run_pipeline(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["pipeline", "--box-counts", "3", "--repeat", "1", "--warmup", "0", *args])
+    pipeline.main()
+
+def test_pipeline_benchmark_runs_every_stage(fake_engine, monkeypatch, tmp_path):
+    output = tmp_path / "bench.json"
+    run_pipeline(monkeypatch, "--output", str(output))
+
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert [case["stage"] for case in report["results"]] == list(pipeline.STAGES)
+    assert all(case["boxes_per_s"] > 0 for case in report["results"])
+
+    # a run compared with itself never regresses
+    run_pipeline(monkeypatch, "--stages", "preprocess", "--baseline", str(output), "--tolerance", "10")
@@ -0,0 +1,46 @@
+import io
+import pytest
+from PIL import Image, ImageDraw
+from utils import box_consolidate
+from utils.box_consolidate import consolidate_boxes
+
+
+def test_redrawn_box_is_a_duplicate_of_the_larger_one():
+    items = [(0, (10, 10, 200, 50)), (1, (12, 11, 199, 50)), (2, (10, 100, 200, 140))]
+    assert consolidate_boxes(items) == {1: 0}
+
+def test_box_nested_in_a_slightly_larger_one_is_a_duplicate():
+    # 0 lies inside 1 and covers 90% of it
+    items = [(0, (15, 12, 195, 48)), (1, (10, 10, 200, 50))]
+    assert consolidate_boxes(items) == {0: 1}
+
+def test_word_box_inside_paragraph_box_keeps_its_own_ocr():
+    items = [(0, (10, 10, 400, 200)), (1, (20, 20, 80, 40))]
+    assert consolidate_boxes(items) == {}
+
+def test_several_copies_share_one_representative():
+    items = [(0, (10, 10, 200, 50)), (1, (10, 10, 200, 50)), (2, (11, 10, 200, 50)), (3, (300, 10, 400, 50))]
+    assert consolidate_boxes(items) == {1: 0, 2: 0}
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(box_consolidate, "OCR_DEDUP", False)
+    assert consolidate_boxes([(0, (10, 10, 200, 50)), (1, (10, 10, 200, 50))]) == {}
+
+@pytest.mark.parametrize("execution_mode", ["serial", "stitched"])
+def test_duplicates_are_marked_shared(fake_engine, execution_mode):
+    from utils.ocr_utils import process_user_boxes
+    page = Image.new("RGB", (400, 200), "white")
+    ImageDraw.Draw(page).text((20, 20), "Test 123", fill="black")
+    ImageDraw.Draw(page).text((20, 120), "Test 456", fill="black")
+    buffer = io.BytesIO()
+    page.save(buffer, format="PNG")
+    boxes = [[10, 10, 200, 60], [10, 110, 200, 160], [11, 10, 200, 60]]
+
+    detections = process_user_boxes(buffer.getvalue(), boxes, execution_mode=execution_mode, crop_format="none")
+    assert [d["box_coordinates"] for d in detections] == boxes
+    assert [d["shared_result"] for d in detections] == [False, False, True]
+    assert detections[2]["shared_from"] == 0
+    assert "shared_from" not in detections[0]
+    assert detections[2]["extracted_text"] == detections[0]["extracted_text"]
+    # only the two distinct regions reach the engine (stitched mode also reads each stitched page once)
+    assert fake_engine.calls == (2 if execution_mode == "serial" else 3)
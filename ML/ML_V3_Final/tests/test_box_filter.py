@@ -0,0 +1,102 @@
+import numpy as np
+from utils import box_filter
+from utils.box_filter import reject_reasons, BLANK, NON_TEXT
+
+
+def paper(height=60, width=240, level=245):
+    return np.full((height, width), level, np.uint8)
+
+def text_like():
+    crop = paper()
+    for i in range(10):
+        x = 10 + i * 22
+        crop[20:42, x:x + 3] = 20          # vertical strokes
+        crop[20:23, x:x + 12] = 20         # top bars
+    return crop
+
+def photo_like():
+    crop = paper()
+    crop[5:55, 20:150] = 30  # 45% of the box
+    return crop
+
+def test_text_is_kept():
+    assert reject_reasons([text_like()]) == [None]
+
+def test_empty_and_low_contrast_boxes_are_blank():
+    rng = np.random.default_rng(0)
+    texture = np.clip(rng.normal(230, 6, (60, 240)), 0, 255).astype(np.uint8)
+    assert reject_reasons([paper(), texture]) == [BLANK, BLANK]
+
+def test_stray_dot_is_blank():
+    crop = paper()
+    crop[30:32, 100:102] = 0
+    assert reject_reasons([crop]) == [BLANK]
+
+def test_filled_area_is_non_text():
+    assert reject_reasons([photo_like()]) == [NON_TEXT]
+
+def test_solid_stamp_below_ink_limit_is_caught_by_components():
+    crop = paper()
+    crop[10:50, 20:130] = 30  # 31% ink: passes the ink statistics, but is one solid blob
+    assert reject_reasons([crop]) == [NON_TEXT]
+
+def bold_text():
+    crop = paper()
+    for i in range(8):
+        x = 8 + i * 29
+        crop[8:52, x:x + 24] = 20          # heavy glyph body
+        crop[20:40, x + 8:x + 16] = 245    # counter
+    return crop
+
+def large_text():
+    crop = paper()
+    for x in (15, 125):
+        crop[5:55, x:x + 100] = 20         # two big ring-shaped glyphs
+        crop[17:43, x + 12:x + 88] = 245
+    return crop
+
+def dense_mass():
+    crop = paper()
+    rows, cols = np.mgrid[5:55, 10:230]
+    # one connected mass with 40% of it punched out, too holey for the stamp rule
+    crop[5:55, 10:230] = np.where(np.isin((rows + cols) % 5, (0, 2)), 245, 30)
+    return crop
+
+def ink(crop):
+    return box_filter.ink_statistics([crop])[1][0]
+
+def test_bold_and_large_text_above_ink_limit_are_kept():
+    assert ink(bold_text()) > box_filter.OCR_NONTEXT_MAX_INK
+    assert ink(large_text()) > box_filter.OCR_NONTEXT_MAX_INK
+    assert reject_reasons([bold_text(), large_text()]) == [None, None]
+
+def test_dense_box_dominated_by_one_mass_is_non_text():
+    assert ink(dense_mass()) > box_filter.OCR_NONTEXT_MAX_INK
+    assert reject_reasons([dense_mass()]) == [NON_TEXT]
+
+def test_light_text_on_dark_background_is_kept():
+    assert reject_reasons([255 - text_like()]) == [None]
+
+def test_reasons_follow_crop_order_and_views_work():
+    page = np.vstack([text_like(), paper(), photo_like()])
+    crops = [page[0:60, :], page[60:120, :], page[120:180, :]]
+    assert reject_reasons(crops) == [None, BLANK, NON_TEXT]
+
+def test_filter_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(box_filter, "OCR_BOX_FILTER", False)
+    assert reject_reasons([paper(), photo_like()]) == [None, None]
+
+def test_rejected_boxes_are_reported_without_ocr(fake_engine):
+    import io
+    from PIL import Image
+    from utils.ocr_utils import process_user_boxes, count_rejected
+    page = np.vstack([text_like(), paper(), photo_like()])
+    buffer = io.BytesIO()
+    Image.fromarray(page).save(buffer, format="PNG")
+    boxes = [[0, 0, 240, 60], [0, 60, 240, 120], [0, 120, 240, 180]]
+
+    detections = process_user_boxes(buffer.getvalue(), boxes, execution_mode="serial", crop_format="none")
+    assert [d["reject_reason"] for d in detections] == [None, BLANK, NON_TEXT]
+    assert [d["extracted_text"] for d in detections[1:]] == ["", ""]
+    assert count_rejected(detections) == 2
+    assert fake_engine.calls == 1
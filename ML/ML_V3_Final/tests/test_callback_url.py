@@ -0,0 +1,97 @@
+import json, socket, asyncio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.synthetic import render_page
+from utils import api_client
+from utils.api_client import validate_callback_url, pinned_callback_request, send_job_callback
+
+
+def resolves_to(monkeypatch, *answers):
+    '''Every getaddrinfo call returns the next address in answers (the last one repeats)'''
+    answers = list(answers)
+    def getaddrinfo(host, port, *args, **kwargs):
+        address = answers.pop(0) if len(answers) > 1 else answers[0]
+        family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        return [(family, socket.SOCK_STREAM, 6, "", (address, port))]
+    monkeypatch.setattr(api_client.socket, "getaddrinfo", getaddrinfo)
+
+@pytest.mark.parametrize("url, allowed", [
+    ("ftp://hooks.example.com/done", ["*"]),
+    ("file:///etc/passwd", ["*"]),
+    ("http://other.example.org/done", ["hooks.example.com"]),
+    ("http://127.0.0.1:8000/images/", ["*"]),
+    ("http://localhost/done", ["localhost"]),
+    ("http://[::1]/done", ["*"]),
+    ("http://169.254.169.254/latest/meta-data/", ["*"]),
+    ("http://[::ffff:127.0.0.1]/done", ["*"]),
+    ("http://0.0.0.0/done", ["*"]),
+    ("http://10.0.0.5/done", ["*"]),
+    ("http://192.168.1.10/done", ["*"]),
+    ("http://172.16.0.1/done", ["*"]),
+    ("http://100.64.0.1/done", ["*"]),
+    ("http://240.0.0.1/done", ["*"]),
+    ("http://[fd00::1]/done", ["*"]),
+])
+def test_rejected_callback_urls(url, allowed):
+    with pytest.raises(ValueError):
+        validate_callback_url(url, allowed)
+
+@pytest.mark.parametrize("url, allowed", [
+    ("https://93.184.216.34/done", ["93.184.216.34"]),
+    ("http://93.184.216.34:8080/done", ["*"]),
+])
+def test_allowed_callback_urls(url, allowed):
+    assert validate_callback_url(url, allowed) == url
+
+def test_subdomain_allowlist():
+    assert api_client.host_allowed("hooks.example.com", [".example.com"])
+    assert not api_client.host_allowed("example.com.evil.net", [".example.com"])
+
+def test_name_resolving_to_private_network_is_rejected(monkeypatch):
+    resolves_to(monkeypatch, "10.1.2.3")
+    with pytest.raises(ValueError, match="forbidden address"):
+        validate_callback_url("https://hooks.example.com/done", ["hooks.example.com"])
+
+def test_callback_is_pinned_to_validated_address(monkeypatch):
+    resolves_to(monkeypatch, "93.184.216.34")
+    url, headers, extensions = pinned_callback_request("https://hooks.example.com:8443/done?job=1", ["hooks.example.com"])
+    assert url == "https://93.184.216.34:8443/done?job=1"
+    assert headers == {"Host": "hooks.example.com:8443"}
+    assert extensions == {"sni_hostname": "hooks.example.com"}
+
+def test_callback_is_sent_to_the_address_that_was_checked(monkeypatch):
+    resolves_to(monkeypatch, "93.184.216.34", "127.0.0.1")
+    monkeypatch.setattr(api_client, "OCR_CALLBACK_ALLOWED_HOSTS", ["hooks.example.com"])
+    sent = []
+    async def post(self, url, **kwargs):
+        sent.append((url, kwargs["headers"]))
+        return httpx.Response(200, request=httpx.Request("POST", url))
+    monkeypatch.setattr(httpx.AsyncClient, "post", post)
+
+    assert asyncio.run(send_job_callback("http://hooks.example.com/done", {"status": "done"})) == "success"
+    # the second answer (loopback) is never looked up: the request goes to the address that passed
+    assert sent == [("http://93.184.216.34/done", {"Host": "hooks.example.com"})]
+
+def test_name_rebound_after_submission_is_not_called(monkeypatch):
+    # public when the job is submitted, loopback by the time the job is done
+    resolves_to(monkeypatch, "93.184.216.34", "127.0.0.1")
+    monkeypatch.setattr(api_client, "OCR_CALLBACK_ALLOWED_HOSTS", ["hooks.example.com"])
+    async def post(self, url, **kwargs):
+        raise AssertionError(f"callback sent to {url}")
+    monkeypatch.setattr(httpx.AsyncClient, "post", post)
+
+    validate_callback_url("http://hooks.example.com/done")
+    status = asyncio.run(send_job_callback("http://hooks.example.com/done", {"status": "done"}))
+    assert status.startswith("failed") and "forbidden address" in status
+
+def test_jobs_endpoint_rejects_loopback_callback(fake_engine, monkeypatch):
+    import main_server
+    monkeypatch.setattr(api_client, "OCR_CALLBACK_ALLOWED_HOSTS", ["*"])
+    image_bytes, boxes, _ = render_page(1)
+    with TestClient(main_server.app) as client:
+        response = client.post("/jobs/", data={"annotations": json.dumps(boxes), "project_id": "p",
+                                               "callback_url": "http://127.0.0.1:8000/images/"},
+                               files={"image": ("page.png", image_bytes, "image/png")})
+    assert response.status_code == 400
+    assert "forbidden address" in response.json()["detail"]
@@ -0,0 +1,85 @@
+import io, base64
+import pytest
+from PIL import Image, ImageDraw
+from fastapi.testclient import TestClient
+from utils import crop_store
+from utils.crop_store import CropStore, finalize_crop, resolve_crop_format, decode_crop, CROP_KEY
+
+
+def binary_crop():
+    crop = Image.new("L", (60, 20), 255)
+    ImageDraw.Draw(crop).rectangle((5, 5, 40, 15), fill=0)
+    return crop
+
+def page_bytes():
+    page = Image.new("RGB", (200, 100), "white")
+    ImageDraw.Draw(page).text((15, 30), "Test 123", fill="black")
+    buffer = io.BytesIO()
+    page.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def test_unknown_format_is_rejected():
+    assert resolve_crop_format("PNG1") == "png1"
+    with pytest.raises(ValueError):
+        resolve_crop_format("jpeg")
+
+@pytest.mark.parametrize("crop_format,image_format", [("png", "PNG"), ("png1", "PNG"), ("webp", "WEBP")])
+def test_inline_formats_round_trip(crop_format, image_format):
+    detection = finalize_crop({"extracted_text": "x", CROP_KEY: binary_crop()}, crop_format)
+    assert CROP_KEY not in detection
+    data = base64.b64decode(detection["cropped_image_base64"])
+    assert Image.open(io.BytesIO(data)).format == image_format
+    assert list(decode_crop(data).getdata()) == list(binary_crop().getdata())
+    assert detection.get("cropped_image_format") == (None if crop_format == "png" else crop_format)
+
+def test_png1_is_smaller_than_png():
+    png = finalize_crop({CROP_KEY: binary_crop()}, "png")["cropped_image_base64"]
+    png1 = finalize_crop({CROP_KEY: binary_crop()}, "png1")["cropped_image_base64"]
+    assert len(png1) < len(png)
+
+def test_none_drops_the_crop():
+    assert finalize_crop({"extracted_text": "x", CROP_KEY: binary_crop()}, "none") == {"extracted_text": "x"}
+
+def test_store_keeps_only_the_latest_crops():
+    store = CropStore(max_entries=2)
+    first, second = store.put(binary_crop()), store.put(binary_crop())
+    store.get(first)
+    third = store.put(binary_crop())
+    assert store.get(second) is None
+    assert store.get(first) is not None and store.get(third) is not None
+    assert len(store) == 2
+
+def test_ref_crops_are_served_from_crops_endpoint(fake_engine, monkeypatch):
+    import main_server
+    from utils import text_scale
+    # keep the crop at box size
+    monkeypatch.setattr(text_scale, "OCR_TEXT_HEIGHT_TARGET", 0)
+    from utils.ocr_utils import process_user_boxes
+    detection, = process_user_boxes(page_bytes(), [[10, 20, 150, 60]], crop_format="ref")
+    assert "cropped_image_base64" not in detection
+    ref = detection["cropped_image_ref"]
+    assert ref.startswith("/crops/")
+
+    client = TestClient(main_server.app)
+    response = client.get(ref, params={"format": "png1"})
+    assert response.status_code == 200 and response.headers["content-type"] == "image/png"
+    assert decode_crop(response.content).size == (140, 40)
+    assert client.get(ref, params={"format": "tiff"}).status_code == 400
+    assert client.get("/crops/unknown").status_code == 404
+
+def test_ocr_endpoint_uses_requested_crop_format(fake_engine, monkeypatch):
+    import main_server
+    async def no_backend(*args, **kwargs):
+        return "skipped", "backend disabled in tests"
+    monkeypatch.setattr(main_server, "send_to_backend", no_backend)
+    client = TestClient(main_server.app)
+    form = {"annotations": "[[10, 20, 150, 60]]", "project_id": "p1"}
+    files = {"image": ("page.png", page_bytes(), "image/png")}
+
+    response = client.post("/images/", data=dict(form, crop_format="none"), files=files)
+    assert response.status_code == 200
+    detection, = response.json()["processing_result"]
+    assert "cropped_image_base64" not in detection and "cropped_image_ref" not in detection
+
+    response = client.post("/images/", data=dict(form, crop_format="bmp"), files=files)
+    assert response.status_code == 400
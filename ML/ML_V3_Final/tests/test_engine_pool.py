@@ -0,0 +1,109 @@
+import io, time, threading
+import pytest
+from PIL import Image, ImageDraw
+from utils.tess_engine import TesseractEnginePool
+
+
+class FakeHandle:
+    def __init__(self):
+        self.ended = False
+
+    def Clear(self):
+        pass
+
+    def End(self):
+        self.ended = True
+
+class FlakyPool(TesseractEnginePool):
+    '''The first handle fails to initialise once the test releases it'''
+    def __init__(self):
+        super().__init__(size=1, backend="tesserocr")
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.attempts = 0
+
+    def _new_handle(self, lang):
+        self.attempts += 1
+        if self.attempts == 1:
+            self.started.set()
+            self.release.wait(5)
+            raise RuntimeError("traineddata missing")
+        return FakeHandle()
+
+
+def test_waiter_takes_over_slot_of_failed_creation():
+    pool = FlakyPool()
+    errors, handles = [], []
+
+    def first():
+        try:
+            with pool._checkout("khm"):
+                pass
+        except RuntimeError as e:
+            errors.append(e)
+
+    def waiter():
+        with pool._checkout("khm") as handle:
+            handles.append(handle)
+
+    creator = threading.Thread(target=first, daemon=True)
+    creator.start()
+    pool.started.wait(5)
+    waiting = threading.Thread(target=waiter, daemon=True)
+    waiting.start()
+    time.sleep(0.2)  # the waiter is now blocked on the idle queue
+    pool.release.set()
+    creator.join(5)
+    waiting.join(5)
+
+    assert not waiting.is_alive()
+    assert len(errors) == 1 and len(handles) == 1
+    assert pool.stats()["cold_starts"] == 1
+
+def test_waiter_gives_up_on_broken_language():
+    pool = FlakyPool()
+    pool._broken.add("khm")
+    with pytest.raises(RuntimeError):
+        with pool._checkout("khm"):
+            pass
+
+class HandlePool(TesseractEnginePool):
+    def __init__(self):
+        super().__init__(size=1, backend="tesserocr")
+        self.handles = []
+
+    def _new_handle(self, lang):
+        self.handles.append(FakeHandle())
+        return self.handles[-1]
+
+def test_handle_that_fails_mid_call_is_retired():
+    pool = HandlePool()
+    with pytest.raises(ValueError):
+        with pool._checkout("khm"):
+            raise ValueError("SetImage failed")
+    pool._in_process_failed("khm", ValueError("SetImage failed"))
+
+    broken, = pool.handles
+    assert broken.ended
+    assert pool.stats()["engines_loaded"] == {"khm": 0}
+    # the language still works: the freed slot gets a fresh handle, the broken one is never reused
+    assert "khm" not in pool._broken
+    with pool._checkout("khm") as handle:
+        assert handle is not broken
+    assert pool.stats()["cold_starts"] == 2
+
+def test_boxes_are_read_through_the_shared_pool(fake_engine):
+    from utils.ocr_utils import process_user_boxes
+    page = Image.new("RGB", (400, 200), "white")
+    draw = ImageDraw.Draw(page)
+    boxes = [[10, 10, 190, 60], [10, 100, 190, 150], [300, 300, 350, 350]]
+    for x1, y1, x2, y2 in boxes[:2]:
+        draw.text((x1 + 5, y1 + 10), "Test 123", fill="black")
+    buffer = io.BytesIO()
+    page.save(buffer, format="PNG")
+
+    detections = process_user_boxes(buffer.getvalue(), boxes)
+
+    # the third box lies outside the page and is skipped
+    assert [d["extracted_text"] for d in detections] == ["text", "text"]
+    assert fake_engine.calls == 2
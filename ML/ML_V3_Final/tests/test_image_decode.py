@@ -0,0 +1,83 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image
+from utils.image_decode import decode_page, reduce_factor, union_rect, open_page, DecodedPage
+
+
+def gradient_page(width=640, height=480):
+    # every pixel encodes its position, so a crop can be traced back to where it came from
+    x = np.arange(width)[None, :] % 256
+    y = np.arange(height)[:, None] // 2 % 256
+    return Image.fromarray(np.dstack([x + 0 * y, y + 0 * x, np.full((height, width), 128)]).astype(np.uint8))
+
+def encoded(page, image_format):
+    buffer = io.BytesIO()
+    page.save(buffer, format=image_format, quality=95)
+    return buffer.getvalue()
+
+RECTS = [(100, 80, 300, 140), (250, 200, 400, 260)]
+
+def test_reduce_factor_keeps_smallest_box_tall_enough():
+    assert reduce_factor(RECTS, min_box_height=0) == 1
+    assert reduce_factor(RECTS, min_box_height=15) == 4
+    assert reduce_factor(RECTS, min_box_height=30) == 2
+    assert reduce_factor(RECTS, min_box_height=61) == 1
+    assert union_rect(RECTS) == (100, 80, 400, 260)
+
+def test_full_mode_decodes_whole_page():
+    page = open_page(encoded(gradient_page(), "PNG"))
+    decoded = decode_page(page, RECTS, mode="full")
+    assert (decoded.origin, decoded.factor, decoded.size) == ((0, 0), 1, (640, 480))
+    assert decoded.gray.shape == (480, 640)
+
+def test_region_mode_keeps_only_the_boxes_area():
+    original = gradient_page()
+    full = np.asarray(original.convert("L"))
+    decoded = decode_page(open_page(encoded(original, "PNG")), RECTS, mode="region", min_box_height=0)
+    assert (decoded.origin, decoded.factor, decoded.size) == ((100, 80), 1, (640, 480))
+    assert decoded.gray.shape == (180, 300)
+    assert decoded.nbytes < full.nbytes
+
+    # a box cut through to_local is the same pixels as the box cut from the full page
+    for x1, y1, x2, y2 in RECTS:
+        lx1, ly1, lx2, ly2 = decoded.to_local((x1, y1, x2, y2))
+        assert np.array_equal(decoded.gray[ly1:ly2, lx1:lx2], full[y1:y2, x1:x2])
+
+def test_png_is_reduced_after_decode():
+    decoded = decode_page(open_page(encoded(gradient_page(), "PNG")), RECTS, mode="region", min_box_height=15)
+    assert (decoded.origin, decoded.factor) == ((100, 80), 4)
+    assert decoded.gray.shape == (45, 75)
+    assert decoded.to_local((100, 80, 300, 140)) == (0, 0, 50, 15)
+
+@pytest.mark.parametrize("min_box_height,factor", [(30, 2), (15, 4)])
+def test_jpeg_draft_origin_is_aligned_to_factor(min_box_height, factor):
+    rects = [(101, 83, 301, 143), (250, 200, 400, 260)]
+    decoded = decode_page(open_page(encoded(gradient_page(), "JPEG")), rects, mode="region", min_box_height=min_box_height)
+    assert decoded.factor == factor
+    ox, oy = decoded.origin
+    assert (ox % factor, oy % factor) == (0, 0) and ox <= 101 and oy <= 83
+    assert decoded.size == (640, 480)
+
+    # mapped back, each local rectangle covers its box in original coordinates
+    for x1, y1, x2, y2 in rects:
+        lx1, ly1, lx2, ly2 = decoded.to_local((x1, y1, x2, y2))
+        assert ox + lx1 * factor <= x1 and oy + ly1 * factor <= y1
+        assert ox + lx2 * factor >= x2 and oy + ly2 * factor >= y2
+        assert (lx2 - lx1) * factor - (x2 - x1) < 2 * factor
+
+def test_to_local_never_returns_an_empty_or_outside_rectangle():
+    decoded = DecodedPage(np.zeros((10, 20), np.uint8), origin=(100, 100), factor=2, size=(400, 400))
+    assert decoded.to_local((90, 90, 101, 101)) == (0, 0, 1, 1)
+    assert decoded.to_local((100, 100, 400, 400)) == (0, 0, 20, 10)
+
+def test_detections_keep_original_coordinates(fake_engine, monkeypatch):
+    from utils import image_decode
+    from utils.ocr_utils import process_user_boxes
+    image_bytes = encoded(gradient_page(), "JPEG")
+    boxes = [[100, 80, 300, 140], [250, 200, 400, 260]]
+    monkeypatch.setattr(image_decode, "OCR_DECODE_MIN_BOX_HEIGHT", 15)
+    region = process_user_boxes(image_bytes, boxes, crop_format="none")
+    monkeypatch.setattr(image_decode, "OCR_DECODE_MODE", "full")
+    full = process_user_boxes(image_bytes, boxes, crop_format="none")
+    assert [d["box_coordinates"] for d in region] == [d["box_coordinates"] for d in full] == boxes
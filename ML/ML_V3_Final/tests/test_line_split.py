@@ -0,0 +1,68 @@
+import io
+import numpy as np
+from PIL import Image
+from utils.line_split import split_lines, line_to_original
+
+
+def paragraph(line_count=4, line_height=20, gap=12, width=300, marks=False):
+    '''White crop with line_count black text rows; marks adds a thin vowel-sign band above each row'''
+    crop = np.full((gap + line_count * (line_height + gap), width), 255, np.uint8)
+    for i in range(line_count):
+        top = gap + i * (line_height + gap)
+        for x in range(10, width - 40, 16):
+            crop[top:top + line_height, x:x + 8] = 0
+        if marks:
+            crop[top - 5:top - 3, 20:60] = 0
+    return crop
+
+def test_paragraph_is_split_into_its_lines():
+    crop = paragraph(4)
+    lines = split_lines(crop, min_lines=3)
+    assert len(lines) == 4
+    # cuts sit in the gaps and cover the whole crop, top to bottom
+    assert lines[0][0] == 0 and lines[-1][1] == crop.shape[0]
+    assert all(above[1] == below[0] for above, below in zip(lines, lines[1:]))
+    for i, (top, bottom, left, right) in enumerate(lines):
+        text_top = 12 + i * 32
+        assert top <= text_top and bottom >= text_top + 20
+        assert (left, right) == (10, 258)
+
+def test_short_box_is_not_split():
+    assert split_lines(paragraph(2), min_lines=3) is None
+    assert split_lines(paragraph(1), min_lines=1) is None
+
+def test_vowel_marks_stay_with_their_line():
+    lines = split_lines(paragraph(3, marks=True), min_lines=3)
+    assert len(lines) == 3
+    assert lines[1][0] <= 12 + 32 - 5
+
+def test_white_text_on_black_is_split_too():
+    assert len(split_lines(255 - paragraph(3), min_lines=3)) == 3
+
+def test_line_maps_back_through_a_resampled_crop():
+    # crop resampled x2 from the box (100, 50)-(250, 110)
+    assert line_to_original((20, 60, 10, 290), (300, 120), (100, 50, 250, 110)) == [105, 60, 245, 80]
+
+def test_paragraph_box_is_read_line_by_line(fake_engine, monkeypatch):
+    from utils import ocr_utils
+    from utils.ocr_utils import process_user_boxes
+    monkeypatch.setattr(ocr_utils, "OCR_LINE_BOXES", True)
+    psms = []
+    def image_to_text_conf(pil_image, lang="khm", psm=None):
+        psms.append(psm)
+        return f"line{len(psms)}", 90.0
+    monkeypatch.setattr(fake_engine, "image_to_text_conf", image_to_text_conf)
+
+    page = np.full((200, 360), 255, np.uint8)
+    page[20:160, 20:320] = paragraph(4)
+    buffer = io.BytesIO()
+    Image.fromarray(page).save(buffer, format="PNG")
+    box = [20, 20, 320, 160]
+
+    detection, = process_user_boxes(buffer.getvalue(), [box], execution_mode="serial", crop_format="none")
+    assert psms == [7, 7, 7, 7]
+    assert sorted(detection["extracted_text"].split()) == ["line1", "line2", "line3", "line4"]
+    lines = detection["lines"]
+    assert len(lines) == 4
+    assert lines[0]["box_coordinates"][1] == 20 and lines[-1]["box_coordinates"][3] == 160
+    assert all(20 <= l["box_coordinates"][0] and l["box_coordinates"][2] <= 320 for l in lines)
@@ -0,0 +1,74 @@
+from utils.ocr_cache import OcrResultCache, make_cache_key
+
+
+SETTINGS = {"profile": "balanced", "scope": "page"}
+
+def detection(text):
+    return {"text": text, "confidence": 90.0}
+
+def test_miss_then_hit():
+    cache = OcrResultCache(max_entries=4, db_path="", fingerprint="v1")
+    key = cache.key("img", (0, 0, 10, 10), SETTINGS)
+    assert cache.get(key) is None
+    cache.put(key, detection("a"))
+    assert cache.get(key) == detection("a")
+    stats = cache.stats()
+    assert (stats["misses"], stats["memory_hits"], stats["hit_ratio"]) == (1, 1, 0.5)
+
+def test_returned_results_are_copies():
+    cache = OcrResultCache(max_entries=4, db_path="", fingerprint="v1")
+    cache.put("k", detection("a"))
+    cache.get("k")["text"] = "changed"
+    assert cache.get("k") == detection("a")
+
+def test_key_depends_on_box_settings_and_engine():
+    cache = OcrResultCache(max_entries=4, db_path="", fingerprint="v1")
+    key = cache.key("img", (0, 0, 10, 10), SETTINGS)
+    assert key != cache.key("img", (0, 0, 10, 11), SETTINGS)
+    assert key != cache.key("img", (0, 0, 10, 10), dict(SETTINGS, profile="fast"))
+    assert key != OcrResultCache(max_entries=4, db_path="", fingerprint="v2").key("img", (0, 0, 10, 10), SETTINGS)
+    assert key == make_cache_key("img", (0, 0, 10, 10), dict(SETTINGS, engine="v1"))
+
+def test_least_recently_used_result_is_evicted():
+    cache = OcrResultCache(max_entries=2, db_path="", fingerprint="v1")
+    cache.put("a", detection("a"))
+    cache.put("b", detection("b"))
+    cache.get("a")
+    cache.put("c", detection("c"))
+    assert cache.get("b") is None
+    assert cache.get("a") == detection("a") and cache.get("c") == detection("c")
+    assert cache.stats()["evictions"] == 1
+
+def test_disk_tier_survives_reopen(tmp_path):
+    db = str(tmp_path / "cache" / "ocr.sqlite")
+    cache = OcrResultCache(max_entries=2, db_path=db, fingerprint="v1")
+    cache.put("a", detection("ក"))
+    cache.close()
+
+    reopened = OcrResultCache(max_entries=2, db_path=db, fingerprint="v1")
+    assert reopened.get("a") == detection("ក")
+    assert reopened.stats()["disk_hits"] == 1
+    # promoted into memory on the way out
+    assert reopened.get("a") == detection("ក")
+    assert reopened.stats()["memory_hits"] == 1
+    reopened.close()
+
+def test_new_engine_fingerprint_clears_disk_tier(tmp_path):
+    db = str(tmp_path / "ocr.sqlite")
+    cache = OcrResultCache(max_entries=2, db_path=db, fingerprint="v1")
+    cache.put("a", detection("a"))
+    cache.close()
+
+    upgraded = OcrResultCache(max_entries=2, db_path=db, fingerprint="v2")
+    assert upgraded.get("a") is None
+    assert upgraded.stats()["disk_entries"] == 0
+    upgraded.close()
+
+def test_invalidate_drops_both_tiers(tmp_path):
+    db = str(tmp_path / "ocr.sqlite")
+    cache = OcrResultCache(max_entries=2, db_path=db, fingerprint="v1")
+    cache.put("a", detection("a"))
+    cache.invalidate(refresh_fingerprint=False)
+    assert cache.get("a") is None
+    cache.close()
+    assert OcrResultCache(max_entries=2, db_path=db, fingerprint="v1").get("a") is None
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from utils import ocr_cascade
+from utils.ocr_cascade import run_cascade
+
+
+def first_pass(confidence):
+    return {"raw_text": "first", "confidence": confidence, "stage": ocr_cascade.FIRST_PASS_STAGE,
+            "profile": "balanced", "preprocessed": None}
+
+@pytest.fixture
+def gray_crop():
+    crop = np.full((20, 60), 255, np.uint8)
+    crop[6:14, 5:55] = 0
+    return crop
+
+@pytest.fixture
+def stage_results(fake_engine, monkeypatch):
+    '''Confidence returned by each cascade stage in turn; the psm of every call is recorded'''
+    results, psms = [], []
+    def image_to_text_conf(pil_image, lang="khm", psm=None):
+        psms.append(psm)
+        return results.pop(0)
+    monkeypatch.setattr(fake_engine, "image_to_text_conf", image_to_text_conf)
+    return results, psms
+
+def test_confident_first_pass_is_not_escalated(gray_crop, stage_results):
+    results, psms = stage_results
+    assert run_cascade(0, gray_crop, first_pass(75.0), min_confidence=60) == first_pass(75.0)
+    assert psms == []
+
+def test_cascade_stops_at_first_stage_over_threshold(gray_crop, stage_results):
+    results, psms = stage_results
+    results += [("accurate", 40.0), ("upscaled", 70.0), ("single line", 99.0)]
+    best = run_cascade(0, gray_crop, first_pass(30.0), min_confidence=60)
+    assert (best["raw_text"], best["stage"], best["profile"]) == ("upscaled", "upscaled", "accurate")
+    assert best["confidence"] == 70.0
+    assert psms == [None, None]
+
+def test_cascade_keeps_most_confident_result_when_threshold_is_never_met(gray_crop, stage_results):
+    results, psms = stage_results
+    results += [("accurate", 20.0), ("upscaled", 45.0), ("single line", 35.0)]
+    best = run_cascade(0, gray_crop, first_pass(30.0), min_confidence=60)
+    assert (best["raw_text"], best["stage"]) == ("upscaled", "upscaled")
+    assert psms == [None, None, 7]
+
+def test_first_pass_wins_over_weaker_stages(gray_crop, stage_results):
+    results, _ = stage_results
+    results += [("accurate", 10.0), ("upscaled", 10.0), ("single line", 10.0)]
+    assert run_cascade(0, gray_crop, first_pass(30.0), min_confidence=60)["stage"] == ocr_cascade.FIRST_PASS_STAGE
+
+def test_disabled_cascade_returns_first_pass(gray_crop, stage_results, monkeypatch):
+    monkeypatch.setattr(ocr_cascade, "OCR_CASCADE", False)
+    assert run_cascade(0, gray_crop, first_pass(5.0), min_confidence=60)["stage"] == ocr_cascade.FIRST_PASS_STAGE
+    assert stage_results[1] == []
@@ -0,0 +1,166 @@
+import os, json, asyncio, hashlib
+from fastapi.testclient import TestClient
+from benchmarks.synthetic import render_page
+from benchmarks.backend_stub import BackendStub
+from utils import api_client, backend_outbox
+from utils.api_client import send_batch_items_to_backend, send_batch_to_backend, close_backend_client
+from utils.backend_outbox import BackendOutbox, CircuitBreaker, OutboxDeliverer
+from utils.metrics import STAGE_SECONDS
+
+DETECTIONS = [{"box_coordinates": [0, 0, 10, 10], "extracted_text": "text", "confidence": 90.0}]
+
+
+def stage_count(stage):
+    return (STAGE_SECONDS._values.get((stage,)) or [0])[-1]
+
+
+class FlakyBackend:
+    '''Stand-in for send_batch_items_to_backend: fails while down, records the files of every call'''
+    def __init__(self, down=True):
+        self.down = down
+        self.calls = []
+
+    async def __call__(self, backend_url, project_id, items):
+        self.calls.append((project_id, [name for name, _, _, _ in items]))
+        if self.down:
+            return [("failed", "503 Service Unavailable")] * len(items)
+        return [("success", "Results sent to backend")] * len(items)
+
+def test_outbox_redelivers_after_backend_outage(tmp_path, monkeypatch):
+    monkeypatch.setattr(backend_outbox, "BACKEND_RETRY_BASE_SECONDS", 0.05)
+    outbox = BackendOutbox(str(tmp_path / "outbox.db"), max_attempts=5)
+    breaker = CircuitBreaker(threshold=2, cooldown=0.2)
+    backend = FlakyBackend(down=True)
+    forwards = stage_count("backend_forward")
+
+    async def scenario():
+        deliverer = OutboxDeliverer(outbox, backend, breaker)
+        for project_id in ("a", "b"):
+            outbox.enqueue("http://backend/upload", project_id, "page.png", b"image", DETECTIONS, "image/png")
+
+        await deliverer.deliver_due()
+        assert len(backend.calls) == 2
+        assert breaker.state == "open"
+        assert outbox.stats()["pending"] == 2
+        assert all(row["attempts"] == 1 for row in outbox.list("pending"))
+
+        # open breaker: nothing is sent while the cooldown runs
+        await deliverer.deliver_due()
+        assert len(backend.calls) == 2
+
+        backend.down = False
+        await asyncio.sleep(0.25)
+        await deliverer.deliver_due()
+
+    asyncio.run(scenario())
+    assert breaker.state == "closed"
+    assert outbox.stats() == {"pending": 0, "failed": 0, "delivered": 2}
+    assert sorted(backend.calls[2:]) == [("a", ["page.png"]), ("b", ["page.png"])]
+    # every real backend call is timed, failed ones included
+    assert stage_count("backend_forward") - forwards == 4
+    outbox.close()
+
+def test_due_rows_of_one_project_share_a_call(tmp_path):
+    outbox = BackendOutbox(str(tmp_path / "outbox.db"))
+    for project_id, filename in (("a", "1.png"), ("b", "2.png"), ("a", "3.png")):
+        outbox.enqueue("http://backend/upload", project_id, filename, b"image", DETECTIONS, "image/png")
+    backend = FlakyBackend(down=False)
+    asyncio.run(OutboxDeliverer(outbox, backend).deliver_due())
+    assert sorted(backend.calls) == [("a", ["1.png", "3.png"]), ("b", ["2.png"])]
+    assert outbox.stats()["delivered"] == 3
+    outbox.close()
+
+def test_delivery_fails_after_max_attempts_and_can_be_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(backend_outbox, "BACKEND_RETRY_BASE_SECONDS", 0.0)
+    outbox = BackendOutbox(str(tmp_path / "outbox.db"), max_attempts=2)
+    delivery_id = outbox.enqueue("http://backend/upload", "a", "page.png", b"image", DETECTIONS, "image/png")
+    deliverer = OutboxDeliverer(outbox, FlakyBackend(down=True), CircuitBreaker(threshold=100, cooldown=0))
+
+    asyncio.run(deliverer.deliver_due())
+    failed, = outbox.list("failed")
+    assert (failed["id"], failed["attempts"], failed["last_error"]) == (delivery_id, 2, "503 Service Unavailable")
+
+    assert outbox.retry_failed(delivery_id) == 1
+    pending, = outbox.list("pending")
+    assert pending["attempts"] == 0
+    outbox.close()
+
+def test_pending_results_survive_a_restart(tmp_path):
+    db = str(tmp_path / "outbox.db")
+    outbox = BackendOutbox(db)
+    outbox.enqueue("http://backend/upload", "a", "page.png", b"\x89PNG", DETECTIONS, "image/png")
+    outbox.close()
+
+    reopened = BackendOutbox(db)
+    row, = reopened.due()
+    assert (row["project_id"], row["image_bytes"], row["detections"]) == ("a", b"\x89PNG", DETECTIONS)
+    reopened.close()
+
+class IdleDeliverer:
+    def __init__(self):
+        self.wakes = 0
+
+    def wake(self):
+        self.wakes += 1
+
+def test_ocr_response_is_queued_with_outbox(tmp_path, fake_engine, monkeypatch):
+    import main_server
+    outbox = BackendOutbox(str(tmp_path / "outbox.db"))
+    deliverer = IdleDeliverer()
+    monkeypatch.setattr(main_server, "get_outbox", lambda: outbox)
+    monkeypatch.setattr(main_server, "get_deliverer", lambda: deliverer)
+    image_bytes, boxes, _ = render_page(2)
+
+    response = TestClient(main_server.app).post(
+        "/images/", data={"annotations": json.dumps(boxes), "project_id": "p"},
+        files={"image": ("page.png", image_bytes, "image/png")})
+    assert response.status_code == 200
+    assert response.json()["backend_status"] == "queued"
+    row, = outbox.due()
+    assert (row["project_id"], row["filename"], row["image_bytes"]) == ("p", "page.png", image_bytes)
+    assert deliverer.wakes == 1
+    outbox.close()
+
+def test_failed_hash_call_retries_only_its_own_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(api_client, "BACKEND_FORWARD_MODE", "hash")
+    images = {name: name.encode() * 10 for name in ("1.png", "2.png", "3.png")}
+    hashes = {name: hashlib.sha256(data).hexdigest() for name, data in images.items()}
+    outbox = BackendOutbox(str(tmp_path / "outbox.db"))
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+
+    async def scenario(stub):
+        for name, data in images.items():
+            outbox.enqueue(stub.url, "a", name, data, DETECTIONS, "image/png")
+        await OutboxDeliverer(outbox, send_batch_items_to_backend, breaker).deliver_due()
+        await close_backend_client()
+
+    # the backend knows every image, but answers 500 for the second one
+    with BackendStub(known_hashes=hashes.values(), failing_hashes=[hashes["2.png"]]) as stub:
+        asyncio.run(scenario(stub))
+        stats = stub.stats()
+
+    assert stats["hash_calls"] == 3 and stats["uploads"] == 0
+    assert outbox.stats() == {"pending": 1, "failed": 0, "delivered": 2}
+    row, = outbox.list("pending")
+    assert (row["filename"], row["attempts"]) == ("2.png", 1)
+    # the backend took the other two, so one bad image doesn't open the breaker
+    assert breaker.state == "closed"
+    outbox.close()
+
+def test_batch_reports_partial_success(monkeypatch):
+    monkeypatch.setattr(api_client, "BACKEND_FORWARD_MODE", "hash")
+    items = [(name, name.encode(), DETECTIONS, "image/png") for name in ("1.png", "2.png")]
+
+    async def scenario(stub):
+        result = await send_batch_to_backend(stub.url, "a", items)
+        await close_backend_client()
+        return result
+
+    with BackendStub(failing_hashes=[hashlib.sha256(b"2.png").hexdigest()]) as stub:
+        status, message = asyncio.run(scenario(stub))
+    # 1.png is unknown and uploaded, 2.png's hash call fails
+    assert status == "partial"
+    assert message.startswith("1 of 2 images sent") and "2.png" in message
+
+def test_outbox_db_path_does_not_depend_on_cwd():
+    assert backend_outbox.BACKEND_OUTBOX_DB == os.path.join(backend_outbox.APP_DIR, "data", "backend_outbox.db")
@@ -0,0 +1,18 @@
+import numpy as np, cv2
+from utils.page_preprocess import crop_histograms, otsu_thresholds
+
+
+def test_crop_histograms_match_per_crop_counts():
+    rng = np.random.default_rng(0)
+    page = rng.integers(0, 256, (400, 600), dtype=np.uint8)
+    crops = [page[10:60, 20:300], page[100:140, 5:50], page[0:0, 0:5]]
+    hist = crop_histograms(crops)
+    assert hist.shape == (3, 256) and hist.dtype == np.float64
+    for crop, row in zip(crops, hist):
+        assert (row == np.bincount(crop.ravel(), minlength=256)).all()
+
+def test_otsu_thresholds_match_opencv():
+    rng = np.random.default_rng(1)
+    crops = [np.clip(rng.normal(mean, 30, (40, 120)), 0, 255).astype(np.uint8) for mean in (60, 128, 200)]
+    expected = [cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[0] for crop in crops]
+    assert list(otsu_thresholds(crops)) == expected
@@ -0,0 +1,48 @@
+import os
+import numpy as np
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+from utils import parallel_ocr
+
+
+def _line_pool_in_worker():
+    executor = parallel_ocr.get_line_executor()
+    return executor._max_workers, executor.submit(sum, [1, 2]).result(timeout=10)
+
+def test_worker_gets_its_own_capped_line_executor(monkeypatch):
+    monkeypatch.setattr(parallel_ocr, "OCR_PROCESS_WORKERS", 1)
+    monkeypatch.setattr(parallel_ocr, "OCR_WORKER_LINE_THREADS", 1)
+    parallel_ocr.get_line_executor().submit(sum, [0]).result()
+    try:
+        future = parallel_ocr.get_process_pool().submit(_line_pool_in_worker)
+        assert future.result(timeout=60) == (1, 3)
+    finally:
+        parallel_ocr.shutdown_process_pool()
+
+def _box_fails(page, idx, box):
+    raise ValueError(f"box {idx} is broken")
+
+def _worker_dies(page, idx, box):
+    os._exit(1)
+
+def run_boxes(box_fn):
+    page = np.zeros((20, 20), dtype=np.uint8)
+    return list(parallel_ocr.iter_pages_in_process_pool([(box_fn, page, [(0, [0, 0, 10, 10]), (1, [5, 5, 15, 15])])]))
+
+def test_box_error_in_worker_fails_the_request(monkeypatch):
+    monkeypatch.setattr(parallel_ocr, "OCR_PROCESS_WORKERS", 1)
+    try:
+        with pytest.raises(ValueError, match="is broken"):
+            run_boxes(_box_fails)
+    finally:
+        parallel_ocr.shutdown_process_pool()
+
+def test_dead_worker_fails_the_request_and_replaces_the_pool(monkeypatch):
+    monkeypatch.setattr(parallel_ocr, "OCR_PROCESS_WORKERS", 1)
+    try:
+        broken = parallel_ocr.get_process_pool()
+        with pytest.raises(BrokenProcessPool):
+            run_boxes(_worker_dies)
+        assert parallel_ocr.get_process_pool() is not broken
+    finally:
+        parallel_ocr.shutdown_process_pool()
@@ -0,0 +1,22 @@
+import pytest
+from benchmarks.synthetic import render_page
+from utils.ocr_utils import process_user_boxes
+
+
+@pytest.mark.parametrize("scope", ["page", "box"])
+def test_process_user_boxes_on_synthetic_page(fake_engine, monkeypatch, scope):
+    from utils import page_preprocess
+    monkeypatch.setattr(page_preprocess, "OCR_PREPROCESS_SCOPE", scope)
+    image_bytes, boxes, _ = render_page(6, font_size=28, line_height=48)
+
+    detections = process_user_boxes(image_bytes, boxes, execution_mode="serial", profile="fast")
+
+    assert len(detections) == len(boxes)
+    assert [d["box_coordinates"] for d in detections] == boxes
+    assert all(d["extracted_text"] == "text" for d in detections)
+    assert fake_engine.calls >= len(boxes)
+
+def test_invalid_box_is_skipped(fake_engine):
+    image_bytes, boxes, _ = render_page(2)
+    detections = process_user_boxes(image_bytes, boxes + [[10, 10, 5, 5]], execution_mode="serial", profile="fast")
+    assert len(detections) == len(boxes)
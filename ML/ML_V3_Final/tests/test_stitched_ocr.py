@@ -0,0 +1,63 @@
+from PIL import Image
+from utils import stitched_ocr
+from utils.stitched_ocr import stitch_crops, _assign_lines, recognize_stitched, STITCH_SEPARATOR_HEIGHT, STITCH_MARGIN
+
+
+def line(text, y1, y2, conf=90.0, x1=STITCH_MARGIN):
+    return {"text": text, "bbox": (x1, y1, x1 + 100, y2), "conf": conf}
+
+def test_crops_are_stacked_with_separators():
+    crops = [Image.new("L", (120, 30), 0), Image.new("L", (80, 50), 0)]
+    (page, bands), = stitch_crops(crops)
+    top = STITCH_SEPARATOR_HEIGHT
+    assert bands == [(0, top, top + 30), (1, top + 30 + STITCH_SEPARATOR_HEIGHT, top + 80 + STITCH_SEPARATOR_HEIGHT)]
+    assert page.size == (120 + 2 * STITCH_MARGIN, bands[-1][2] + STITCH_SEPARATOR_HEIGHT)
+    # the crops are pasted at the left margin of their band
+    assert page.getpixel((STITCH_MARGIN, bands[1][1])) == 0
+    assert page.getpixel((STITCH_MARGIN, bands[1][1] - 1)) == 255
+
+def test_page_is_split_before_max_height(monkeypatch):
+    monkeypatch.setattr(stitched_ocr, "STITCH_MAX_PAGE_HEIGHT", 260)
+    pages = stitch_crops([Image.new("L", (50, 60)) for _ in range(4)])
+    assert [[crop for crop, _, _ in bands] for _, bands in pages] == [[0, 1], [2, 3]]
+    assert all(page.height <= 260 for page, _ in pages)
+
+def test_lines_inside_one_band_are_joined_in_reading_order_with_mean_confidence():
+    bands = [(0, 40, 80), (1, 120, 160)]
+    lines = [line("second", 62, 78, conf=80.0), line("first", 42, 60, conf=90.0), line("other", 122, 158)]
+    assert _assign_lines(lines, bands) == {0: ("first second", 85.0), 1: ("other", 90.0)}
+
+def test_line_overlapping_two_bands_makes_both_ambiguous():
+    bands = [(0, 40, 80), (1, 120, 160), (2, 200, 240)]
+    lines = [line("merged", 60, 140), line("clean", 205, 235)]
+    assert _assign_lines(lines, bands) == {2: ("clean", 90.0)}
+
+def test_line_within_slack_still_belongs_to_its_band():
+    slack = STITCH_SEPARATOR_HEIGHT // 2
+    bands = [(0, 40, 80), (1, 160, 200)]
+    lines = [line("tall", 40 - slack, 80 + slack)]
+    assert _assign_lines(lines, bands) == {0: ("tall", 90.0)}
+
+def test_band_without_lines_is_left_to_per_box_ocr():
+    bands = [(0, 40, 80), (1, 120, 160)]
+    assert _assign_lines([line("only", 45, 75)], bands) == {0: ("only", 90.0)}
+
+
+class LinePerBandPool:
+    '''Reads one line per band, except the bands listed in merge, which come back as one line'''
+    def __init__(self, texts, merge=()):
+        self.texts = texts
+        self.merge = merge
+
+    def image_to_lines(self, page, lang="khm", psm=None):
+        (_, bands), = stitch_crops([Image.new("L", (40, 20)) for _ in self.texts])
+        lines = [line(text, top, bottom) for (crop, top, bottom), text in zip(bands, self.texts) if crop not in self.merge]
+        if self.merge:
+            first, last = bands[min(self.merge)], bands[max(self.merge)]
+            lines.append(line("merged", first[1], last[2]))
+        return lines
+
+def test_recognize_stitched_returns_none_where_ambiguous(monkeypatch):
+    crops = [Image.new("L", (40, 20)) for _ in range(3)]
+    monkeypatch.setattr(stitched_ocr, "get_engine_pool", lambda: LinePerBandPool(["a", "b", "c"], merge=(1, 2)))
+    assert recognize_stitched(crops) == [("a", 90.0), None, None]
@@ -0,0 +1,71 @@
+import io, json
+import pytest
+from PIL import Image, ImageDraw
+from fastapi.testclient import TestClient
+
+
+BOXES = [[10, 10, 190, 60], [300, 300, 350, 350], [10, 100, 190, 150]]
+
+def page_bytes():
+    page = Image.new("RGB", (400, 200), "white")
+    draw = ImageDraw.Draw(page)
+    draw.text((15, 20), "Test 123", fill="black")
+    draw.text((15, 110), "Test 456", fill="black")
+    buffer = io.BytesIO()
+    page.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+@pytest.fixture
+def backend(fake_engine, monkeypatch):
+    '''Records what would be forwarded to the backend'''
+    import main_server
+    sent = []
+    async def send_to_backend(url, project_id, filename, image_bytes, detections, content_type):
+        sent.append(detections)
+        return "success", "stored"
+    monkeypatch.setattr(main_server, "send_to_backend", send_to_backend)
+    return sent
+
+def post_stream(**form):
+    import main_server
+    data = dict({"annotations": json.dumps(BOXES), "project_id": "p1"}, **form)
+    files = {"image": ("page.png", page_bytes(), "image/png")}
+    return TestClient(main_server.app).post("/images/stream", data=data, files=files)
+
+def test_every_box_is_reported_once_and_summary_comes_last(backend):
+    response = post_stream(crop_format="none")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+
+    *boxes, summary = records
+    assert sorted(r["box_index"] for r in boxes) == [0, 1, 2]
+    assert {r["box_index"]: r["type"] for r in boxes} == {0: "detection", 1: "skipped", 2: "detection"}
+    assert summary == {"type": "summary", "filename": "page.png", "total_boxes": 3, "processed": 2,
+                       "rejected_boxes": 0, "backend_status": "success", "message": "stored"}
+
+    # the backend still receives the detections in box order, after the stream is done
+    forwarded, = backend
+    by_index = {r["box_index"]: r["detection"] for r in boxes if r["type"] == "detection"}
+    assert forwarded == [by_index[0], by_index[2]]
+
+def test_sse_records_are_named_after_their_type(backend):
+    response = post_stream(crop_format="none", stream_format="sse")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [event[0] for event in events][-1] == "event: summary"
+    for name, data in events:
+        assert name == f"event: {json.loads(data[len('data: '):])['type']}"
+
+def test_failed_ocr_ends_with_error_and_forwards_nothing(backend, monkeypatch):
+    import main_server
+    def failing(*args, **kwargs):
+        yield 0, {"extracted_text": "text"}
+        raise RuntimeError("engine crashed")
+    monkeypatch.setattr(main_server, "iter_user_boxes", failing)
+    records = [json.loads(line) for line in post_stream().text.splitlines()]
+    assert [r["type"] for r in records] == ["detection", "error", "summary"]
+    assert records[-1]["backend_status"] == "skipped"
+    assert backend == []
+
+def test_unknown_stream_format_is_rejected(backend):
+    assert post_stream(stream_format="xml").status_code == 400
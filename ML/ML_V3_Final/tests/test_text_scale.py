@@ -0,0 +1,73 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image
+from utils.text_scale import estimate_text_height, text_scale, rescale, MAX_SCALE
+from utils.image_decode import decode_page, open_page
+
+
+def glyphs(text_height, width=240, height=80, count=8, ink=0, paper=255):
+    '''Crop with a row of glyph-like blobs text_height pixels tall'''
+    crop = np.full((height, width), paper, np.uint8)
+    top = (height - text_height) // 2
+    for i in range(count):
+        x = 10 + i * (width - 20) // count
+        crop[top:top + text_height, x:x + 12] = ink
+    return crop
+
+@pytest.mark.parametrize("text_height", [8, 14, 28, 40])
+def test_estimate_text_height(text_height):
+    assert estimate_text_height(glyphs(text_height)) == text_height
+
+def test_estimate_ignores_box_border_and_specks():
+    crop = glyphs(14)
+    crop[0:2, :] = 0          # ruling line across the whole crop
+    crop[70, 5] = crop[72, 200] = 0  # specks
+    assert estimate_text_height(crop) == 14
+
+def test_estimate_light_text_on_dark_background():
+    assert estimate_text_height(glyphs(20, ink=255, paper=0)) == 20
+
+def test_estimate_without_text():
+    assert estimate_text_height(np.full((40, 100), 255, np.uint8)) is None
+
+def test_text_within_tolerance_is_left_alone():
+    assert text_scale(glyphs(28), target=28, tolerance=0.25) == 1.0
+    assert text_scale(glyphs(24), target=28, tolerance=0.25) == 1.0
+    assert text_scale(glyphs(36), target=28, tolerance=0.25) == 1.0
+
+def test_small_and_large_text_are_resampled_to_target():
+    assert text_scale(glyphs(14), target=28, tolerance=0.25) == 2.0
+    assert text_scale(glyphs(56, height=120), target=28, tolerance=0.25) == 0.5
+    assert text_scale(glyphs(4), target=28, tolerance=0.25) == MAX_SCALE
+
+def test_normalization_disabled_or_nothing_found():
+    assert text_scale(glyphs(14), target=0) == 1.0
+    assert text_scale(np.full((40, 100), 255, np.uint8), target=28) == 1.0
+
+def test_rescale():
+    crop = glyphs(14)
+    assert rescale(crop, 1.0) is crop
+    assert rescale(crop, 2.0).shape == (160, 480)
+    assert estimate_text_height(rescale(crop, 2.0)) == pytest.approx(28, abs=1)
+
+def test_resampled_crops_keep_original_box_coordinates():
+    from utils.ocr_utils import prepare_boxes
+    page = np.full((300, 400), 255, np.uint8)
+    page[100:180, 50:290] = glyphs(14)
+    page[200:280, 50:290] = glyphs(28)
+    buffer = io.BytesIO()
+    Image.fromarray(page).save(buffer, format="PNG")
+    boxes = [[50, 100, 290, 180], [50, 200, 290, 280]]
+
+    decoded = decode_page(open_page(buffer.getvalue()), [tuple(b) for b in boxes], mode="region", min_box_height=0)
+    assert decoded.origin == (50, 100)
+    prepared, rejected = prepare_boxes(decoded, list(enumerate(boxes)), scope="page", profile="fast")
+    assert rejected == []
+
+    (idx_small, clamped_small, crop_small, gray_small), (idx_ok, clamped_ok, crop_ok, gray_ok) = prepared
+    assert (idx_small, idx_ok) == (0, 1)
+    assert [list(clamped_small), list(clamped_ok)] == boxes
+    # 14 px text is doubled, 28 px text is untouched; the reported box stays the original one
+    assert crop_small.size == (480, 160) and gray_small.shape == (160, 480)
+    assert crop_ok.size == (240, 80) and gray_ok.shape == (80, 240)
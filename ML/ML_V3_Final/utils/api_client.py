@@ -1,16 +1,345 @@
-import io, json, httpx
+import io, os, json, time, socket, hashlib, asyncio, ipaddress, httpx
+from urllib.parse import urlsplit
+from utils.log import get_logger, fields
 
-async def send_to_backend(backend_url, project_id, image_filename, image_bytes, detections, content_type):
-    form_data = {"project_id": project_id, "annotations": json.dumps(detections)}
-    files = {"images": (image_filename, io.BytesIO(image_bytes), content_type)}
+logger = get_logger("backend")
+
+
+# ---- Backend Forwarding Configuration ----
+# BACKEND_TIMEOUT          : seconds before a backend call is given up
+# BACKEND_MAX_CONNECTIONS  : connections the shared client may open to the backend at once
+# BACKEND_MAX_KEEPALIVE    : idle keep-alive connections kept open between calls
+# BACKEND_BATCH_WINDOW_MS  : > 0 coalesces the images of one project that finish within this window
+#                            into a single /images/upload call (0 = one call per image)
+# BACKEND_BATCH_MAX_IMAGES : a batch is sent early once it holds this many images
+#                            (both only apply with BACKEND_OUTBOX=0; the outbox deliverer groups rows itself)
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "60"))
+BACKEND_MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", "20"))
+BACKEND_MAX_KEEPALIVE = int(os.getenv("BACKEND_MAX_KEEPALIVE", "10"))
+BACKEND_BATCH_WINDOW_MS = float(os.getenv("BACKEND_BATCH_WINDOW_MS", "0"))
+BACKEND_BATCH_MAX_IMAGES = int(os.getenv("BACKEND_BATCH_MAX_IMAGES", "16"))
+# BACKEND_FORWARD_MODE     : "bytes" uploads the image with every result, "hash" first sends only the
+#                            annotations + the image's SHA-256 and uploads the bytes only if the backend
+#                            doesn't know that hash yet
+# BACKEND_HASH_URL         : endpoint for hash forwarding (default: /images/annotate-by-hash next to the upload URL)
+BACKEND_FORWARD_MODE = os.getenv("BACKEND_FORWARD_MODE", "bytes").lower()
+BACKEND_HASH_URL = os.getenv("BACKEND_HASH_URL", "")
+
+# ---- Job Callback Configuration ----
+# OCR_CALLBACK_ALLOWED_HOSTS : comma-separated hosts a /jobs/ callback_url may point at: "example.com",
+#                              ".example.com" for its subdomains, "*" for any host; empty rejects every callback_url
+OCR_CALLBACK_ALLOWED_HOSTS = [host.strip().lower() for host in os.getenv("OCR_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()]
+
+
+'''Shared HTTP client
+    - One httpx.AsyncClient for the lifetime of the app, so calls to the backend reuse
+    keep-alive connections instead of opening (and leaving in TIME_WAIT) a new one per image
+    - Bound to the event loop that created it; a different loop (e.g. a test client) gets its own
+'''
+_client = None
+_client_loop = None
+
+def get_backend_client():
+    global _client, _client_loop
+    loop = asyncio.get_event_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=BACKEND_TIMEOUT,
+            limits=httpx.Limits(max_connections=BACKEND_MAX_CONNECTIONS,
+                                max_keepalive_connections=BACKEND_MAX_KEEPALIVE),
+        )
+        _client_loop = loop
+    return _client
+
+async def close_backend_client():
+    global _client
+    await _batcher.flush_all()
+    if _client is not None and _client_loop is asyncio.get_event_loop():
+        await _client.aclose()
+    _client = None
+
+
+'''Forwarding metrics
+    - Latency histogram (cumulative buckets in ms, like Prometheus) and error counts for the
+    ML server -> backend hop
+'''
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+class ForwardingMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.images = 0
+        self.errors = 0
+        self.latency_sum_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+        self.last_error = None
+        self.hash_hits = 0
+        self.hash_misses = 0
+        self.bytes_saved = 0
+
+    def observe(self, latency_ms, images, error=None):
+        self.calls += 1
+        self.images += images
+        self.latency_sum_ms += latency_ms
+        self.latency_max_ms = max(self.latency_max_ms, latency_ms)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.buckets[i] += 1
+        if error is not None:
+            self.errors += 1
+            self.last_error = error
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "images": self.images,
+            "errors": self.errors,
+            "error_ratio": round(self.errors / self.calls, 4) if self.calls else 0.0,
+            "avg_latency_ms": round(self.latency_sum_ms / self.calls, 1) if self.calls else None,
+            "max_latency_ms": round(self.latency_max_ms, 1),
+            "latency_buckets_ms": {str(b): n for b, n in zip(LATENCY_BUCKETS_MS, self.buckets)},
+            "last_error": self.last_error,
+            "batching": BACKEND_BATCH_WINDOW_MS > 0,
+            "forward_mode": BACKEND_FORWARD_MODE,
+            "hash_hits": self.hash_hits,
+            "hash_misses": self.hash_misses,
+            "bytes_saved": self.bytes_saved,
+        }
+
+_metrics = ForwardingMetrics()
+
+def backend_stats():
+    return _metrics.stats()
+
+
+async def _post_images(backend_url, project_id, items):
+    # items: list of (image_filename, image_bytes, detections, content_type)
+    form_data = {"project_id": project_id}
+    if len(items) == 1:
+        form_data["annotations"] = json.dumps(items[0][2])
+    else:
+        # one call for several images: the backend stores each file with its own annotations
+        form_data["annotations_by_file"] = json.dumps({name: detections for name, _, detections, _ in items})
+    files = [("images", (name, io.BytesIO(data), content_type)) for name, data, _, content_type in items]
 
     backend_status, backend_message = "skipped", "Backend call skipped or failed"
+    started = time.perf_counter()
+    error = None
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(backend_url, data=form_data, files=files)
-            resp.raise_for_status()
-            backend_status, backend_message = "success", "Results sent to backend"
+        resp = await get_backend_client().post(backend_url, data=form_data, files=files)
+        resp.raise_for_status()
+        backend_status, backend_message = "success", "Results sent to backend"
     except Exception as e:
-        backend_status, backend_message = "failed", str(e)
-
+        error = str(e) or type(e).__name__
+        backend_status, backend_message = "failed", error
+    _metrics.observe((time.perf_counter() - started) * 1000, len(items), error)
     return backend_status, backend_message
+
+'''Coalescing images into one backend call
+    - The first image of a project opens a batch; every image of the same project that arrives
+    within BACKEND_BATCH_WINDOW_MS joins it, and the batch is sent as one multipart call
+    - Each caller still gets its own (status, message), which is the outcome of the shared call
+'''
+class BackendBatcher:
+    def __init__(self, window_ms=BACKEND_BATCH_WINDOW_MS, max_images=BACKEND_BATCH_MAX_IMAGES):
+        self.window = window_ms / 1000.0
+        self.max_images = max(1, int(max_images))
+        self._pending = {}  # (backend_url, project_id) -> list of (item, future)
+        self._timers = {}
+
+    async def submit(self, backend_url, project_id, item):
+        key = (backend_url, project_id)
+        batch = self._pending.get(key, [])
+        # the backend keys annotations by file name, so a repeated name starts a new batch
+        if any(pending[0] == item[0] for pending, _ in batch):
+            self._flush(key)
+
+        future = asyncio.get_event_loop().create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((item, future))
+        if len(batch) >= self.max_images:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = asyncio.get_event_loop().call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            return asyncio.ensure_future(self._send(key, batch))
+
+    async def _send(self, key, batch):
+        backend_url, project_id = key
+        logger.info("Sending batch", extra=fields(images=len(batch), project_id=project_id))
+        try:
+            result = await _post_images(backend_url, project_id, [item for item, _ in batch])
+        except Exception as e:
+            # every waiter must get an answer, or its request hangs
+            result = ("failed", str(e) or type(e).__name__)
+        for _, future in batch:
+            if not future.done():
+                future.set_result(result)
+
+    async def flush_all(self):
+        tasks = [self._flush(key) for key in list(self._pending)]
+        await asyncio.gather(*[t for t in tasks if t is not None])
+
+_batcher = BackendBatcher()
+
+
+def hash_url_for(backend_url):
+    if BACKEND_HASH_URL:
+        return BACKEND_HASH_URL
+    return backend_url.rsplit("/", 1)[0] + "/annotate-by-hash"
+
+'''Hash-only forwarding
+    - Sends {project_id, filename, content_hash, annotations} as JSON; the backend attaches the
+    annotations to the image it already stored with that SHA-256
+    - Returns (status, message), or None when the backend doesn't know the hash (404), in which
+    case the caller uploads the bytes as usual
+'''
+async def _post_by_hash(backend_url, project_id, image_filename, image_bytes, detections):
+    payload = {
+        "project_id": project_id,
+        "filename": image_filename,
+        "content_hash": hashlib.sha256(image_bytes).hexdigest(),
+        "annotations": detections,
+    }
+    started = time.perf_counter()
+    error = None
+    try:
+        resp = await get_backend_client().post(hash_url_for(backend_url), json=payload)
+        if resp.status_code == 404:
+            _metrics.hash_misses += 1
+            return None
+        resp.raise_for_status()
+        _metrics.hash_hits += 1
+        _metrics.bytes_saved += len(image_bytes)
+        result = ("success", "Results sent to backend (image matched by hash)")
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        result = ("failed", error)
+    _metrics.observe((time.perf_counter() - started) * 1000, 1, error)
+    return result
+
+
+async def send_to_backend(backend_url, project_id, image_filename, image_bytes, detections, content_type):
+    if BACKEND_FORWARD_MODE == "hash":
+        result = await _post_by_hash(backend_url, project_id, image_filename, image_bytes, detections)
+        if result is not None:
+            return result
+
+    item = (image_filename, image_bytes, detections, content_type)
+    if BACKEND_BATCH_WINDOW_MS > 0:
+        return await _batcher.submit(backend_url, project_id, item)
+    return await _post_images(backend_url, project_id, [item])
+
+'''One backend call for several images of the same project
+    - items: list of (image_filename, image_bytes, detections, content_type); file names must be unique
+    - Returns one (status, message) per item, in item order
+    - In hash mode every image is tried by hash first, and a failed hash call doesn't stop the
+    others; the images the backend doesn't know are uploaded together in one call, which
+    succeeds or fails as a whole
+'''
+async def send_batch_items_to_backend(backend_url, project_id, items):
+    outcomes = [None] * len(items)
+    unknown = list(range(len(items)))
+    if BACKEND_FORWARD_MODE == "hash":
+        unknown = []
+        for i, (name, data, detections, _) in enumerate(items):
+            outcomes[i] = await _post_by_hash(backend_url, project_id, name, data, detections)
+            if outcomes[i] is None:
+                unknown.append(i)
+    if unknown:
+        result = await _post_images(backend_url, project_id, [items[i] for i in unknown])
+        for i in unknown:
+            outcomes[i] = result
+    return outcomes
+
+'''Single (status, message) for the outcomes of a batch
+    - "partial" when some images were sent and others failed; the message names the failed files
+'''
+def combine_outcomes(items, outcomes):
+    if len(set(outcomes)) == 1:
+        return outcomes[0]
+    failed = [(item[0], message) for item, (status, message) in zip(items, outcomes) if status != "success"]
+    if not failed:
+        return "success", "Results sent to backend"
+    detail = "; ".join(f"{name}: {message}" for name, message in failed)
+    if len(failed) == len(items):
+        return "failed", detail
+    return "partial", f"{len(items) - len(failed)} of {len(items)} images sent, failed: {detail}"
+
+async def send_batch_to_backend(backend_url, project_id, items):
+    return combine_outcomes(items, await send_batch_items_to_backend(backend_url, project_id, items))
+
+'''Callback URL check
+    - A callback_url comes from the client, so without a check a job could make the server POST
+    to itself, to the backend, to the private network or to a cloud metadata endpoint
+    - http/https only, host in OCR_CALLBACK_ALLOWED_HOSTS, and every address the host resolves to
+    must be a public one (no loopback, link-local, private, reserved, multicast...)
+    - Raises ValueError; returns the parsed URL and the first validated address
+'''
+def host_allowed(host, allowed_hosts):
+    return any(allowed == "*" or host == allowed or (allowed.startswith(".") and host.endswith(allowed))
+               for allowed in allowed_hosts)
+
+def forbidden_address(address):
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return (address.is_loopback or address.is_link_local or address.is_unspecified or address.is_multicast
+            or address.is_private or address.is_reserved or not address.is_global)
+
+def resolve_callback_url(callback_url, allowed_hosts=None):
+    allowed_hosts = OCR_CALLBACK_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts
+    parsed = urlsplit(callback_url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("callback_url must be an http or https URL")
+    host = parsed.hostname.lower()
+    if not host_allowed(host, allowed_hosts):
+        raise ValueError(f"callback_url host {host!r} is not allowed (see OCR_CALLBACK_ALLOWED_HOSTS)")
+    try:
+        infos = socket.getaddrinfo(host, parsed.port or (443 if parsed.scheme == "https" else 80), type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"callback_url host {host!r} does not resolve") from e
+    addresses = [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos]
+    for address in addresses:
+        if forbidden_address(address):
+            raise ValueError(f"callback_url host {host!r} resolves to a forbidden address ({address})")
+    if not addresses:
+        raise ValueError(f"callback_url host {host!r} does not resolve")
+    return parsed, addresses[0]
+
+def validate_callback_url(callback_url, allowed_hosts=None):
+    resolve_callback_url(callback_url, allowed_hosts)
+    return callback_url
+
+'''Pinning the callback to the validated address
+    - The host is resolved once, checked, and the request goes to that IP; resolving it again
+    when connecting would let a short-lived DNS answer swap in an internal address (DNS rebinding)
+    - The original host travels in the Host header and, for https, as the TLS server name, so
+    virtual hosts and certificate checks still see the real name
+    - Returns (url, headers, extensions) for httpx
+'''
+def pinned_callback_request(callback_url, allowed_hosts=None):
+    parsed, address = resolve_callback_url(callback_url, allowed_hosts)
+    ip = f"[{address}]" if address.version == 6 else str(address)
+    netloc = ip if parsed.port is None else f"{ip}:{parsed.port}"
+    host_header = parsed.hostname if parsed.port is None else f"{parsed.hostname}:{parsed.port}"
+    extensions = {"sni_hostname": parsed.hostname} if parsed.scheme == "https" else {}
+    return parsed._replace(netloc=netloc).geturl(), {"Host": host_header}, extensions
+
+async def send_job_callback(callback_url, payload):
+    # Notify whoever submitted an OCR job that it has finished; payload is the job description
+    try:
+        # checked again here: the name may resolve somewhere else by the time the job is done
+        url, headers, extensions = await asyncio.to_thread(pinned_callback_request, callback_url)
+        resp = await get_backend_client().post(url, json=payload, headers=headers, extensions=extensions, timeout=30.0)
+        resp.raise_for_status()
+        return "success"
+    except Exception as e:
+        return f"failed: {e}"
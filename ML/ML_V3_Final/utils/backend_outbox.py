@@ -0,0 +1,271 @@
+import os, json, time, sqlite3, asyncio, threading
+from utils.metrics import record_error, timed
+from utils.log import get_logger, fields
+
+logger = get_logger("outbox")
+
+
+# ---- Backend Outbox Configuration ----
+# BACKEND_OUTBOX                   : "1" stores results locally and delivers them in the background
+#                                    (responses say "queued"), "0" (default) forwards inside the request
+# BACKEND_OUTBOX_DB                : SQLite file holding the undelivered results (survives restarts);
+#                                    a relative path is relative to ML_V3_Final/, not the working directory
+# BACKEND_OUTBOX_MAX_ATTEMPTS      : attempts before a delivery is marked failed (retry via POST /outbox/retry)
+# BACKEND_RETRY_BASE_SECONDS       : first retry delay; doubles with every failed attempt
+# BACKEND_RETRY_MAX_SECONDS        : upper bound of the retry delay
+# BACKEND_BREAKER_THRESHOLD        : consecutive failures that open the circuit breaker
+# BACKEND_BREAKER_COOLDOWN_SECONDS : how long an open breaker waits before letting one trial call through
+# BACKEND_OUTBOX_POLL_SECONDS      : how often the deliverer looks for due retries
+BACKEND_OUTBOX = os.getenv("BACKEND_OUTBOX", "0") == "1"
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_OUTBOX_DB = os.path.join(APP_DIR, os.getenv("BACKEND_OUTBOX_DB", os.path.join("data", "backend_outbox.db")))
+BACKEND_OUTBOX_MAX_ATTEMPTS = int(os.getenv("BACKEND_OUTBOX_MAX_ATTEMPTS", "8"))
+BACKEND_RETRY_BASE_SECONDS = float(os.getenv("BACKEND_RETRY_BASE_SECONDS", "1"))
+BACKEND_RETRY_MAX_SECONDS = float(os.getenv("BACKEND_RETRY_MAX_SECONDS", "300"))
+BACKEND_BREAKER_THRESHOLD = int(os.getenv("BACKEND_BREAKER_THRESHOLD", "5"))
+BACKEND_BREAKER_COOLDOWN_SECONDS = float(os.getenv("BACKEND_BREAKER_COOLDOWN_SECONDS", "30"))
+BACKEND_OUTBOX_POLL_SECONDS = float(os.getenv("BACKEND_OUTBOX_POLL_SECONDS", "1"))
+
+
+def retry_delay(attempts, base=None, cap=None):
+    # exponential backoff: base, 2*base, 4*base... capped
+    base = BACKEND_RETRY_BASE_SECONDS if base is None else base
+    cap = BACKEND_RETRY_MAX_SECONDS if cap is None else cap
+    return min(cap, base * (2 ** max(0, attempts - 1)))
+
+
+'''Durable Outbox
+    - One row per image whose results still have to reach the backend: the image bytes, the
+    detections and where to send them
+    - Rows are "pending" until delivered (then deleted) or until they ran out of attempts ("failed")
+    - SQLite, so results finished while the backend was down are still delivered after a restart
+'''
+class BackendOutbox:
+    def __init__(self, db_path=BACKEND_OUTBOX_DB, max_attempts=BACKEND_OUTBOX_MAX_ATTEMPTS):
+        self.max_attempts = max(1, int(max_attempts))
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, backend_url TEXT, project_id TEXT, filename TEXT,"
+            " content_type TEXT, image BLOB, detections TEXT, status TEXT, attempts INTEGER,"
+            " next_attempt_at REAL, last_error TEXT, created_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS deliveries_due ON deliveries (status, next_attempt_at)")
+        self._db.commit()
+        self._delivered = 0
+
+    def enqueue(self, backend_url, project_id, filename, image_bytes, detections, content_type):
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO deliveries (backend_url, project_id, filename, content_type, image, detections,"
+                " status, attempts, next_attempt_at, last_error, created_at) VALUES (?, ?, ?, ?, ?, ?, 'pending', 0, ?, NULL, ?)",
+                (backend_url, project_id, filename, content_type, image_bytes, json.dumps(detections), now, now),
+            )
+            self._db.commit()
+            return cursor.lastrowid
+
+    def due(self, limit=16):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, backend_url, project_id, filename, content_type, image, detections, attempts FROM deliveries"
+                " WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+        return [{
+            "id": row[0], "backend_url": row[1], "project_id": row[2], "filename": row[3],
+            "content_type": row[4], "image_bytes": row[5], "detections": json.loads(row[6]), "attempts": row[7],
+        } for row in rows]
+
+    def mark_delivered(self, delivery_id):
+        with self._lock:
+            self._db.execute("DELETE FROM deliveries WHERE id = ?", (delivery_id,))
+            self._db.commit()
+            self._delivered += 1
+
+    def mark_attempt_failed(self, delivery_id, attempts, error):
+        attempts += 1
+        status = "failed" if attempts >= self.max_attempts else "pending"
+        with self._lock:
+            self._db.execute(
+                "UPDATE deliveries SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (status, attempts, time.time() + retry_delay(attempts), error, delivery_id),
+            )
+            self._db.commit()
+        return status
+
+    def retry_failed(self, delivery_id=None):
+        '''Put failed deliveries (all, or one) back in the queue with a fresh set of attempts'''
+        query = "UPDATE deliveries SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'failed'"
+        params = [time.time()]
+        if delivery_id is not None:
+            query += " AND id = ?"
+            params.append(delivery_id)
+        with self._lock:
+            count = self._db.execute(query, params).rowcount
+            self._db.commit()
+        return count
+
+    def list(self, status, limit=50):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, project_id, filename, attempts, next_attempt_at, last_error, created_at FROM deliveries"
+                " WHERE status = ? ORDER BY id LIMIT ?", (status, limit),
+            ).fetchall()
+        return [{
+            "id": row[0], "project_id": row[1], "filename": row[2], "attempts": row[3],
+            "next_attempt_at": row[4], "last_error": row[5], "created_at": row[6],
+        } for row in rows]
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM deliveries GROUP BY status").fetchall())
+        return {"pending": counts.get("pending", 0), "failed": counts.get("failed", 0), "delivered": self._delivered}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+'''Circuit Breaker
+    - closed    : calls go through; BACKEND_BREAKER_THRESHOLD consecutive failures open it
+    - open      : no calls for BACKEND_BREAKER_COOLDOWN_SECONDS, so a backend that is down isn't hammered
+    - half_open : after the cooldown one trial call decides between closed (success) and open again
+'''
+class CircuitBreaker:
+    def __init__(self, threshold=BACKEND_BREAKER_THRESHOLD, cooldown=BACKEND_BREAKER_COOLDOWN_SECONDS):
+        self.threshold = max(1, int(threshold))
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        if self.state == "open" and time.time() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+        return self.state != "open"
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                logger.warning("Circuit breaker open", extra=fields(failures=self.failures))
+            self.state = "open"
+            self.opened_at = time.time()
+
+    def stats(self):
+        return {"state": self.state, "consecutive_failures": self.failures, "opened_at": self.opened_at}
+
+
+'''Background deliverer
+    - Takes due rows from the outbox and hands them to send(backend_url, project_id, items), i.e.
+    send_batch_items_to_backend; due rows of the same project go out together in one call
+    - send returns one (status, message) per row, so a row that failed is retried on its own
+    and the rows delivered with it are not sent (and overwritten on the backend) again
+    - Wakes up immediately when a result is enqueued, otherwise every BACKEND_OUTBOX_POLL_SECONDS
+    to pick up retries whose backoff has expired
+    - The SQLite reads and writes run in a worker thread, so the image blobs never block the event loop
+'''
+class OutboxDeliverer:
+    def __init__(self, outbox, send, breaker=None, poll_seconds=BACKEND_OUTBOX_POLL_SECONDS):
+        self.outbox = outbox
+        self.send = send
+        self.breaker = breaker or CircuitBreaker()
+        self.poll_seconds = poll_seconds
+        self._wake = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.deliver_due()
+            except Exception as e:
+                logger.exception("Delivery loop error", extra=fields(error=str(e)))
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    @staticmethod
+    def group_rows(rows):
+        # one group per (backend, project); a repeated file name starts a new group because the
+        # backend keys the annotations of a multi-image call by file name
+        groups = []
+        for row in rows:
+            for group in groups:
+                first = group[0]
+                if (first["backend_url"], first["project_id"]) == (row["backend_url"], row["project_id"]) \
+                        and all(other["filename"] != row["filename"] for other in group):
+                    group.append(row)
+                    break
+            else:
+                groups.append([row])
+        return groups
+
+    async def deliver_due(self):
+        while self.breaker.allow():
+            rows = await asyncio.to_thread(self.outbox.due, 1 if self.breaker.state == "half_open" else 16)
+            if not rows:
+                return
+            for group in self.group_rows(rows):
+                if not self.breaker.allow():
+                    return
+                # the real backend call, so backend_forward means the same with and without the outbox
+                with timed("backend_forward"):
+                    outcomes = await self.send(
+                        group[0]["backend_url"], group[0]["project_id"],
+                        [(row["filename"], row["image_bytes"], row["detections"], row["content_type"]) for row in group]
+                    )
+                failed = []
+                for row, (status, message) in zip(group, outcomes):
+                    if status == "success":
+                        await asyncio.to_thread(self.outbox.mark_delivered, row["id"])
+                    else:
+                        failed.append((row, message))
+                # a backend that took some of the rows is up; only a call that failed entirely counts
+                if len(failed) < len(group):
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+                for row, message in failed:
+                    outcome = await asyncio.to_thread(self.outbox.mark_attempt_failed, row["id"], row["attempts"], message)
+                    logger.warning("Delivery attempt failed", extra=fields(
+                        delivery_id=row["id"], filename=row["filename"], attempt=row["attempts"] + 1,
+                        error=message, outcome=outcome))
+                    record_error("backend_forward")
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+def get_outbox():
+    '''Shared outbox, or None when BACKEND_OUTBOX=0'''
+    global _outbox
+    if not BACKEND_OUTBOX:
+        return None
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = BackendOutbox()
+        return _outbox
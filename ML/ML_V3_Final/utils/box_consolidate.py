@@ -0,0 +1,59 @@
+import os
+import numpy as np
+
+
+# ---- Duplicate Box Consolidation Configuration ----
+# OCR_DEDUP                 : "1" OCRs duplicate / redrawn boxes only once and shares the result, "0" disables
+# OCR_DEDUP_IOU             : intersection over union from which two boxes are the same region
+# OCR_DEDUP_CONTAINMENT     : share of the smaller box inside the larger one from which it counts as contained
+# OCR_DEDUP_MIN_AREA_RATIO  : a contained box is only a duplicate when it is at least this large relative to
+#                             the other one, so a word box inside a paragraph box keeps its own OCR
+OCR_DEDUP = os.getenv("OCR_DEDUP", "1") == "1"
+OCR_DEDUP_IOU = float(os.getenv("OCR_DEDUP_IOU", "0.9"))
+OCR_DEDUP_CONTAINMENT = float(os.getenv("OCR_DEDUP_CONTAINMENT", "0.95"))
+OCR_DEDUP_MIN_AREA_RATIO = float(os.getenv("OCR_DEDUP_MIN_AREA_RATIO", "0.8"))
+
+
+'''Pairwise overlap index of clamped boxes
+    - rects is an (N, 4) array of (x1, y1, x2, y2)
+    - Returns an (N, N) boolean matrix: True where the two boxes cover the same region, i.e. their
+    IoU reaches OCR_DEDUP_IOU, or the smaller one lies (almost) inside the larger one and is
+    not much smaller than it
+'''
+def same_region_matrix(rects):
+    x1, y1, x2, y2 = (rects[:, i].astype(np.float64) for i in range(4))
+    area = (x2 - x1) * (y2 - y1)
+    iw = np.clip(np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]), 0, None)
+    ih = np.clip(np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]), 0, None)
+    inter = iw * ih
+
+    smaller = np.minimum(area[:, None], area[None, :])
+    larger = np.maximum(area[:, None], area[None, :])
+    iou = inter / (area[:, None] + area[None, :] - inter)
+    contained = (inter / smaller >= OCR_DEDUP_CONTAINMENT) & (smaller / larger >= OCR_DEDUP_MIN_AREA_RATIO)
+    return (iou >= OCR_DEDUP_IOU) | contained
+
+'''Grouping the boxes of one page by region
+    - items is a list of (box index, clamped box)
+    - Boxes are visited from largest to smallest; each one joins the first representative it shares
+    a region with, or becomes a representative itself. The larger box is kept, so the shared OCR
+    covers every pixel of the smaller duplicates
+    - Returns {duplicate box index: representative box index}; boxes that are their own
+    representative are not in it
+'''
+def consolidate_boxes(items):
+    if not OCR_DEDUP or len(items) < 2:
+        return {}
+
+    rects = np.array([clamped for _, clamped in items])
+    same = same_region_matrix(rects)
+    areas = (rects[:, 2] - rects[:, 0]) * (rects[:, 3] - rects[:, 1])
+    representatives = []
+    duplicates = {}
+    for i in np.argsort(-areas, kind="stable"):
+        match = next((r for r in representatives if same[i, r]), None)
+        if match is None:
+            representatives.append(i)
+        else:
+            duplicates[items[i][0]] = items[match][0]
+    return duplicates
@@ -0,0 +1,105 @@
+import os
+import numpy as np, cv2
+from utils.page_preprocess import crop_histograms, otsu_thresholds
+
+
+# ---- Blank / Non-text Box Filter Configuration ----
+# OCR_BOX_FILTER          : "1" rejects blank and non-text boxes before preprocessing and OCR, "0" disables
+# OCR_BLANK_MIN_CONTRAST  : gray levels between the ink and background means (Otsu classes) below which a box is blank
+# OCR_BLANK_MIN_INK       : ink fraction of the box below which it is blank (dust, a stray dot)
+# OCR_NONTEXT_MAX_INK     : ink fraction above which the box may be a photo / filled area rather than text;
+#                           bold or large text gets there too, so such a box is only rejected when its
+#                           connected components agree (see component_reason)
+OCR_BOX_FILTER = os.getenv("OCR_BOX_FILTER", "1") == "1"
+OCR_BLANK_MIN_CONTRAST = float(os.getenv("OCR_BLANK_MIN_CONTRAST", "40"))
+OCR_BLANK_MIN_INK = float(os.getenv("OCR_BLANK_MIN_INK", "0.003"))
+OCR_NONTEXT_MAX_INK = float(os.getenv("OCR_NONTEXT_MAX_INK", "0.4"))
+
+# Reason codes reported in the detection's reject_reason
+BLANK = "blank"
+NON_TEXT = "non_text"
+
+# Connected components are computed on a subsampled crop whose longer side is at most this many pixels
+COMPONENTS_MAX_SIDE = 512
+
+# Bumped whenever the rejection rules change, so cached rejections made by older rules are not served
+FILTER_RULES_VERSION = 2
+
+
+def filter_settings():
+    # part of the OCR cache key: changing a threshold must not serve old rejections
+    return [FILTER_RULES_VERSION, OCR_BOX_FILTER, OCR_BLANK_MIN_CONTRAST, OCR_BLANK_MIN_INK, OCR_NONTEXT_MAX_INK]
+
+'''Ink statistics of many crops at once
+    - One set of 256-bin histograms (shared with the Otsu code in utils/page_preprocess.py) gives,
+    for every crop, its Otsu threshold, the mean of the dark and light classes and the dark fraction
+    - Ink is the minority class, so light text on a dark background counts as ink too
+    - Returns (contrast, ink fraction, threshold, ink is dark) arrays, one entry per crop
+'''
+def ink_statistics(crops):
+    hist = crop_histograms(crops)
+    thresholds = otsu_thresholds(crops, hist)
+    levels = np.arange(256, dtype=np.float64)
+    dark_mask = levels[None, :] <= thresholds[:, None]
+
+    total = hist.sum(axis=1)
+    dark = np.where(dark_mask, hist, 0.0).sum(axis=1)
+    light = total - dark
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dark_mean = np.where(dark_mask, hist * levels, 0.0).sum(axis=1) / dark
+        light_mean = np.where(dark_mask, 0.0, hist * levels).sum(axis=1) / light
+    contrast = np.nan_to_num(light_mean - dark_mean)
+    ink_is_dark = dark <= light
+    ink = np.where(ink_is_dark, dark, light) / total
+    return contrast, ink, thresholds, ink_is_dark
+
+'''Connected-component check of one crop that passed the ink statistics
+    - Components smaller than 3 px tall or 6 px of area are specks; a box with nothing else is blank
+    - A solid blob (filling > 70% of its own bounding box) covering > 30% of the box is a stamp,
+    a photo or a filled field rather than strokes of text
+    - dense: the box has more ink than OCR_NONTEXT_MAX_INK. It is non-text when one mass
+    (filling > 50% of its bounding box) spans more than half of the box; bold or large text
+    still breaks into glyph-sized components and is kept
+    - Returns a reason code, or None for a box that looks like text
+'''
+def component_reason(gray_crop, threshold, ink_is_dark, dense=False):
+    height, width = gray_crop.shape[:2]
+    step = max(1, -(-max(height, width) // COMPONENTS_MAX_SIDE))
+    sample = gray_crop[::step, ::step]
+    ink = (sample <= threshold) if ink_is_dark else (sample > threshold)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(ink.astype(np.uint8), connectivity=8)
+
+    stats = stats[1:].astype(np.float64)  # label 0 is the background
+    heights, widths, areas = stats[:, cv2.CC_STAT_HEIGHT], stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_AREA]
+    keep = (heights * step >= 3) & (areas * step * step >= 6)
+    if count <= 1 or not keep.any():
+        return BLANK
+
+    fill = areas[keep] / (heights[keep] * widths[keep])
+    coverage = heights[keep] * widths[keep] / float(sample.shape[0] * sample.shape[1])
+    solid = (fill > 0.7) & (coverage > 0.3)
+    if dense:
+        solid |= (fill > 0.5) & (coverage > 0.5)
+    if solid.any():
+        return NON_TEXT
+    return None
+
+'''Blank and non-text box rejection
+    - crops are the grayscale crops of the boxes (array views are fine)
+    1. contrast between ink and background below OCR_BLANK_MIN_CONTRAST -> blank (empty margin, paper texture)
+    2. ink fraction below OCR_BLANK_MIN_INK -> blank
+    3. the remaining boxes go through component_reason; those above OCR_NONTEXT_MAX_INK as dense
+    - Steps 1 and 2 are vectorised across all crops; only step 3 looks at the crops one by one
+    - Returns one reason code (or None to keep the box) per crop, in crop order
+'''
+def reject_reasons(crops):
+    if not OCR_BOX_FILTER or not crops:
+        return [None] * len(crops)
+
+    contrast, ink, thresholds, ink_is_dark = ink_statistics(crops)
+    blank = (contrast < OCR_BLANK_MIN_CONTRAST) | (ink < OCR_BLANK_MIN_INK)
+    dense = ink > OCR_NONTEXT_MAX_INK
+    reasons = [BLANK if b else None for b in blank]
+    for i in np.flatnonzero(~blank):
+        reasons[i] = component_reason(crops[i], thresholds[i], ink_is_dark[i], dense=bool(dense[i]))
+    return reasons
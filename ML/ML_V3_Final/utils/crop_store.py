@@ -0,0 +1,99 @@
+import io, os, base64, uuid, threading
+from collections import OrderedDict
+from PIL import Image
+
+
+# ---- Crop Output Configuration ----
+# OCR_CROP_FORMAT             : default crop_format when a request doesn't choose one (see CROP_FORMATS)
+# OCR_CROP_STORE_MAX_ENTRIES  : crops kept in memory for crop_format "ref" before the oldest are dropped
+OCR_CROP_FORMAT = os.getenv("OCR_CROP_FORMAT", "png").lower()
+OCR_CROP_STORE_MAX_ENTRIES = int(os.getenv("OCR_CROP_STORE_MAX_ENTRIES", "4096"))
+
+# Key under which the pipeline carries the preprocessed crop (a PIL image) until the response is built
+CROP_KEY = "_crop"
+
+'''Crop Formats
+    - png  : base64 8-bit PNG in cropped_image_base64 (original behaviour)
+    - png1 : base64 1-bit PNG; the crops are already black/white so nothing is lost, but they are far smaller
+    - webp : base64 lossless WebP
+    - ref  : no image bytes; cropped_image_ref points to GET /crops/{id}, which encodes on demand
+    - none : no crop at all
+'''
+CROP_FORMATS = ("png", "png1", "webp", "ref", "none")
+MEDIA_TYPES = {"png": "image/png", "png1": "image/png", "webp": "image/webp"}
+
+
+def resolve_crop_format(crop_format=None):
+    crop_format = (crop_format or OCR_CROP_FORMAT).lower()
+    if crop_format not in CROP_FORMATS:
+        raise ValueError(f"Unknown crop format {crop_format!r}, expected one of {list(CROP_FORMATS)}")
+    return crop_format
+
+def encode_crop(crop, crop_format="png"):
+    buffer = io.BytesIO()
+    if crop_format == "png1":
+        crop.convert("1").save(buffer, format="PNG", optimize=True)
+    elif crop_format == "webp":
+        crop.save(buffer, format="WEBP", lossless=True)
+    else:
+        crop.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def decode_crop(data):
+    return Image.open(io.BytesIO(data)).convert("L")
+
+
+'''In-memory store for crops handed out by reference
+    - Bounded LRU: a reference stays valid for the last max_entries crops
+    - Crops are stored as images and only encoded when GET /crops/{id} asks for them
+'''
+class CropStore:
+    def __init__(self, max_entries=OCR_CROP_STORE_MAX_ENTRIES):
+        self.max_entries = max(1, int(max_entries))
+        self._crops = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, crop):
+        crop_id = uuid.uuid4().hex
+        with self._lock:
+            self._crops[crop_id] = crop
+            while len(self._crops) > self.max_entries:
+                self._crops.popitem(last=False)
+        return crop_id
+
+    def get(self, crop_id):
+        with self._lock:
+            crop = self._crops.get(crop_id)
+            if crop is not None:
+                self._crops.move_to_end(crop_id)
+            return crop
+
+    def __len__(self):
+        with self._lock:
+            return len(self._crops)
+
+
+_crop_store = CropStore()
+
+def get_crop_store():
+    return _crop_store
+
+'''Turning the carried crop into the requested output field
+    - Called once per detection, right before it leaves process_user_boxes, so crops that
+    nobody asked for are never encoded
+    - Returns a new dictionary without the internal crop key
+'''
+def finalize_crop(detection, crop_format="png"):
+    detection = dict(detection)
+    crop = detection.pop(CROP_KEY, None)
+    if crop is None or crop_format == "none":
+        return detection
+
+    if crop_format == "ref":
+        detection["cropped_image_ref"] = f"/crops/{_crop_store.put(crop)}"
+        return detection
+
+    detection["cropped_image_base64"] = base64.b64encode(encode_crop(crop, crop_format)).decode("utf-8")
+    if crop_format != "png":
+        detection["cropped_image_format"] = crop_format
+    return detection
@@ -0,0 +1,101 @@
+import io, os
+import numpy as np
+from PIL import Image
+
+
+# ---- Image Decode Configuration ----
+# OCR_DECODE_MODE           : "region" decodes to grayscale and keeps only the area covering the boxes,
+#                             "full" is the original path (full page decoded to RGB, grayscale taken from that)
+# OCR_DECODE_MIN_BOX_HEIGHT : > 0 lets the decoder shrink the page (JPEG draft mode, otherwise Image.reduce)
+#                             by 2x/4x/8x as long as the smallest box keeps at least this many pixels of height;
+#                             0 never shrinks
+OCR_DECODE_MODE = os.getenv("OCR_DECODE_MODE", "region").lower()
+OCR_DECODE_MIN_BOX_HEIGHT = int(os.getenv("OCR_DECODE_MIN_BOX_HEIGHT", "0"))
+
+REDUCE_FACTORS = (8, 4, 2)
+
+
+'''Decoded page
+    - gray: 2-D uint8 array of the decoded area (the whole page, or only the region covering the boxes)
+    - origin: (x, y) of gray's top-left pixel in the original image
+    - factor: how much the page was shrunk while decoding (1 = full resolution)
+    - size: (width, height) of the original image; boxes are clamped against this and the output
+    coordinates always stay in original image space
+'''
+class DecodedPage:
+    def __init__(self, gray, origin=(0, 0), factor=1, size=None):
+        self.gray = gray
+        self.origin = origin
+        self.factor = factor
+        self.size = size or (gray.shape[1], gray.shape[0])
+
+    def to_local(self, clamped):
+        # original-space (x1, y1, x2, y2) -> rectangle in gray; never empty, never outside gray
+        ox, oy = self.origin
+        height, width = self.gray.shape[:2]
+        x1, y1, x2, y2 = clamped
+        lx1 = min(width - 1, max(0, (x1 - ox) // self.factor))
+        ly1 = min(height - 1, max(0, (y1 - oy) // self.factor))
+        lx2 = min(width, max(lx1 + 1, -(-(x2 - ox) // self.factor)))
+        ly2 = min(height, max(ly1 + 1, -(-(y2 - oy) // self.factor)))
+        return lx1, ly1, lx2, ly2
+
+    @property
+    def nbytes(self):
+        return self.gray.nbytes
+
+
+def union_rect(rects):
+    return (min(r[0] for r in rects), min(r[1] for r in rects),
+            max(r[2] for r in rects), max(r[3] for r in rects))
+
+def reduce_factor(rects, min_box_height=None):
+    # largest 2^n shrink that keeps the smallest box at least min_box_height pixels tall
+    min_box_height = OCR_DECODE_MIN_BOX_HEIGHT if min_box_height is None else min_box_height
+    if min_box_height <= 0 or not rects:
+        return 1
+    smallest = min(y2 - y1 for _, y1, _, y2 in rects)
+    for factor in REDUCE_FACTORS:
+        if smallest / factor >= min_box_height:
+            return factor
+    return 1
+
+'''Decoding a page for the clamped boxes of a request
+    - pil_image is the lazily opened image (Image.open only read the header so far)
+    - mode "full": original behaviour, whole page decoded to RGB and converted to grayscale
+    - mode "region":
+        1. JPEG: draft("L", ...) makes libjpeg decode only the luma channel, already downscaled by the
+           reduce factor. Other formats (PNG...) have no such mode: the whole page is still decoded and
+           converted to grayscale, only no RGB copy is kept
+        2. the decoded page is cut down to the rectangle covering all boxes right away, so only
+           that region is held for the rest of the request (and copied to shared memory in process mode);
+           this saves memory, not decode time
+        3. non-JPEG pages are shrunk with Image.reduce when a reduce factor applies
+    - Returns a DecodedPage
+'''
+def decode_page(pil_image, rects, mode=None, min_box_height=None):
+    mode = mode or OCR_DECODE_MODE
+    size = pil_image.size
+    if mode == "full" or not rects:
+        return DecodedPage(np.asarray(pil_image.convert("RGB").convert("L")), size=size)
+
+    factor = reduce_factor(rects, min_box_height)
+    drafted = 1
+    if pil_image.format == "JPEG":
+        pil_image.draft("L", (-(-size[0] // factor), -(-size[1] // factor)))
+        drafted = max(1, round(size[0] / pil_image.size[0]))
+    gray = pil_image.convert("L")
+
+    # rectangle covering all boxes, in the coordinates of what was actually decoded
+    x1, y1, x2, y2 = union_rect(rects)
+    x1, y1 = x1 // drafted * drafted, y1 // drafted * drafted
+    region = gray.crop((x1 // drafted, y1 // drafted, -(-x2 // drafted), -(-y2 // drafted)))
+
+    remaining = factor // drafted
+    if remaining > 1:
+        region = region.reduce(remaining)
+    return DecodedPage(np.array(region), origin=(x1, y1), factor=drafted * max(1, remaining), size=size)
+
+def open_page(image_bytes):
+    # Only reads the header; decoding happens in decode_page
+    return Image.open(io.BytesIO(image_bytes))
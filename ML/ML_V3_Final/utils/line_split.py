@@ -0,0 +1,82 @@
+import os
+import numpy as np
+
+
+# ---- Paragraph Line Split Configuration ----
+# OCR_LINE_SPLIT           : "1" splits paragraph boxes into text lines that are recognised concurrently, "0" disables
+# OCR_LINE_SPLIT_MIN_LINES : a box is only split when at least this many lines are found
+# OCR_LINE_BOXES           : "1" adds the per-line sub-boxes ("lines") to the detections of split boxes
+OCR_LINE_SPLIT = os.getenv("OCR_LINE_SPLIT", "1") == "1"
+OCR_LINE_SPLIT_MIN_LINES = int(os.getenv("OCR_LINE_SPLIT_MIN_LINES", "3"))
+OCR_LINE_BOXES = os.getenv("OCR_LINE_BOXES", "0") == "1"
+
+# Page segmentation mode 7: treat the image as a single text line
+LINE_PSM = 7
+
+# A row is part of a line when it holds at least this fraction of the crop width in ink (and >= 2 px)
+MIN_ROW_INK = 0.005
+# Bands thinner than this fraction of the median band are vowel signs / subscripts of a neighbouring line
+MIN_BAND_RATIO = 0.4
+
+
+def ink_mask(binary):
+    # binary is a black/white crop; ink is the minority class so inverted crops work too
+    ink = np.asarray(binary) < 128
+    return ~ink if np.count_nonzero(ink) > ink.size // 2 else ink
+
+def ink_bands(profile, min_ink):
+    # (start, end) of the runs of rows whose ink count reaches min_ink
+    rows = np.concatenate(([False], profile >= min_ink, [False]))
+    edges = np.flatnonzero(np.diff(rows.astype(np.int8)))
+    return [[int(start), int(end)] for start, end in zip(edges[::2], edges[1::2])]
+
+'''Merging bands that are not lines of their own
+    - Khmer vowel signs above the line and subscript consonants below it often leave a thin band
+    separated from the line by a few empty rows; such a band is merged into its nearest neighbour
+'''
+def merge_thin_bands(bands):
+    while len(bands) > 1:
+        heights = [end - start for start, end in bands]
+        median = float(np.median(heights))
+        thinnest = int(np.argmin(heights))
+        if heights[thinnest] >= MIN_BAND_RATIO * median:
+            break
+        gap_above = bands[thinnest][0] - bands[thinnest - 1][1] if thinnest > 0 else None
+        gap_below = bands[thinnest + 1][0] - bands[thinnest][1] if thinnest + 1 < len(bands) else None
+        target = thinnest - 1 if gap_below is None or (gap_above is not None and gap_above <= gap_below) else thinnest + 1
+        start, end = bands.pop(thinnest)
+        if target > thinnest:
+            target -= 1
+        bands[target] = [min(bands[target][0], start), max(bands[target][1], end)]
+    return bands
+
+'''Line segmentation of a binarised crop with a horizontal projection profile
+    1. Ink per row (NumPy sum over the columns); rows above MIN_ROW_INK form bands
+    2. Thin bands (marks above/below a line) are merged into their nearest line
+    3. Every line is cut at the middle of the gaps around it, so no pixel of the crop is lost
+    - Returns a list of (top, bottom, left, right) in crop pixels, in reading order (top to bottom),
+    or None when fewer than min_lines lines are found (the box is then read as a whole)
+'''
+def split_lines(binary, min_lines=None):
+    min_lines = OCR_LINE_SPLIT_MIN_LINES if min_lines is None else min_lines
+    ink = ink_mask(binary)
+    height, width = ink.shape
+    bands = merge_thin_bands(ink_bands(ink.sum(axis=1), max(2, MIN_ROW_INK * width)))
+    if len(bands) < max(2, min_lines):
+        return None
+
+    cuts = [0] + [(above[1] + below[0]) // 2 for above, below in zip(bands, bands[1:])] + [height]
+    lines = []
+    for top, bottom in zip(cuts, cuts[1:]):
+        columns = np.flatnonzero(ink[top:bottom].any(axis=0))
+        left, right = (int(columns[0]), int(columns[-1]) + 1) if columns.size else (0, width)
+        lines.append((top, bottom, left, right))
+    return lines
+
+def line_to_original(line, crop_size, clamped):
+    # crop pixels -> original image coordinates (the crop may have been resampled, see utils/text_scale.py)
+    top, bottom, left, right = line
+    crop_width, crop_height = crop_size
+    x1, y1, x2, y2 = clamped
+    sx, sy = (x2 - x1) / crop_width, (y2 - y1) / crop_height
+    return [x1 + int(left * sx), y1 + int(top * sy), x1 + int(round(right * sx)), y1 + int(round(bottom * sy))]
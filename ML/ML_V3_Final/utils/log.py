@@ -0,0 +1,67 @@
+import os, sys, json, logging, threading
+
+
+# ---- Logging Configuration ----
+# OCR_LOG_LEVEL  : DEBUG (every box), INFO (one line per request / stage summary), WARNING, ERROR
+# OCR_LOG_FORMAT : "text" (human readable, fields as key=value) or "json" (one JSON object per line)
+OCR_LOG_LEVEL = os.getenv("OCR_LOG_LEVEL", "INFO").upper()
+OCR_LOG_FORMAT = os.getenv("OCR_LOG_FORMAT", "text").lower()
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+'''Structured log formatter
+    - Fields are passed with extra=fields(key=value, ...) and end up as record attributes
+    - text : "2024-01-01 12:00:00 INFO  ocr.server  OCR request received project_id=3 filename=a.jpg"
+    - json : {"ts": ..., "level": ..., "logger": ..., "message": ..., "project_id": 3, ...}
+'''
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, fmt="text"):
+        super().__init__()
+        self.fmt = fmt
+
+    def format(self, record):
+        extra = {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRS}
+        message = record.getMessage()
+        if self.fmt == "json":
+            entry = {"ts": self.formatTime(record), "level": record.levelname, "logger": record.name, "message": message, **extra}
+            if record.exc_info:
+                entry["exc_info"] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        line = f"{self.formatTime(record)} {record.levelname:<5} {record.name:<12} {message}"
+        if extra:
+            line += " " + " ".join(f"{key}={value}" for key, value in extra.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+_configured = False
+_configure_lock = threading.Lock()
+
+def configure_logging(level=None, fmt=None):
+    # One handler on the "ocr" logger; safe to call more than once (process-pool workers call it too)
+    global _configured
+    with _configure_lock:
+        logger = logging.getLogger("ocr")
+        if _configured and level is None and fmt is None:
+            return logger
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(StructuredFormatter(fmt or OCR_LOG_FORMAT))
+        logger.addHandler(handler)
+        logger.setLevel(level or OCR_LOG_LEVEL)
+        logger.propagate = False
+        _configured = True
+        return logger
+
+def get_logger(name):
+    configure_logging()
+    return logging.getLogger(f"ocr.{name}")
+
+def fields(**values):
+    # logger.info("message", extra=fields(key=value)); a key that clashes with a LogRecord
+    # attribute (e.g. "filename") would make logging raise, so it gets a trailing underscore
+    return {(f"{key}_" if key in _STANDARD_ATTRS else key): value for key, value in values.items()}
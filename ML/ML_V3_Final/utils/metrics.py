@@ -0,0 +1,185 @@
+import time, threading
+from contextlib import contextmanager
+
+
+# Seconds; covers a cached box (sub-millisecond) up to NL-means on a full page
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_string(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+'''Counter: monotonically increasing value per label set'''
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name + "_total", _label_string(self.labelnames, key), value)
+                    for key, value in sorted(self._values.items())]
+
+'''Histogram: cumulative bucket counts, sum and count per label set'''
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state):
+                    samples.append((self.name + "_bucket", _label_string(self.labelnames, key, [("le", _number(bound))]), count))
+                samples.append((self.name + "_bucket", _label_string(self.labelnames, key, [("le", "+Inf")]), state[-1]))
+                samples.append((self.name + "_sum", _label_string(self.labelnames, key), state[-2]))
+                samples.append((self.name + "_count", _label_string(self.labelnames, key), state[-1]))
+        return samples
+
+'''Gauge: current value per label set, either set directly or read from a function at render time'''
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn, **labels):
+        self.set(fn, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, _label_string(self.labelnames, key), value() if callable(value) else value)
+                for key, value in values]
+
+
+'''Registry rendered by GET /metrics in the Prometheus text exposition format (version 0.0.4)'''
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "ocr_stage_duration_seconds", "Time spent per pipeline stage and call (per page for decode, per box or batch of boxes otherwise)",
+    labelnames=("stage",)))
+BOXES_PROCESSED = REGISTRY.register(Counter(
+    "ocr_boxes_processed", "Boxes that got text by OCR, from the cache or shared from a duplicate box", labelnames=("source",)))
+BOXES_SKIPPED = REGISTRY.register(Counter(
+    "ocr_boxes_skipped", "Boxes that were not OCR'd: invalid coordinates, blank or non-text", labelnames=("reason",)))
+ERRORS = REGISTRY.register(Counter(
+    "ocr_errors", "Errors by the stage they happened in", labelnames=("stage",)))
+EXECUTOR_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "ocr_executor_queue_depth", "Tasks waiting for a free thread", labelnames=("executor",)))
+EXECUTOR_THREADS = REGISTRY.register(Gauge(
+    "ocr_executor_threads", "Threads started so far (up to the executor's maximum)", labelnames=("executor",)))
+
+
+'''Stage timers and error counts
+    - with timed("preprocess"): ... observes the block's duration in STAGE_SECONDS
+    - Inside capture_timings() timings and errors are collected in a list instead, so a process-pool
+    worker can send them back with its result and the server process records them (replay_timings)
+'''
+_capture = threading.local()
+
+def observe_stage(stage, seconds):
+    captured = getattr(_capture, "timings", None)
+    if captured is not None:
+        captured.append(("timing", stage, seconds))
+    else:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+def record_error(stage):
+    captured = getattr(_capture, "timings", None)
+    if captured is not None:
+        captured.append(("error", stage, 1))
+    else:
+        ERRORS.inc(stage=stage)
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+@contextmanager
+def capture_timings():
+    previous = getattr(_capture, "timings", None)
+    _capture.timings = []
+    try:
+        yield _capture.timings
+    finally:
+        _capture.timings = previous
+
+def replay_timings(timings):
+    for kind, stage, value in timings or ():
+        if kind == "timing":
+            STAGE_SECONDS.observe(value, stage=stage)
+        else:
+            ERRORS.inc(value, stage=stage)
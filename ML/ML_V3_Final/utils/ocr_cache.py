@@ -0,0 +1,200 @@
+import os, json, time, base64, hashlib, sqlite3, threading
+from collections import OrderedDict
+import pytesseract
+from utils.crop_store import encode_crop, decode_crop, CROP_KEY
+from utils.log import get_logger, fields
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+logger = get_logger("cache")
+
+
+# ---- OCR Result Cache Configuration ----
+# OCR_CACHE                  : "1" enables the cache in front of the per-box OCR step, "0" disables it
+# OCR_CACHE_MAX_ENTRIES      : size of the in-memory LRU tier (number of box results)
+# OCR_CACHE_DB               : path of the SQLite file for the persistent tier (empty = memory only)
+# OCR_CACHE_DISK_MAX_ENTRIES : the disk tier is pruned back to this many least recently used results
+OCR_CACHE = os.getenv("OCR_CACHE", "1") == "1"
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "2048"))
+OCR_CACHE_DB = os.getenv("OCR_CACHE_DB", "")
+OCR_CACHE_DISK_MAX_ENTRIES = int(os.getenv("OCR_CACHE_DISK_MAX_ENTRIES", "100000"))
+
+
+def image_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def make_cache_key(img_hash, clamped_box, settings):
+    # settings holds everything else that changes the output (profile, scope, mode, cascade, language...)
+    payload = json.dumps([img_hash, list(clamped_box), settings], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+'''Engine Fingerprint
+    - Tesseract version + size/mtime of the traineddata files in use
+    - Part of every cache key, and stored with the disk tier: when it changes (Tesseract upgrade,
+    new khm.traineddata) the old results are dropped instead of being served
+'''
+def engine_fingerprint(langs=("khm",)):
+    try:
+        version = tesserocr.tesseract_version() if tesserocr is not None else str(pytesseract.get_tesseract_version())
+    except Exception:
+        version = "unknown"
+
+    tessdata = os.getenv("TESSDATA_PREFIX", "")
+    parts = [version.strip()]
+    for lang in langs:
+        path = os.path.join(tessdata, f"{lang}.traineddata")
+        try:
+            st = os.stat(path)
+            parts.append(f"{lang}:{st.st_size}:{int(st.st_mtime)}")
+        except OSError:
+            parts.append(f"{lang}:missing")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+'''Two-tier OCR Result Cache
+    - Memory tier: LRU (OrderedDict) bounded to max_entries results
+    - Disk tier (optional): SQLite table that survives restarts; a memory miss that hits the disk
+    is promoted back into memory
+    - Values are detection dictionaries; the memory tier keeps the crop image as is, the disk tier
+    stores it as a 1-bit PNG (the crops are binary, so this is lossless)
+'''
+class OcrResultCache:
+    def __init__(self, max_entries=OCR_CACHE_MAX_ENTRIES, db_path=OCR_CACHE_DB,
+                 disk_max_entries=OCR_CACHE_DISK_MAX_ENTRIES, fingerprint=None):
+        self.max_entries = max(1, int(max_entries))
+        self.disk_max_entries = max(1, int(disk_max_entries))
+        self.fingerprint = fingerprint or engine_fingerprint()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "puts": 0,
+                       "evictions": 0, "disk_evictions": 0, "invalidations": 0}
+        self._db = None
+        self._disk_puts = 0
+        if db_path:
+            self._open_disk_tier(db_path)
+
+    def _open_disk_tier(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, accessed REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+        if row is not None and row[0] != self.fingerprint:
+            logger.warning("Engine fingerprint changed - clearing disk tier", extra=fields(previous=row[0], fingerprint=self.fingerprint))
+            self._db.execute("DELETE FROM results")
+        self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('fingerprint', ?)", (self.fingerprint,))
+        self._db.commit()
+
+    def key(self, img_hash, clamped_box, settings):
+        return make_cache_key(img_hash, clamped_box, dict(settings, engine=self.fingerprint))
+
+    def get(self, key):
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return dict(value)
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    value = self._from_disk(row[0])
+                    self._remember(key, value)
+                    self._stats["disk_hits"] += 1
+                    return dict(value)
+
+            self._stats["misses"] += 1
+            return None
+
+    def _to_disk(self, value):
+        value = dict(value)
+        crop = value.pop(CROP_KEY, None)
+        if crop is not None:
+            value[CROP_KEY + "_png"] = base64.b64encode(encode_crop(crop, "png1")).decode("ascii")
+        return json.dumps(value, ensure_ascii=False)
+
+    def _from_disk(self, data):
+        value = json.loads(data)
+        crop_png = value.pop(CROP_KEY + "_png", None)
+        if crop_png is not None:
+            value[CROP_KEY] = decode_crop(base64.b64decode(crop_png))
+        return value
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, dict(value))
+            self._stats["puts"] += 1
+            if self._db is None:
+                return
+            self._db.execute("INSERT OR REPLACE INTO results (key, value, accessed) VALUES (?, ?, ?)",
+                             (key, self._to_disk(value), time.time()))
+            self._disk_puts += 1
+            if self._disk_puts % 256 == 0:
+                self._prune_disk()
+            self._db.commit()
+
+    def _prune_disk(self):
+        count = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        excess = count - self.disk_max_entries
+        if excess > 0:
+            self._db.execute("DELETE FROM results WHERE key IN "
+                             "(SELECT key FROM results ORDER BY accessed ASC LIMIT ?)", (excess,))
+            self._stats["disk_evictions"] += excess
+
+    def invalidate(self, refresh_fingerprint=True):
+        '''Drop every cached result, e.g. after installing a new Tesseract or traineddata'''
+        with self._lock:
+            self._memory.clear()
+            if refresh_fingerprint:
+                self.fingerprint = engine_fingerprint()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('fingerprint', ?)", (self.fingerprint,))
+                self._db.commit()
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["max_entries"] = self.max_entries
+            stats["disk_enabled"] = self._db is not None
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            stats["fingerprint"] = self.fingerprint
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+def get_ocr_cache():
+    '''Shared cache, or None when OCR_CACHE=0'''
+    global _ocr_cache
+    if not OCR_CACHE:
+        return None
+    with _ocr_cache_lock:
+        if _ocr_cache is None:
+            _ocr_cache = OcrResultCache()
+        return _ocr_cache
@@ -0,0 +1,65 @@
+import os
+import numpy as np, cv2
+from PIL import Image
+from utils.tess_engine import get_engine_pool
+from utils.page_preprocess import denoise
+from utils.log import get_logger, fields
+
+logger = get_logger("cascade")
+
+
+# ---- OCR Cascade Configuration ----
+# OCR_CASCADE                : "1" re-runs low-confidence boxes through the heavier stages below, "0" disables
+# OCR_CASCADE_MIN_CONFIDENCE : mean word confidence (0-100) a result needs to stop the cascade
+OCR_CASCADE = os.getenv("OCR_CASCADE", "1") == "1"
+OCR_CASCADE_MIN_CONFIDENCE = float(os.getenv("OCR_CASCADE_MIN_CONFIDENCE", "60"))
+
+FIRST_PASS_STAGE = "first_pass"
+
+'''Cascade stages, tried in order only while the best confidence so far is below the threshold
+    - accurate    : NL-means denoising instead of the cheap profile
+    - upscaled    : same, on the crop resampled to 2x (small glyphs)
+    - single_line : 2x crop read with page segmentation mode 7 (treat the crop as one text line)
+'''
+CASCADE_STAGES = [
+    {"name": "accurate", "profile": "accurate", "scale": 1.0, "psm": None},
+    {"name": "upscaled", "profile": "accurate", "scale": 2.0, "psm": None},
+    {"name": "single_line", "profile": "accurate", "scale": 2.0, "psm": 7},
+]
+
+
+def binarize(gray, profile, scale=1.0):
+    if scale != 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    _, thresh = cv2.threshold(denoise(np.ascontiguousarray(gray), profile), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return Image.fromarray(thresh)
+
+def recognize(preprocessed, lang="khm", psm=None):
+    return get_engine_pool().image_to_text_conf(preprocessed, lang=lang, psm=psm)
+
+'''Escalating a low-confidence box
+    - first is the first-pass result {"raw_text", "confidence", "stage", "profile", "preprocessed"}
+    - gray_crop is the box cut from the grayscale page (before any preprocessing)
+    - Returns the result with the highest confidence over all stages that were run
+'''
+def run_cascade(idx, gray_crop, first, lang="khm", min_confidence=None):
+    min_confidence = OCR_CASCADE_MIN_CONFIDENCE if min_confidence is None else min_confidence
+    best = first
+    if not OCR_CASCADE or best["confidence"] >= min_confidence:
+        return best
+
+    for stage in CASCADE_STAGES:
+        preprocessed = binarize(gray_crop, stage["profile"], stage["scale"])
+        raw_text, confidence = recognize(preprocessed, lang=lang, psm=stage["psm"])
+        logger.debug("Cascade stage", extra=fields(box=idx + 1, stage=stage["name"], confidence=round(confidence, 1)))
+        if confidence > best["confidence"]:
+            best = {
+                "raw_text": raw_text,
+                "confidence": confidence,
+                "stage": stage["name"],
+                "profile": stage["profile"],
+                "preprocessed": preprocessed,
+            }
+        if best["confidence"] >= min_confidence:
+            break
+    return best
@@ -0,0 +1,160 @@
+import os, time, uuid, asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import record_error
+from utils.log import get_logger, fields
+
+logger = get_logger("jobs")
+
+
+# ---- OCR Job Queue Configuration ----
+# OCR_JOB_WORKERS    : jobs processed at the same time (each worker owns one OCR thread)
+# OCR_JOB_QUEUE_SIZE : jobs allowed to wait; further submissions are rejected until a slot frees up
+# OCR_JOB_RETENTION  : finished jobs kept for polling before the oldest are forgotten
+OCR_JOB_WORKERS = int(os.getenv("OCR_JOB_WORKERS", "2"))
+OCR_JOB_QUEUE_SIZE = int(os.getenv("OCR_JOB_QUEUE_SIZE", "64"))
+OCR_JOB_RETENTION = int(os.getenv("OCR_JOB_RETENTION", "1000"))
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def _ms(start, end):
+    return round((end - start) * 1000, 1) if start is not None and end is not None else None
+
+'''Bounded OCR Job Queue
+    - submit() returns a job id straight away; the job waits on an asyncio.Queue of at most
+    max_queue entries, so a burst of uploads is smoothed out instead of piling threads onto
+    the default executor
+    - A fixed number of worker tasks take jobs off the queue and await handler(job, queue);
+    the handler runs the blocking OCR on queue.executor (one thread per worker)
+    - Every job records when it was queued, started and finished; the handler can add its own
+    stage timings to job["timings"]
+    - When a job has a callback, on_finish(job) is awaited once it is done or failed
+'''
+class OcrJobQueue:
+    def __init__(self, handler, on_finish=None, workers=OCR_JOB_WORKERS, max_queue=OCR_JOB_QUEUE_SIZE,
+                 retention=OCR_JOB_RETENTION):
+        self.handler = handler
+        self.on_finish = on_finish
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.retention = max(1, int(retention))
+        self.executor = None
+        self._queue = None
+        self._tasks = []
+        self._jobs = OrderedDict()
+        self._busy = 0
+        self._stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0}
+
+    def start(self):
+        if self._tasks:
+            return
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr-job")
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        logger.info("Job workers started", extra=fields(workers=self.workers, max_queue=self.max_queue))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def submit(self, payload, callback_url=None):
+        self.start()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "payload": payload,
+            "callback_url": callback_url,
+            "callback_status": None,
+            "result": None,
+            "error": None,
+            "timings": {"queued_at": time.time(), "started_at": None, "finished_at": None},
+        }
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._stats["rejected"] += 1
+            raise JobQueueFull(f"OCR job queue is full ({self.max_queue} jobs waiting)")
+
+        self._jobs[job["job_id"]] = job
+        self._stats["submitted"] += 1
+        self._forget_old_jobs()
+        return job
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._busy += 1
+            timings = job["timings"]
+            timings["started_at"] = time.time()
+            job["status"] = "running"
+            try:
+                job["result"] = await self.handler(job, self)
+                job["status"] = "done"
+                self._stats["done"] += 1
+            except Exception as e:
+                logger.error("Job failed", extra=fields(job_id=job["job_id"], error=str(e)))
+                record_error("job")
+                job["error"] = str(e)
+                job["status"] = "failed"
+                self._stats["failed"] += 1
+            finally:
+                timings["finished_at"] = time.time()
+                timings["queue_wait_ms"] = _ms(timings["queued_at"], timings["started_at"])
+                timings["total_ms"] = _ms(timings["queued_at"], timings["finished_at"])
+                # the image bytes aren't needed once the job has run
+                job["payload"] = None
+                self._busy -= 1
+                self._queue.task_done()
+
+            if job["callback_url"] and self.on_finish is not None:
+                try:
+                    job["callback_status"] = await self.on_finish(job)
+                except Exception as e:
+                    job["callback_status"] = f"failed: {e}"
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def describe(self, job, include_result=False):
+        '''Public view of a job (without the image payload)'''
+        info = {
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "timings": dict(job["timings"]),
+            "error": job["error"],
+            "callback_url": job["callback_url"],
+            "callback_status": job["callback_status"],
+        }
+        if include_result:
+            info["result"] = job["result"]
+        return info
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["workers"] = self.workers
+        stats["busy_workers"] = self._busy
+        stats["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        stats["max_queue"] = self.max_queue
+        stats["jobs_tracked"] = len(self._jobs)
+
+        finished = [job["timings"] for job in self._jobs.values() if job["status"] in ("done", "failed")]
+        for name in ("queue_wait_ms", "ocr_ms", "backend_ms", "total_ms"):
+            values = [t[name] for t in finished if t.get(name) is not None]
+            stats[f"avg_{name}"] = round(sum(values) / len(values), 1) if values else None
+            stats[f"max_{name}"] = max(values) if values else None
+        return stats
@@ -1,9 +1,29 @@
-import io, base64, re, numpy as np, cv2
+import io, re, functools, logging, numpy as np, cv2
+from concurrent.futures import as_completed
 from PIL import Image
 import pytesseract
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from utils.tess_engine import get_engine_pool
+from utils.parallel_ocr import iter_pages_in_process_pool, get_line_executor, OCR_EXECUTION_MODE
+from utils.stitched_ocr import recognize_stitched
+from utils.page_preprocess import preprocess_boxes, denoise, resolve_profile, OCR_PREPROCESS_SCOPE
+from utils.ocr_cascade import recognize, run_cascade, FIRST_PASS_STAGE, CASCADE_STAGES, OCR_CASCADE, OCR_CASCADE_MIN_CONFIDENCE
+from utils.ocr_cache import get_ocr_cache, image_hash
+from utils.crop_store import finalize_crop, resolve_crop_format, CROP_KEY
+from utils.image_decode import DecodedPage, decode_page, open_page, OCR_DECODE_MODE, OCR_DECODE_MIN_BOX_HEIGHT
+from utils.text_scale import text_scale, rescale, OCR_TEXT_HEIGHT_TARGET, OCR_TEXT_HEIGHT_TOLERANCE
+from utils.box_filter import reject_reasons, filter_settings
+from utils.box_consolidate import consolidate_boxes
+from utils.line_split import split_lines, line_to_original, LINE_PSM, OCR_LINE_SPLIT, OCR_LINE_SPLIT_MIN_LINES, OCR_LINE_BOXES
+from utils.metrics import timed, capture_timings, replay_timings, record_error, BOXES_PROCESSED, BOXES_SKIPPED
+from utils.log import get_logger, fields
+
+logger = get_logger("ocr")
+
+# Key under which a process-pool worker sends its stage timings back with the detection
+TIMINGS_KEY = "_timings"
 
 
 # ---- Configure Tesseract ----
@@ -34,92 +54,487 @@ os.environ["TESSDATA_PREFIX"] = TESSERACT_TESSDATA_PREFIX
 '''This first function for cleaning image before sending to OCR engine
     1. Convert to Grayscale -> reduce noise from color channels
     2. Denoise image using Non-local Means Denoising --> smoothing background, sharpening text
+       (or a cheaper filter / none, depending on the preprocessing profile, see utils/page_preprocess.py)
     3. Apply Otsu's thresholding ---> to get binary image and make text more distinct in black/white 
 '''
-def preprocess_for_ocr(pil_image):
+def preprocess_for_ocr(pil_image, profile="accurate"):
     gray = np.array(pil_image.convert("L"))
-    denoised = cv2.fastNlMeansDenoising(gray, h=10, templateWindowSize=7, searchWindowSize=21)
+    denoised = denoise(gray, resolve_profile(profile))
     _, thresh = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
     return Image.fromarray(thresh)
 
+'''Clamping a User-defined Box
+    - Boxes come straight from the annotations JSON, so they may be malformed or outside the image
+    - Returns the box clamped to the image bounds, or None when it has to be skipped
+'''
+def clamp_box(idx, box, img_width, img_height, verbose=True):
+    log = logger.debug if verbose else (lambda *args, **kwargs: None)
+    if not (isinstance(box, list) and len(box) == 4):
+        log("Box skipped - invalid format (not a list of 4 values)", extra=fields(box=idx + 1))
+        return None
+
+    # Ensure coordinates are valid integers
+    try:
+        x1, y1, x2, y2 = map(int, box)
+
+        # Validate coordinates are within image bounds
+        x1 = max(0, min(x1, img_width))
+        y1 = max(0, min(y1, img_height))
+        x2 = max(0, min(x2, img_width))
+        y2 = max(0, min(y2, img_height))
+
+        # Ensure box has valid dimensions
+        if x2 <= x1 or y2 <= y1:
+            log("Box skipped - invalid dimensions (width or height <= 0)", extra=fields(box=idx + 1, coords=box))
+            return None
+
+    except (ValueError, TypeError) as e:
+        log("Box skipped - coordinate conversion error", extra=fields(box=idx + 1, error=str(e)))
+        return None
+
+    return x1, y1, x2, y2
+
+'''Cropping and preprocessing a single User-defined Box
+    - page is the decoded page as a NumPy array: grayscale (H, W) from utils/image_decode.py, or RGB (H, W, 3);
+    it may live in shared memory when called from a process-pool worker, so it is only ever sliced, never modified
+    - origin / factor / size describe where page sits in the original image (see DecodedPage); the box is
+    clamped against the original size and the returned clamped box stays in original image space
+    - Blank and non-text boxes are rejected before any preprocessing (see utils/box_filter.py)
+    - The crop is resampled to OCR_TEXT_HEIGHT_TARGET (see utils/text_scale.py) before preprocessing
+    - Returns (clamped box, preprocessed crop, grayscale crop, reject reason), or None when the box is skipped;
+    a rejected box has no preprocessed crop
+'''
+def prepare_box(page, idx, box, profile=None, origin=(0, 0), factor=1, size=None):
+    with timed("crop"):
+        decoded = DecodedPage(page, origin, factor, size)
+        img_width, img_height = decoded.size
+        clamped = clamp_box(idx, box, img_width, img_height)
+        if clamped is None:
+            return None
+        x1, y1, x2, y2 = decoded.to_local(clamped)
+
+        cropped = Image.fromarray(page[y1:y2, x1:x2])
+        gray_crop = np.asarray(cropped.convert("L"))
+        reason = reject_reasons([gray_crop])[0]
+        if reason is not None:
+            logger.debug("Box rejected before OCR", extra=fields(box=idx + 1, reason=reason))
+            return clamped, None, gray_crop, reason
+        scale = text_scale(gray_crop)
+        if scale != 1.0:
+            gray_crop = rescale(gray_crop, scale)
+            cropped = Image.fromarray(gray_crop)
+        logger.debug("Box cropped", extra=fields(box=idx + 1, size=cropped.size, scale=round(scale, 2)))
+
+    with timed("preprocess"):
+        preprocessed = preprocess_for_ocr(cropped, resolve_profile(profile))
+    return clamped, preprocessed, gray_crop, None
+
+def clean_text(raw_text):
+    # Using regex to clean up whitespace characters after passing the cleaned cropping image into Tesseract
+    return re.sub(r"\s+", " ", raw_text).strip()
+
+'''Text Recognition with a confidence-driven cascade
+    - First pass: the crop preprocessed with the request profile, read with word confidences
+    - Boxes below OCR_CASCADE_MIN_CONFIDENCE are re-run with heavier preprocessing, upscaling and an
+    alternate page segmentation mode (see utils/ocr_cascade.py); the most confident result wins
+    - first may carry an already recognised first pass (e.g. from the stitched page)
+    - Paragraph boxes are split into lines that are recognised concurrently (see recognize_lines)
+'''
+def recognize_box(idx, preprocessed, gray_crop, profile, first=None):
+    try:
+        lines = split_lines(preprocessed) if first is None and OCR_LINE_SPLIT else None
+        if lines:
+            result = recognize_lines(idx, preprocessed, gray_crop, profile, lines)
+            logger.debug("Text extracted", extra=fields(box=idx + 1, length=len(clean_text(result["raw_text"])),
+                                                        confidence=round(result["confidence"], 1), stage=result["stage"], lines=len(lines)))
+            return result
+        if first is None:
+            # Text Recognition and Extraction Stages using Tesseract OCR with Khmer language
+            # The engine pool keeps "khm" loaded between calls (falls back to pytesseract subprocess)
+            raw_text, confidence = recognize(preprocessed, lang="khm")
+            first = {"raw_text": raw_text, "confidence": confidence, "stage": FIRST_PASS_STAGE,
+                     "profile": profile, "preprocessed": preprocessed}
+        result = run_cascade(idx, gray_crop, first, lang="khm")
+        logger.debug("Text extracted", extra=fields(box=idx + 1, length=len(clean_text(result["raw_text"])),
+                                                    confidence=round(result["confidence"], 1), stage=result["stage"]))
+    except Exception as e:
+        logger.error("OCR error", extra=fields(box=idx + 1, error=str(e)))
+        record_error("ocr")
+        result = {"raw_text": "", "confidence": 0.0, "stage": FIRST_PASS_STAGE,
+                  "profile": profile, "preprocessed": preprocessed}
+    return result
+
+def recognize_line(idx, preprocessed_line, gray_line, profile):
+    raw_text, confidence = recognize(preprocessed_line, lang="khm", psm=LINE_PSM)
+    first = {"raw_text": raw_text, "confidence": confidence, "stage": FIRST_PASS_STAGE,
+             "profile": profile, "preprocessed": preprocessed_line}
+    return run_cascade(idx, gray_line, first, lang="khm")
+
+'''Text Recognition of a paragraph box, line by line
+    - lines come from utils/line_split.split_lines, in reading order; every line is read on the
+    line executor with single-line page segmentation, and goes through the cascade on its own
+    - The line texts are joined in reading order; the box confidence is the mean line confidence
+    weighted by text length, and the stage / profile are the heaviest any line needed
+    - Returns the same result dictionary as recognize_box, plus "lines": [(line, text, confidence)]
+'''
+def recognize_lines(idx, preprocessed, gray_crop, profile, lines):
+    binary = np.asarray(preprocessed)
+    executor = get_line_executor()
+    futures = [
+        executor.submit(recognize_line, idx, Image.fromarray(binary[top:bottom]), gray_crop[top:bottom], profile)
+        for top, bottom, _, _ in lines
+    ]
+    results = [future.result() for future in futures]
+
+    texts = [clean_text(result["raw_text"]) for result in results]
+    weights = [len(text) for text in texts]
+    confidence = sum(r["confidence"] * w for r, w in zip(results, weights)) / sum(weights) if sum(weights) else 0.0
+    order = [FIRST_PASS_STAGE] + [stage["name"] for stage in CASCADE_STAGES]
+    heaviest = max(results, key=lambda result: order.index(result["stage"]))
+    return {
+        "raw_text": " ".join(text for text in texts if text),
+        "confidence": confidence,
+        "stage": heaviest["stage"],
+        "profile": heaviest["profile"],
+        "preprocessed": preprocessed,
+        "lines": [(line, text, result["confidence"]) for line, text, result in zip(lines, texts, results)],
+    }
+
+def package_detection(clamped, result):
+    text = clean_text(result["raw_text"])
+
+    ''' Post-Processing & Output Packaging steps of OCR pipeline 
+        - Each detected text box is represented as a dictionary with:
+            - box_coordinates: The coordinates of the bounding box
+            - extracted_text: The text extracted from the cropped image
+            - _crop: The preprocessed crop itself; it is only encoded (cropped_image_base64 / cropped_image_ref)
+              by finalize_crop at the end, according to the requested crop_format
+            - preprocess_profile: The preprocessing profile that produced the crop
+            - confidence: Mean word confidence (0-100) of the extracted text
+            - cascade_stage: The cascade stage that produced the text ("first_pass" when no escalation was needed)
+            - reject_reason: "blank" or "non_text" when the box was rejected before OCR (see utils/box_filter.py), else None
+            - shared_result: True when the detection is a copy of the OCR of an overlapping duplicate box
+              (shared_from then holds that box's index, see utils/box_consolidate.py)
+            - lines: Only for boxes split into lines, when OCR_LINE_BOXES is on; one
+              {box_coordinates, extracted_text, confidence} per line, in reading order and original image space
+    '''
+    detection = {
+        "box_coordinates": list(clamped),
+        "extracted_text": text,
+        CROP_KEY: result["preprocessed"],
+        "preprocess_profile": result["profile"],
+        "confidence": round(float(result["confidence"]), 2),
+        "cascade_stage": result["stage"],
+        "reject_reason": result.get("reject_reason"),
+        "shared_result": False
+    }
+    if OCR_LINE_BOXES and result.get("lines"):
+        detection["lines"] = [
+            {"box_coordinates": line_to_original(line, result["preprocessed"].size, clamped),
+             "extracted_text": line_text, "confidence": round(float(line_confidence), 2)}
+            for line, line_text, line_confidence in result["lines"]
+        ]
+    return detection
+
+def rejected_detection(clamped, reason, profile):
+    # A box rejected by the blank / non-text filter: no OCR ran, so no text, crop or cascade stage
+    return package_detection(clamped, {"raw_text": "", "confidence": 0.0, "stage": None, "profile": profile,
+                                       "preprocessed": None, "reject_reason": reason})
+
+def count_rejected(detections):
+    return sum(1 for d in detections if d is not None and d.get("reject_reason"))
+
+'''OCR for a single User-defined Box
+    - Returns the detection dictionary, or None when the box is skipped
+'''
+def ocr_box(page, idx, box, profile=None, origin=(0, 0), factor=1, size=None):
+    profile = resolve_profile(profile)
+    prepared = prepare_box(page, idx, box, profile, origin, factor, size)
+    if prepared is None:
+        return None
+    clamped, preprocessed, gray_crop, reason = prepared
+    if reason is not None:
+        return rejected_detection(clamped, reason, profile)
+    with timed("ocr"):
+        return package_detection(clamped, recognize_box(idx, preprocessed, gray_crop, profile))
+
+def ocr_box_with_timings(page, idx, box, **kwargs):
+    # Process-pool entry point: the worker's stage timings travel back with the detection
+    with capture_timings() as timings:
+        detection = ocr_box(page, idx, box, **kwargs)
+    if detection is not None:
+        detection[TIMINGS_KEY] = timings
+    return detection
+
+'''Cropping and preprocessing all User-defined Boxes of a page at once
+    - page is a DecodedPage (utils/image_decode.py); boxes are clamped against the original image size
+    - items is a list of (box index, box); boxes are clamped first, then preprocessed together at page level (see utils/page_preprocess.py),
+    so overlapping regions are denoised only once and the crops never go through PIL one by one
+    - Blank and non-text boxes are rejected first, in one vectorised pass over all crops (see utils/box_filter.py)
+    - Every crop is resampled so its text height is near OCR_TEXT_HEIGHT_TARGET before thresholding (see utils/text_scale.py)
+    - Returns (prepared, rejected):
+        - prepared: list of (box index, clamped box, preprocessed crop, grayscale crop) for the boxes to OCR;
+        the clamped box is in original image space, the crops are at the normalized scale
+        - rejected: list of (box index, clamped box, reject reason)
+'''
+def prepare_boxes(page, items, scope=None, profile=None):
+    gray = page.gray
+    with timed("crop"):
+        img_width, img_height = page.size
+        clamped_boxes = []
+        for idx, box in items:
+            clamped = clamp_box(idx, box, img_width, img_height)
+            if clamped is not None:
+                clamped_boxes.append((idx, clamped, page.to_local(clamped)))
+
+        reasons = reject_reasons([gray[y1:y2, x1:x2] for _, _, (x1, y1, x2, y2) in clamped_boxes])
+        rejected = [(idx, clamped, reason) for (idx, clamped, _), reason in zip(clamped_boxes, reasons) if reason is not None]
+        clamped_boxes = [item for item, reason in zip(clamped_boxes, reasons) if reason is None]
+        if rejected:
+            logger.debug("Boxes rejected before OCR", extra=fields(
+                boxes={idx + 1: reason for idx, _, reason in rejected}))
+
+        # Text height normalization: each crop is resampled towards OCR_TEXT_HEIGHT_TARGET before thresholding
+        scales = [text_scale(gray[y1:y2, x1:x2]) for _, _, (x1, y1, x2, y2) in clamped_boxes]
+
+    with timed("preprocess"):
+        preprocessed = preprocess_boxes(gray, [local for _, _, local in clamped_boxes], scope, profile, scales)
+        prepared = [
+            (idx, clamped, crop, rescale(gray[y1:y2, x1:x2], scale))
+            for (idx, clamped, (x1, y1, x2, y2)), crop, scale in zip(clamped_boxes, preprocessed, scales)
+        ]
+    logger.debug("Boxes preprocessed", extra=fields(
+        boxes=len(prepared), scope=scope or OCR_PREPROCESS_SCOPE, profile=profile,
+        resampled=sum(scale != 1.0 for scale in scales), text_height=OCR_TEXT_HEIGHT_TARGET))
+    return prepared, rejected
+
+def recognize_prepared(prepared_box, profile):
+    # prepared_box is one (idx, clamped, preprocessed crop, gray crop) entry of prepare_boxes
+    idx, clamped, preprocessed, gray_crop = prepared_box
+    with timed("ocr"):
+        return package_detection(clamped, recognize_box(idx, preprocessed, gray_crop, profile))
+
+'''Stitched-page OCR for many small boxes
+    - All preprocessed crops are stacked into synthetic pages and recognised in one Tesseract call
+    per page (see utils/stitched_ocr.py)
+    - Boxes whose text lines can't be mapped back unambiguously are OCR'd one by one as usual;
+    mapped boxes still go through the confidence cascade
+    - Returns one detection per entry of prepared, in the same order
+'''
+def ocr_boxes_stitched(prepared, profile):
+    results = []
+    stitched = recognize_stitched([preprocessed for _, _, preprocessed, _ in prepared], lang="khm")
+    fallbacks = 0
+    for (idx, clamped, preprocessed, gray_crop), mapped in zip(prepared, stitched):
+        first = None
+        if mapped is None:
+            fallbacks += 1
+            logger.debug("Box ambiguous on stitched page - falling back to per-box OCR", extra=fields(box=idx + 1))
+        else:
+            raw_text, confidence = mapped
+            first = {"raw_text": raw_text, "confidence": confidence, "stage": FIRST_PASS_STAGE,
+                     "profile": profile, "preprocessed": preprocessed}
+        results.append(package_detection(clamped, recognize_box(idx, preprocessed, gray_crop, profile, first)))
+
+    logger.info("Stitched page recognised", extra=fields(mapped=len(prepared) - fallbacks, boxes=len(prepared), fallbacks=fallbacks))
+    return results
+
+'''Processing the User-defined Boxes of one or more images together
+    - pages is a list of (image_bytes, boxes)
+    - execution_mode (default: OCR_EXECUTION_MODE):
+        - "serial"   : boxes one after another in the calling thread, or spread over the shared
+          thread pool (utils/parallel_ocr.get_box_executor) when executor is given
+        - "process"  : boxes of all pages fanned out over the process pool in utils/parallel_ocr.py
+          (each worker preprocesses its own crop, i.e. always the "box" preprocessing scope)
+        - "stitched" : boxes of all pages recognised together on synthetic pages, per-box OCR only where ambiguous
+    - profile: preprocessing profile "fast", "balanced" or "accurate" (default: OCR_PREPROCESS_PROFILE)
+    - crop_format: how crops are returned, "png", "png1", "webp", "ref" or "none" (default: OCR_CROP_FORMAT)
+    - Yields (page index, box index, detection) as soon as each box is done, so not necessarily
+    in order; detection is None for a skipped box
+'''
+def iter_batch_boxes(pages, execution_mode=None, profile=None, crop_format=None, executor=None):
+    execution_mode = execution_mode or OCR_EXECUTION_MODE
+    profile = resolve_profile(profile)
+    crop_format = resolve_crop_format(crop_format)
+    total_boxes = sum(len(boxes) for _, boxes in pages)
+    logger.info("Starting text extraction", extra=fields(
+        boxes=total_boxes, images=len(pages), mode=execution_mode, profile=profile))
+
+    cache = get_ocr_cache()
+    settings = {
+        "lang": "khm",
+        "profile": profile,
+        "scope": "box" if execution_mode == "process" else OCR_PREPROCESS_SCOPE,
+        "mode": execution_mode,
+        "cascade": OCR_CASCADE,
+        "min_confidence": OCR_CASCADE_MIN_CONFIDENCE,
+        "decode": [OCR_DECODE_MODE, OCR_DECODE_MIN_BOX_HEIGHT],
+        "text_height": [OCR_TEXT_HEIGHT_TARGET, OCR_TEXT_HEIGHT_TOLERANCE],
+        "box_filter": filter_settings(),
+        "line_split": [OCR_LINE_SPLIT, OCR_LINE_SPLIT_MIN_LINES, OCR_LINE_BOXES],
+    }
+    summary = {"processed": 0, "with_text": 0, "rejected": 0, "shared": 0}
+    cache_keys = {}  # (page index, box index) -> cache key
+    shared = {}  # (page index, representative box index) -> [(duplicate box index, clamped box)]
+
+    def count(detection, source):
+        summary["processed"] += 1
+        summary["with_text"] += bool(detection["extracted_text"])
+        reason = detection.get("reject_reason")
+        if reason:
+            summary["rejected"] += 1
+            BOXES_SKIPPED.inc(reason=reason)
+        else:
+            BOXES_PROCESSED.inc(source=source)
+
+    def finalize(detection):
+        with timed("encode"):
+            return finalize_crop(detection, crop_format)
+
+    def emit(page_index, idx, detection, source="ocr"):
+        # Yields the detection of the box, then a copy for every duplicate consolidated into it
+        duplicates = shared.pop((page_index, idx), [])
+        if detection is None:
+            for box_idx in [idx] + [dup_idx for dup_idx, _ in duplicates]:
+                BOXES_SKIPPED.inc(reason="invalid")
+                yield page_index, box_idx, None
+            return
+        replay_timings(detection.pop(TIMINGS_KEY, None))
+        cache_key = cache_keys.pop((page_index, idx), None)
+        if cache_key is not None:
+            cache.put(cache_key, detection)
+        count(detection, source)
+        yield page_index, idx, finalize(detection)
+        for dup_idx, dup_clamped in duplicates:
+            copy = dict(detection, box_coordinates=list(dup_clamped), shared_result=True, shared_from=idx)
+            count(copy, "shared")
+            summary["shared"] += 1
+            yield page_index, dup_idx, finalize(copy)
+
+    # ---- OCR result cache: same image content + same clamped box + same settings => same detection ----
+    # Image.open only reads the header here; pixels are decoded below, and only if some box isn't cached
+    pending_pages = []  # (page index, PIL image, [(box index, box)])
+    for page_index, (image_bytes, boxes) in enumerate(pages):
+        pil_image = open_page(image_bytes)
+        img_width, img_height = pil_image.size
+        pending = list(enumerate(boxes))
+        if cache is not None:
+            img_hash = image_hash(image_bytes)
+            pending = []
+            for idx, box in enumerate(boxes):
+                clamped = clamp_box(idx, box, img_width, img_height, verbose=False)
+                cached = None
+                if clamped is not None:
+                    key = cache.key(img_hash, clamped, settings)
+                    cached = cache.get(key)
+                    if cached is None:
+                        cache_keys[(page_index, idx)] = key
+                if cached is None:
+                    pending.append((idx, box))
+                else:
+                    yield from emit(page_index, idx, cached, source="cache")
+        if pending:
+            pending_pages.append((page_index, pil_image, pending))
+
+    if cache is not None:
+        to_process = sum(len(pending) for _, _, pending in pending_pages)
+        logger.info("OCR cache checked", extra=fields(hits=total_boxes - to_process, to_process=to_process))
+
+    # ---- Consolidation: duplicate / redrawn boxes are OCR'd once, the result is copied to the others ----
+    # ---- Decode: only now are pixels read, straight to grayscale and only around the boxes ----
+    decoded_pages = []  # (page index, DecodedPage, [(box index, box)])
+    for page_index, pil_image, pending in pending_pages:
+        clamped_items = [(idx, clamped) for idx, clamped in ((idx, clamp_box(idx, box, *pil_image.size, verbose=False))
+                                                             for idx, box in pending) if clamped is not None]
+        duplicates = consolidate_boxes(clamped_items)
+        if duplicates:
+            for dup_idx, clamped in clamped_items:
+                if dup_idx in duplicates:
+                    shared.setdefault((page_index, duplicates[dup_idx]), []).append((dup_idx, clamped))
+                    cache_keys.pop((page_index, dup_idx), None)
+            pending = [(idx, box) for idx, box in pending if idx not in duplicates]
+            logger.info("Duplicate boxes consolidated", extra=fields(
+                image=page_index + 1, duplicates=len(duplicates), representatives=len(set(duplicates.values()))))
+        rects = [clamped for idx, clamped in clamped_items if idx not in duplicates]
+        with timed("decode"):
+            page = decode_page(pil_image, rects)
+        logger.debug("Image decoded", extra=fields(
+            image=page_index + 1, size=pil_image.size, kept=(page.gray.shape[1], page.gray.shape[0]),
+            origin=page.origin, factor=page.factor, nbytes=page.nbytes))
+        decoded_pages.append((page_index, page, pending))
+
+    if execution_mode == "process" and sum(len(pending) for _, _, pending in decoded_pages) > 1:
+        jobs = [
+            (functools.partial(ocr_box_with_timings, profile=profile, origin=page.origin, factor=page.factor, size=page.size),
+             page.gray, pending)
+            for _, page, pending in decoded_pages
+        ]
+        for job_index, position, detection in iter_pages_in_process_pool(jobs):
+            page_index, _, pending = decoded_pages[job_index]
+            yield from emit(page_index, pending[position][0], detection)
+    elif decoded_pages:
+        prepared = []  # (page index, (box index, clamped, crop, gray crop))
+        for page_index, page, pending in decoded_pages:
+            page_prepared, page_rejected = prepare_boxes(page, pending, profile=profile)
+            for idx, clamped, reason in page_rejected:
+                yield from emit(page_index, idx, rejected_detection(clamped, reason, profile))
+            handled = {idx for idx, _, _, _ in page_prepared} | {idx for idx, _, _ in page_rejected}
+            for idx, _ in pending:
+                if idx not in handled:
+                    yield from emit(page_index, idx, None)
+            prepared.extend((page_index, item) for item in page_prepared)
+
+        if execution_mode == "stitched":
+            with timed("ocr"):
+                stitched = ocr_boxes_stitched([item for _, item in prepared], profile)
+            for (page_index, item), detection in zip(prepared, stitched):
+                yield from emit(page_index, item[0], detection)
+        elif executor is not None:
+            futures = {executor.submit(recognize_prepared, item, profile): (page_index, item[0]) for page_index, item in prepared}
+            for future in as_completed(futures):
+                page_index, idx = futures[future]
+                yield from emit(page_index, idx, future.result())
+        else:
+            for page_index, item in prepared:
+                yield from emit(page_index, item[0], recognize_prepared(item, profile))
+
+    logger.info("Extraction complete", extra=fields(
+        processed=summary["processed"], boxes=total_boxes, with_text=summary["with_text"],
+        empty=summary["processed"] - summary["with_text"], rejected=summary["rejected"], shared=summary["shared"]))
+    if execution_mode != "process" and logger.isEnabledFor(logging.DEBUG):
+        engine_stats = get_engine_pool().stats()
+        logger.debug("Engine pool", extra=fields(
+            warm_hits=engine_stats["warm_hits"], total_calls=engine_stats["total_calls"],
+            backend=engine_stats["backend"], subprocess_calls=engine_stats["subprocess_calls"]))
+    if cache is not None and logger.isEnabledFor(logging.DEBUG):
+        cache_stats = cache.stats()
+        logger.debug("OCR cache", extra=fields(
+            hit_ratio=cache_stats["hit_ratio"], memory_entries=cache_stats["memory_entries"], evictions=cache_stats["evictions"]))
+
 '''Processing User-defined Boxes : Align with Segmentation step in OCR Pipeline
     - Instead of sending whole image to OCR engine, we will crop each box
     and send to OCR engine based on the users drawing text box region on image
     - This helps to improve accuracy, reduce noise from irrelevant areas, and handle complex layouts like tables signs,..
+    - Single-image case of iter_batch_boxes (same execution_mode / profile / crop_format)
+    - Yields (box index, detection) as soon as each box is done, so not necessarily in box order;
+    detection is None for a skipped box
 '''
-def process_user_boxes(image_bytes, boxes):
-    print(f"\n[OCR DEBUG] Starting text extraction...")
-    print(f"[OCR DEBUG] Number of boxes to process: {len(boxes)}")
-    
-    pil_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    print(f"[OCR DEBUG] Image loaded - Size: {pil_image.size}, Mode: {pil_image.mode}")
-    
-    detections = []
-
-    for idx, box in enumerate(boxes):
-        print(f"\n[OCR DEBUG] Processing box {idx + 1}/{len(boxes)}: {box}")
-        if not (isinstance(box, list) and len(box) == 4):
-            print(f"[OCR DEBUG] ✗ Box {idx + 1} skipped - Invalid format (not a list of 4 values)")
-            continue
-        
-        # Ensure coordinates are valid integers
-        try:
-            x1, y1, x2, y2 = map(int, box)
-            print(f"[OCR DEBUG] Box coordinates: x1={x1}, y1={y1}, x2={x2}, y2={y2}")
-            
-            # Validate coordinates are within image bounds
-            img_width, img_height = pil_image.size
-            x1 = max(0, min(x1, img_width))
-            y1 = max(0, min(y1, img_height))
-            x2 = max(0, min(x2, img_width))
-            y2 = max(0, min(y2, img_height))
-            
-            # Ensure box has valid dimensions
-            if x2 <= x1 or y2 <= y1:
-                print(f"[OCR DEBUG] ✗ Box {idx + 1} skipped - Invalid dimensions (width or height <= 0)")
-                continue
-                
-        except (ValueError, TypeError) as e:
-            print(f"[OCR DEBUG] ✗ Box {idx + 1} skipped - Coordinate conversion error: {e}")
-            continue
-        
-        cropped = pil_image.crop((x1, y1, x2, y2))
-        cropped_size = cropped.size
-        print(f"[OCR DEBUG] Cropped region size: {cropped_size}")
-        
-        preprocessed = preprocess_for_ocr(cropped)
-        print(f"[OCR DEBUG] Image preprocessed successfully")
-        
-        try:
-            # Text Recognition and Extraction Stages using Tesseract OCR with Khmer language
-            # Using regex to clean up whitespace characters after passing the cleaned cropping image into Tesseract
-            raw_text = pytesseract.image_to_string(preprocessed, lang="khm")
-            text = re.sub(r"\s+", " ", raw_text).strip()
-            print(f"[OCR DEBUG] ✓ Text extracted: '{text}' (length: {len(text)})")
-        except Exception as e:
-            print(f"[OCR DEBUG] ✗ OCR Error for box {idx + 1}: {str(e)}")
-            text = ""
-
-        buffer = io.BytesIO()
-        preprocessed.save(buffer, format="PNG")
-        img_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-        ''' Post-Processing & Output Packaging steps of OCR pipeline 
-            - Each detected text box is represented as a dictionary with:
-                - box_coordinates: The coordinates of the bounding box
-                - extracted_text: The text extracted from the cropped image
-                - cropped_image_base64: The base64-encoded string of the cropped image
-        '''
-        detections.append({
-            "box_coordinates": [x1, y1, x2, y2],
-            "extracted_text": text,
-            "cropped_image_base64": img_base64
-        })
-    
-    print(f"\n[OCR DEBUG] ===== EXTRACTION COMPLETE =====")
-    print(f"[OCR DEBUG] Total boxes processed: {len(detections)}/{len(boxes)}")
-    print(f"[OCR DEBUG] Boxes with text: {sum(1 for d in detections if d['extracted_text'])}")
-    print(f"[OCR DEBUG] Empty results: {sum(1 for d in detections if not d['extracted_text'])}")
-    
-    return detections
+def iter_user_boxes(image_bytes, boxes, execution_mode=None, profile=None, crop_format=None):
+    for _, idx, detection in iter_batch_boxes([(image_bytes, boxes)], execution_mode, profile, crop_format):
+        yield idx, detection
+
+'''Same as iter_user_boxes, but waits for all boxes and returns the detections in the original box order'''
+def process_user_boxes(image_bytes, boxes, execution_mode=None, profile=None, crop_format=None):
+    results = [None] * len(boxes)
+    for idx, detection in iter_user_boxes(image_bytes, boxes, execution_mode, profile, crop_format):
+        results[idx] = detection
+
+    # results are in the original box order; skipped boxes come back as None
+    return [d for d in results if d is not None]
 
+'''Batch version of process_user_boxes: one list of detections (in box order) per page'''
+def process_batch_boxes(pages, execution_mode=None, profile=None, crop_format=None, executor=None):
+    results = [[None] * len(boxes) for _, boxes in pages]
+    for page_index, idx, detection in iter_batch_boxes(pages, execution_mode, profile, crop_format, executor):
+        results[page_index][idx] = detection
+    return [[d for d in page_results if d is not None] for page_results in results]
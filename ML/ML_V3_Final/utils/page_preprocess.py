@@ -0,0 +1,127 @@
+import os
+import numpy as np, cv2
+from PIL import Image
+from utils.text_scale import rescale
+
+
+# ---- Page-level Preprocessing Configuration ----
+# OCR_PREPROCESS_SCOPE : "page" denoises the union of the box regions once and thresholds each box locally,
+#                        "box" is the compatibility mode: every crop is denoised on its own exactly like
+#                        preprocess_for_ocr, giving pixel-identical output to the per-crop pipeline
+OCR_PREPROCESS_SCOPE = os.getenv("OCR_PREPROCESS_SCOPE", "page").lower()
+# OCR_PREPROCESS_PROFILE : server default preprocessing profile (see PREPROCESS_PROFILES), overridable per request
+OCR_PREPROCESS_PROFILE = os.getenv("OCR_PREPROCESS_PROFILE", "balanced").lower()
+
+
+def page_to_gray(pil_image):
+    # Grayscale conversion is per pixel, so converting the whole page once gives exactly the
+    # same values as converting every crop separately
+    return np.asarray(pil_image.convert("L"))
+
+'''Preprocessing Profiles (quality tiers)
+    - fast     : grayscale + Otsu only, for clean digital scans
+    - balanced : cheap 3x3 median filter against salt-and-pepper noise before Otsu
+    - accurate : Non-local Means Denoising, the original (and by far the slowest) pipeline
+'''
+PREPROCESS_PROFILES = {
+    "fast": None,
+    "balanced": lambda gray: cv2.medianBlur(gray, 3),
+    "accurate": lambda gray: cv2.fastNlMeansDenoising(gray, h=10, templateWindowSize=7, searchWindowSize=21),
+}
+
+def resolve_profile(profile=None):
+    profile = (profile or OCR_PREPROCESS_PROFILE).lower()
+    if profile not in PREPROCESS_PROFILES:
+        raise ValueError(f"Unknown preprocessing profile {profile!r}, expected one of {sorted(PREPROCESS_PROFILES)}")
+    return profile
+
+def denoise(gray, profile="accurate"):
+    denoise_fn = PREPROCESS_PROFILES[profile]
+    return gray if denoise_fn is None else denoise_fn(gray)
+
+'''Union of the box regions
+    - Overlapping or touching boxes are merged into one region so their shared pixels are only denoised once
+    - Returns a list of (region rect, indices of the boxes it covers)
+'''
+def merge_regions(rects):
+    regions = [([x1, y1, x2, y2], [i]) for i, (x1, y1, x2, y2) in enumerate(rects)]
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        for rect, members in regions:
+            for other in out:
+                o = other[0]
+                if rect[0] <= o[2] and o[0] <= rect[2] and rect[1] <= o[3] and o[1] <= rect[3]:
+                    o[:] = [min(o[0], rect[0]), min(o[1], rect[1]), max(o[2], rect[2]), max(o[3], rect[3])]
+                    other[1].extend(members)
+                    merged = True
+                    break
+            else:
+                out.append((rect, members))
+        regions = out
+    return regions
+
+'''Otsu thresholds for many crops at once
+    - cv2.calcHist builds the 256-bin histogram of each crop straight from its uint8 pixels (no
+    widened copy of the crops), then the between-class variance is maximised for all crops together
+    - Same criterion as cv2.THRESH_OTSU; returns one threshold per crop
+    - hist: histograms already built by crop_histograms, to avoid building them twice
+'''
+def crop_histograms(crops):
+    hist = np.zeros((len(crops), 256), dtype=np.float64)
+    for i, crop in enumerate(crops):
+        if crop.size:
+            hist[i] = cv2.calcHist([crop], [0], None, [256], [0, 256]).ravel()
+    return hist
+
+def otsu_thresholds(crops, hist=None):
+    hist = crop_histograms(crops) if hist is None else hist
+    p = hist / hist.sum(axis=1, keepdims=True)
+    levels = np.arange(256, dtype=np.float64)
+    q1 = np.cumsum(p, axis=1)
+    m1 = np.cumsum(p * levels, axis=1)
+    mu = m1[:, -1:]
+    q2 = 1.0 - q1
+
+    eps = np.finfo(np.float32).eps
+    valid = (np.minimum(q1, q2) >= eps) & (np.maximum(q1, q2) <= 1.0 - eps)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma = (mu * q1 - m1) ** 2 / (q1 * q2)
+    sigma = np.where(valid, sigma, 0.0)
+    return sigma.argmax(axis=1)
+
+'''Page-level preprocessing for all boxes of a request
+    - gray is the whole page as a 2-D uint8 array, rects the clamped (x1, y1, x2, y2) boxes
+    - scope "page": each merged region is denoised once; every crop is an array view into its
+    region, then thresholded with its own Otsu threshold (vectorised across boxes)
+    - scope "box": per-crop denoise + cv2 Otsu, pixel-identical to preprocess_for_ocr with the same profile
+    - profile selects the denoising step (see PREPROCESS_PROFILES)
+    - scales: optional resample factor per rect (see utils/text_scale.py), applied before thresholding;
+    in scope "box" the crop is resampled before denoising, in scope "page" after the shared region denoise
+    - Returns one binary PIL image per rect, in rect order
+'''
+def preprocess_boxes(gray, rects, scope=None, profile=None, scales=None):
+    scope = scope or OCR_PREPROCESS_SCOPE
+    profile = resolve_profile(profile)
+    scales = scales or [1.0] * len(rects)
+    if not rects:
+        return []
+
+    if scope == "box":
+        results = []
+        for (x1, y1, x2, y2), scale in zip(rects, scales):
+            crop = rescale(gray[y1:y2, x1:x2], scale)
+            _, thresh = cv2.threshold(denoise(crop, profile), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            results.append(Image.fromarray(thresh))
+        return results
+
+    views = [None] * len(rects)
+    for (rx1, ry1, rx2, ry2), members in merge_regions(rects):
+        region = denoise(gray[ry1:ry2, rx1:rx2], profile)
+        for i in members:
+            x1, y1, x2, y2 = rects[i]
+            views[i] = rescale(region[y1 - ry1:y2 - ry1, x1 - rx1:x2 - rx1], scales[i])
+
+    thresholds = otsu_thresholds(views)
+    return [Image.fromarray(np.where(view > t, 255, 0).astype(np.uint8)) for view, t in zip(views, thresholds)]
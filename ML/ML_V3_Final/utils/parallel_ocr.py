@@ -0,0 +1,213 @@
+import os, threading, multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from utils.metrics import record_error, EXECUTOR_QUEUE_DEPTH, EXECUTOR_THREADS
+from utils.log import get_logger, fields
+
+logger = get_logger("parallel")
+
+
+# ---- Parallel Execution Configuration ----
+# OCR_EXECUTION_MODE    : "serial" (one box after another) or "process" (fan boxes out over worker processes)
+# OCR_PROCESS_WORKERS   : number of worker processes in the pool
+# OCR_OMP_THREAD_LIMIT  : OMP_THREAD_LIMIT set inside each worker, so N workers x Tesseract's
+#                         own OpenMP threads don't oversubscribe the machine
+OCR_EXECUTION_MODE = os.getenv("OCR_EXECUTION_MODE", "serial").lower()
+OCR_PROCESS_WORKERS = int(os.getenv("OCR_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+OCR_OMP_THREAD_LIMIT = os.getenv("OCR_OMP_THREAD_LIMIT", "1")
+# OCR_BATCH_THREADS     : threads shared by all images of a batch request in "serial" mode
+OCR_BATCH_THREADS = int(os.getenv("OCR_BATCH_THREADS", str(os.cpu_count() or 1)))
+# OCR_LINE_THREADS      : threads recognising the lines of split paragraph boxes (see utils/line_split.py)
+OCR_LINE_THREADS = int(os.getenv("OCR_LINE_THREADS", str(os.cpu_count() or 1)))
+# OCR_WORKER_LINE_THREADS : the same inside each worker process; the workers already run one box
+#                         per CPU, so more than 1 multiplies the Tesseract calls running at once
+OCR_WORKER_LINE_THREADS = int(os.getenv("OCR_WORKER_LINE_THREADS", "1"))
+# OCR_REQUEST_THREADS   : threads running the OCR of /images/ and /images/stream requests
+#                         (default: the asyncio default executor size)
+OCR_REQUEST_THREADS = int(os.getenv("OCR_REQUEST_THREADS", str(min(32, (os.cpu_count() or 1) + 4))))
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def _init_worker(omp_thread_limit, line_threads):
+    # Must be set before Tesseract is loaded in this process
+    os.environ["OMP_THREAD_LIMIT"] = str(omp_thread_limit)
+    global OCR_LINE_THREADS
+    OCR_LINE_THREADS = line_threads
+
+def get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Spawned, not forked: a forked worker would inherit the server's thread pools and
+            # locks without the threads behind them, and hang on the first line-split box
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max(1, OCR_PROCESS_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(OCR_OMP_THREAD_LIMIT, max(1, OCR_WORKER_LINE_THREADS)),
+            )
+            logger.info("Process pool started", extra=fields(workers=OCR_PROCESS_WORKERS, omp_thread_limit=OCR_OMP_THREAD_LIMIT,
+                                                             line_threads=OCR_WORKER_LINE_THREADS))
+        return _process_pool
+
+def shutdown_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=True, cancel_futures=True)
+            _process_pool = None
+
+def _discard_broken_pool(pool):
+    # A dead worker (killed, out of memory) breaks the whole pool for good: drop it so the
+    # next request starts a fresh one instead of failing on it forever
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    logger.error("Process pool broken, a new one will be started")
+
+_box_executor = None
+
+def get_box_executor():
+    # One thread pool for the boxes of every image in a batch request (the engine pool
+    # in utils/tess_engine.py bounds how many of them actually run Tesseract at once)
+    global _box_executor
+    with _process_pool_lock:
+        if _box_executor is None:
+            _box_executor = ThreadPoolExecutor(max_workers=max(1, OCR_BATCH_THREADS), thread_name_prefix="ocr-box")
+        return _box_executor
+
+def shutdown_box_executor():
+    global _box_executor
+    with _process_pool_lock:
+        if _box_executor is not None:
+            _box_executor.shutdown(wait=True, cancel_futures=True)
+            _box_executor = None
+
+_line_executor = None
+
+def get_line_executor():
+    # Separate from the box executor: a box task waits for its lines, so sharing one pool
+    # could leave every thread waiting on line tasks that never get a thread
+    global _line_executor
+    with _process_pool_lock:
+        if _line_executor is None:
+            _line_executor = ThreadPoolExecutor(max_workers=max(1, OCR_LINE_THREADS), thread_name_prefix="ocr-line")
+        return _line_executor
+
+def shutdown_line_executor():
+    global _line_executor
+    with _process_pool_lock:
+        if _line_executor is not None:
+            _line_executor.shutdown(wait=True, cancel_futures=True)
+            _line_executor = None
+
+_request_executor = None
+
+def get_request_executor():
+    # Runs the OCR of single-image requests off the event loop; its own pool rather than the
+    # loop's default executor so its queue can be observed (see executor_stats)
+    global _request_executor
+    with _process_pool_lock:
+        if _request_executor is None:
+            _request_executor = ThreadPoolExecutor(max_workers=max(1, OCR_REQUEST_THREADS), thread_name_prefix="ocr-request")
+        return _request_executor
+
+def shutdown_request_executor():
+    global _request_executor
+    with _process_pool_lock:
+        if _request_executor is not None:
+            _request_executor.shutdown(wait=True, cancel_futures=True)
+            _request_executor = None
+
+'''Executor saturation
+    - queued: tasks submitted but not started, i.e. waiting for a free thread. A queue that keeps
+    growing under load means requests arrive faster than the threads (or the engine pool behind
+    them) can serve them
+    - Reported by GET /ocr/stats and as the ocr_executor_* gauges of GET /metrics
+    - ThreadPoolExecutor has no public counters, so this reads its _threads and _work_queue
+    (CPython implementation details, present since 3.2); the numbers are for monitoring only
+'''
+_EXECUTORS = {
+    "request": lambda: _request_executor,
+    "box": lambda: _box_executor,
+    "line": lambda: _line_executor,
+}
+
+def _executor_state(executor):
+    if executor is None:
+        return {"max_workers": 0, "threads": 0, "queued": 0}
+    return {"max_workers": executor._max_workers, "threads": len(executor._threads), "queued": executor._work_queue.qsize()}
+
+def executor_stats():
+    return {name: _executor_state(get()) for name, get in _EXECUTORS.items()}
+
+for _name, _get in _EXECUTORS.items():
+    EXECUTOR_QUEUE_DEPTH.set_function(lambda get=_get: _executor_state(get())["queued"], executor=_name)
+    EXECUTOR_THREADS.set_function(lambda get=_get: _executor_state(get())["threads"], executor=_name)
+
+
+'''Worker side of a box task
+    - Attaches to the page buffer by name and wraps it in a read-only NumPy view,
+    so the page itself is never pickled; only the box and the buffer name cross the process boundary
+'''
+def _run_box_in_worker(box_fn, shm_name, shape, dtype, idx, box):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    page = None
+    try:
+        page = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        page.flags.writeable = False
+        return box_fn(page, idx, box)
+    finally:
+        del page
+        shm.close()
+
+'''Fan the boxes of one or more pages out over the process pool
+    - jobs is a list of (box_fn, page, items):
+        - box_fn(page, idx, box) is the per-box OCR function; it must be importable at module level
+        (or a functools.partial of such a function) so it can be pickled by reference
+        - page is the decoded page as a NumPy array
+        - items is a list of (box index, box); the index is passed through to box_fn
+    - Every page is copied once into shared memory, and the boxes of all pages are
+    submitted together so the workers never wait for the next page
+    - Yields (job index, position in items, result) as the workers finish, i.e. not in box order;
+    result is None for a skipped box
+    - An exception raised by box_fn, or BrokenProcessPool when a worker dies, is re-raised like
+    in the serial path, so the request fails instead of returning (and caching) empty results
+'''
+def iter_pages_in_process_pool(jobs):
+    segments = []
+    futures = {}
+    try:
+        pool = get_process_pool()
+        for job_index, (box_fn, page, items) in enumerate(jobs):
+            page = np.ascontiguousarray(page)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, page.nbytes))
+            segments.append(shm)
+            np.ndarray(page.shape, dtype=page.dtype, buffer=shm.buf)[...] = page
+            for position, (idx, box) in enumerate(items):
+                future = pool.submit(_run_box_in_worker, box_fn, shm.name, page.shape, page.dtype.str, idx, box)
+                futures[future] = (job_index, position)
+
+        for future in as_completed(futures):
+            job_index, position = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error("Box failed in worker", extra=fields(box=jobs[job_index][2][position][0] + 1, error=str(e)))
+                record_error("worker")
+                if isinstance(e, BrokenProcessPool):
+                    _discard_broken_pool(pool)
+                raise
+            yield job_index, position, result
+    finally:
+        for future in futures:
+            future.cancel()
+        for shm in segments:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,98 @@
+import os
+from PIL import Image
+from utils.tess_engine import get_engine_pool
+from utils.metrics import record_error
+from utils.log import get_logger, fields
+
+logger = get_logger("stitch")
+
+
+# ---- Stitched Page Configuration ----
+# STITCH_SEPARATOR_HEIGHT : white band (px) inserted between two crops on the synthetic page
+# STITCH_MARGIN           : white border (px) around every crop
+# STITCH_MAX_PAGE_HEIGHT  : a synthetic page is split before it reaches this height (Tesseract limit is 32767)
+STITCH_SEPARATOR_HEIGHT = int(os.getenv("STITCH_SEPARATOR_HEIGHT", "40"))
+STITCH_MARGIN = int(os.getenv("STITCH_MARGIN", "10"))
+STITCH_MAX_PAGE_HEIGHT = int(os.getenv("STITCH_MAX_PAGE_HEIGHT", "30000"))
+
+# Page segmentation mode 4: a single column of text of variable sizes, which is what the stacked crops are
+STITCH_PSM = 4
+
+
+'''Stacking preprocessed crops into synthetic pages
+    - Every crop is pasted at the left margin, one under another, separated by a white band
+    - Returns a list of (page, bands) where bands[i] = (crop_index, top, bottom) in page coordinates
+'''
+def stitch_crops(crops):
+    pages = []
+    current, bands, height = [], [], STITCH_SEPARATOR_HEIGHT
+
+    def flush():
+        if not current:
+            return
+        width = max(crop.width for _, crop in current) + 2 * STITCH_MARGIN
+        page = Image.new("L", (width, height), 255)
+        for (crop_index, crop), (_, top, _) in zip(current, bands):
+            page.paste(crop.convert("L"), (STITCH_MARGIN, top))
+        pages.append((page, list(bands)))
+
+    for crop_index, crop in enumerate(crops):
+        slot = crop.height + STITCH_SEPARATOR_HEIGHT
+        if current and height + slot > STITCH_MAX_PAGE_HEIGHT:
+            flush()
+            current, bands, height = [], [], STITCH_SEPARATOR_HEIGHT
+        current.append((crop_index, crop))
+        bands.append((crop_index, height, height + crop.height))
+        height += slot
+
+    flush()
+    return pages
+
+'''Mapping recognised lines back to their source crop
+    - A line belongs to a band when its bounding box lies inside the band (allowing half a
+    separator of slack for ascenders/descenders)
+    - A line that touches more than one band, or none, makes those bands ambiguous
+    - A band with no line at all is also ambiguous: it may be blank, or Tesseract may have
+    merged/dropped it, so per-box OCR decides
+'''
+def _assign_lines(lines, bands):
+    slack = STITCH_SEPARATOR_HEIGHT // 2
+    assigned = {crop_index: [] for crop_index, _, _ in bands}
+    ambiguous = set()
+
+    for line in lines:
+        _, y1, _, y2 = line["bbox"]
+        inside = [c for c, top, bottom in bands if y1 >= top - slack and y2 <= bottom + slack]
+        touching = [c for c, top, bottom in bands if y1 < bottom + slack and y2 > top - slack]
+        if len(inside) == 1 and len(touching) == 1:
+            assigned[inside[0]].append(line)
+        else:
+            ambiguous.update(touching)
+
+    texts = {}
+    for crop_index, crop_lines in assigned.items():
+        if crop_index in ambiguous or not crop_lines:
+            continue
+        crop_lines.sort(key=lambda line: (line["bbox"][1], line["bbox"][0]))
+        text = " ".join(line["text"] for line in crop_lines)
+        confidence = sum(float(line["conf"]) for line in crop_lines) / len(crop_lines)
+        texts[crop_index] = (text, confidence)
+    return texts
+
+'''Single-pass OCR for many small crops
+    - Recognises all crops with one Tesseract call per synthetic page instead of one per crop
+    - Returns a list aligned with crops: (raw text, mean line confidence), or None where the mapping is ambiguous
+    and the caller should fall back to per-box OCR
+'''
+def recognize_stitched(crops, lang="khm"):
+    results = [None] * len(crops)
+    for page, bands in stitch_crops(crops):
+        try:
+            lines = get_engine_pool().image_to_lines(page, lang=lang, psm=STITCH_PSM)
+        except Exception as e:
+            logger.error("Stitched page OCR failed", extra=fields(crops=len(bands), error=str(e)))
+            record_error("ocr")
+            continue
+        for crop_index, mapped in _assign_lines(lines, bands).items():
+            results[crop_index] = mapped
+    return results
@@ -0,0 +1,264 @@
+import os, threading, queue
+from contextlib import contextmanager
+import pytesseract
+from utils.log import get_logger, fields
+
+# tesserocr wraps the Tesseract C++ API in-process. It is optional: without it
+# we fall back to pytesseract, which forks a `tesseract` process per call.
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+logger = get_logger("engine")
+
+
+# ---- Engine Pool Configuration ----
+# OCR_ENGINE_POOL_SIZE : number of long-lived recognizer handles kept per language
+# OCR_ENGINE_BACKEND   : "auto" (tesserocr if available), "tesserocr" or "subprocess"
+OCR_ENGINE_POOL_SIZE = int(os.getenv("OCR_ENGINE_POOL_SIZE", str(os.cpu_count() or 1)))
+OCR_ENGINE_BACKEND = os.getenv("OCR_ENGINE_BACKEND", "auto").lower()
+
+# How often a caller waiting for a busy handle re-checks the pool, so it notices a creation
+# slot freed by a failed _new_handle instead of waiting for a handle that will never come
+CHECKOUT_RECHECK_SECONDS = 0.1
+
+
+'''Persistent Tesseract Engine Pool
+    - pytesseract.image_to_string starts a new tesseract process for every box, writes the
+    crop to a temp file and reloads the traineddata (khm) each time
+    - This pool keeps a fixed number of tesserocr handles with the language already loaded,
+    so a crop is handed over straight from memory
+    - When tesserocr is missing or a handle can't be created, calls go through the old
+    pytesseract subprocess path instead
+'''
+class TesseractEnginePool:
+    def __init__(self, size=OCR_ENGINE_POOL_SIZE, backend=OCR_ENGINE_BACKEND, tessdata_path=None):
+        self.size = max(1, int(size))
+        self.backend = backend
+        self.tessdata_path = tessdata_path or os.getenv("TESSDATA_PREFIX")
+        self._idle = {}       # lang -> queue.Queue of ready handles
+        self._created = {}    # lang -> number of live handles (idle or checked out)
+        self._ready = set()   # languages for which a handle was created at least once
+        self._broken = set()  # languages whose handles failed to initialise
+        self._lock = threading.Lock()
+        self._stats = {"warm_hits": 0, "cold_starts": 0, "subprocess_calls": 0, "engine_errors": 0}
+
+    def in_process_enabled(self, lang):
+        if self.backend == "subprocess" or tesserocr is None:
+            return False
+        return lang not in self._broken
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _new_handle(self, lang):
+        kwargs = {"lang": lang}
+        if self.tessdata_path:
+            kwargs["path"] = self.tessdata_path
+        return tesserocr.PyTessBaseAPI(**kwargs)
+
+    @contextmanager
+    def _checkout(self, lang):
+        # Take an idle handle, create one while under the pool size, otherwise wait
+        while True:
+            with self._lock:
+                if lang in self._broken:
+                    raise RuntimeError(f"No in-process engine for {lang!r}")
+                idle = self._idle.setdefault(lang, queue.Queue())
+                create = idle.empty() and self._created.get(lang, 0) < self.size
+                if create:
+                    self._created[lang] = self._created.get(lang, 0) + 1
+
+            if create:
+                try:
+                    handle = self._new_handle(lang)
+                except Exception:
+                    with self._lock:
+                        self._created[lang] -= 1
+                    raise
+                with self._lock:
+                    self._ready.add(lang)
+                self._count("cold_starts")
+                break
+            try:
+                handle = idle.get(timeout=CHECKOUT_RECHECK_SECONDS)
+            except queue.Empty:
+                continue
+            self._count("warm_hits")
+            break
+
+        try:
+            yield handle
+        except BaseException:
+            # The handle failed mid-call and its state is unknown: retire it rather than hand it
+            # to the next box; its slot is freed, so the next checkout creates a fresh one
+            self._retire(lang, handle)
+            raise
+        handle.Clear()
+        idle.put(handle)
+
+    def _retire(self, lang, handle):
+        try:
+            handle.End()
+        except Exception as e:
+            logger.warning("Engine handle did not shut down cleanly", extra=fields(lang=lang, error=str(e)))
+        with self._lock:
+            # close() may have emptied the pool meanwhile
+            self._created[lang] = max(0, self._created.get(lang, 0) - 1)
+
+    def _in_process_failed(self, lang, error):
+        logger.warning("In-process engine failed", extra=fields(lang=lang, error=str(error)))
+        self._count("engine_errors")
+        # A handle that can't even be created (e.g. missing traineddata) won't
+        # recover on retry, so stop trying for this language
+        with self._lock:
+            if lang not in self._ready:
+                self._broken.add(lang)
+
+    def _recognize_in_process(self, pil_image, lang, psm):
+        with self._checkout(lang) as api:
+            api.SetPageSegMode(tesserocr.PSM.AUTO if psm is None else psm)
+            api.SetImage(pil_image)
+            return api.GetUTF8Text()
+
+    def image_to_string(self, pil_image, lang="khm", psm=None):
+        '''Drop-in replacement for pytesseract.image_to_string(pil_image, lang=lang)'''
+        if self.in_process_enabled(lang):
+            try:
+                return self._recognize_in_process(pil_image, lang, psm)
+            except Exception as e:
+                self._in_process_failed(lang, e)
+
+        self._count("subprocess_calls")
+        config = "" if psm is None else f"--psm {int(psm)}"
+        return pytesseract.image_to_string(pil_image, lang=lang, config=config)
+
+    def _text_conf_in_process(self, pil_image, lang, psm):
+        with self._checkout(lang) as api:
+            api.SetPageSegMode(tesserocr.PSM.AUTO if psm is None else psm)
+            api.SetImage(pil_image)
+            text = api.GetUTF8Text()
+            return text, float(api.MeanTextConf()) if text.strip() else 0.0
+
+    def _text_conf_subprocess(self, pil_image, lang, psm):
+        config = "" if psm is None else f"--psm {int(psm)}"
+        data = pytesseract.image_to_data(pil_image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+        lines, confs = {}, []
+        for i, level in enumerate(data["level"]):
+            text = str(data["text"][i]).strip()
+            if int(level) != 5 or not text:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append(text)
+            if float(data["conf"][i]) >= 0:
+                confs.append(float(data["conf"][i]))
+        text = "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+        return text, sum(confs) / len(confs) if confs else 0.0
+
+    def image_to_text_conf(self, pil_image, lang="khm", psm=None):
+        '''Recognise a crop and return (text, mean word confidence 0-100; 0 when nothing was read)'''
+        if self.in_process_enabled(lang):
+            try:
+                return self._text_conf_in_process(pil_image, lang, psm)
+            except Exception as e:
+                self._in_process_failed(lang, e)
+
+        self._count("subprocess_calls")
+        return self._text_conf_subprocess(pil_image, lang, psm)
+
+    def _lines_in_process(self, pil_image, lang, psm):
+        level = tesserocr.RIL.TEXTLINE
+        lines = []
+        with self._checkout(lang) as api:
+            api.SetPageSegMode(tesserocr.PSM.AUTO if psm is None else psm)
+            api.SetImage(pil_image)
+            api.Recognize()
+            for it in tesserocr.iterate_level(api.GetIterator(), level):
+                bbox = it.BoundingBox(level)
+                if bbox is None:
+                    continue
+                lines.append({"text": it.GetUTF8Text(level), "bbox": tuple(bbox), "conf": it.Confidence(level)})
+        return lines
+
+    def _lines_subprocess(self, pil_image, lang, psm):
+        config = "" if psm is None else f"--psm {int(psm)}"
+        data = pytesseract.image_to_data(pil_image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+
+        # Group word-level rows (level 5) into their (block, paragraph, line)
+        grouped = {}
+        for i, level in enumerate(data["level"]):
+            if int(level) != 5 or not str(data["text"][i]).strip():
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            x1, y1 = data["left"][i], data["top"][i]
+            x2, y2 = x1 + data["width"][i], y1 + data["height"][i]
+            line = grouped.setdefault(key, {"words": [], "bbox": [x1, y1, x2, y2], "confs": []})
+            line["words"].append((x1, data["text"][i]))
+            line["confs"].append(float(data["conf"][i]))
+            bbox = line["bbox"]
+            line["bbox"] = [min(bbox[0], x1), min(bbox[1], y1), max(bbox[2], x2), max(bbox[3], y2)]
+
+        lines = []
+        for line in grouped.values():
+            words = [text for _, text in sorted(line["words"])]
+            lines.append({
+                "text": " ".join(words),
+                "bbox": tuple(line["bbox"]),
+                "conf": sum(line["confs"]) / len(line["confs"]),
+            })
+        return lines
+
+    def image_to_lines(self, pil_image, lang="khm", psm=None):
+        '''Line-level recognition: list of {"text", "bbox": (x1, y1, x2, y2), "conf"} in image space'''
+        if self.in_process_enabled(lang):
+            try:
+                return self._lines_in_process(pil_image, lang, psm)
+            except Exception as e:
+                self._in_process_failed(lang, e)
+
+        self._count("subprocess_calls")
+        return self._lines_subprocess(pil_image, lang, psm)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pool_size"] = self.size
+            stats["backend"] = "tesserocr" if tesserocr is not None and self.backend != "subprocess" else "subprocess"
+            stats["engines_loaded"] = dict(self._created)
+        calls = stats["warm_hits"] + stats["cold_starts"] + stats["subprocess_calls"]
+        stats["total_calls"] = calls
+        stats["warm_hit_ratio"] = round(stats["warm_hits"] / calls, 4) if calls else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                while not idle.empty():
+                    idle.get_nowait().End()
+            self._idle.clear()
+            self._created.clear()
+
+
+_engine_pool = None
+_engine_pool_lock = threading.Lock()
+
+def get_engine_pool():
+    global _engine_pool
+    with _engine_pool_lock:
+        if _engine_pool is None:
+            _engine_pool = TesseractEnginePool()
+        return _engine_pool
+
+def configure_engine_pool(size=None, backend=None):
+    '''Replace the shared pool, e.g. to change its size at runtime'''
+    global _engine_pool
+    with _engine_pool_lock:
+        if _engine_pool is not None:
+            _engine_pool.close()
+        _engine_pool = TesseractEnginePool(
+            size=OCR_ENGINE_POOL_SIZE if size is None else size,
+            backend=OCR_ENGINE_BACKEND if backend is None else backend,
+        )
+        return _engine_pool
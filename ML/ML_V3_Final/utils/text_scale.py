@@ -0,0 +1,69 @@
+import os
+import numpy as np, cv2
+
+
+# ---- Text Height Normalization Configuration ----
+# OCR_TEXT_HEIGHT_TARGET    : glyph height (pixels) every crop is resampled to before thresholding; 0 disables
+# OCR_TEXT_HEIGHT_TOLERANCE : relative deviation from the target that is left alone (0.25 keeps 23-37 px text as is for 28)
+OCR_TEXT_HEIGHT_TARGET = int(os.getenv("OCR_TEXT_HEIGHT_TARGET", "28"))
+OCR_TEXT_HEIGHT_TOLERANCE = float(os.getenv("OCR_TEXT_HEIGHT_TOLERANCE", "0.25"))
+
+# Estimation runs on a subsampled crop whose longer side is at most this many pixels
+ESTIMATE_MAX_SIDE = 1024
+MIN_SCALE, MAX_SCALE = 0.25, 4.0
+
+
+'''Text height of a grayscale crop
+    1. Otsu on a (subsampled) copy of the crop, ink taken as the minority class so light text on
+       a dark background works too
+    2. Connected components of the ink; specks (< 3 px tall or < 6 px area) and ruling lines /
+       box borders (wider than 90% of the crop) are ignored
+    3. The median component height is the text height: glyph bodies dominate, so stacked Khmer
+       subscripts and vowel signs hardly move it
+    - Returns the height in crop pixels, or None when there is nothing that looks like text
+'''
+def estimate_text_height(gray_crop):
+    height, width = gray_crop.shape[:2]
+    step = max(1, -(-max(height, width) // ESTIMATE_MAX_SIDE))
+    sample = np.ascontiguousarray(gray_crop[::step, ::step])
+    if sample.size == 0:
+        return None
+
+    _, ink = cv2.threshold(sample, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    if np.count_nonzero(ink) > ink.size // 2:
+        ink = cv2.bitwise_not(ink)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+
+    stats = stats[1:]  # label 0 is the background
+    keep = ((stats[:, cv2.CC_STAT_HEIGHT] * step >= 3)
+            & (stats[:, cv2.CC_STAT_AREA] * step * step >= 6)
+            & (stats[:, cv2.CC_STAT_WIDTH] < 0.9 * sample.shape[1]))
+    if count <= 1 or not keep.any():
+        return None
+    return float(np.median(stats[keep, cv2.CC_STAT_HEIGHT])) * step
+
+'''Resample factor that brings the text of a crop to OCR_TEXT_HEIGHT_TARGET
+    - 1.0 when normalization is disabled, no text was found, or the text is already within tolerance
+    - Otherwise target / estimated height, limited to [MIN_SCALE, MAX_SCALE]
+'''
+def text_scale(gray_crop, target=None, tolerance=None):
+    target = OCR_TEXT_HEIGHT_TARGET if target is None else target
+    tolerance = OCR_TEXT_HEIGHT_TOLERANCE if tolerance is None else tolerance
+    if target <= 0:
+        return 1.0
+    text_height = estimate_text_height(gray_crop)
+    if not text_height:
+        return 1.0
+    scale = target / text_height
+    if abs(scale - 1.0) <= tolerance:
+        return 1.0
+    return min(MAX_SCALE, max(MIN_SCALE, scale))
+
+def rescale(gray, scale):
+    if scale == 1.0:
+        return gray
+    height, width = gray.shape[:2]
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    # INTER_AREA averages when shrinking, INTER_CUBIC keeps strokes smooth when enlarging
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+    return cv2.resize(np.ascontiguousarray(gray), size, interpolation=interpolation)
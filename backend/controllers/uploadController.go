@@ -3,7 +3,9 @@ package controllers
 import (
 	"bytes"
 	"context"
+	"crypto/sha256"
 	"encoding/base64"
+	"encoding/hex"
 	"encoding/json"
 	"fmt"
 	"image"
@@ -225,6 +227,16 @@ func UploadImages(imageCollection *mongo.Collection) gin.HandlerFunc {
 			}
 		}
 
+		// Batched uploads from the ML server carry one annotation list per file name
+		annotationsByFileStr := c.PostForm("annotations_by_file")
+		var annotationsByFile map[string][]models.Annotation
+		if annotationsByFileStr != "" {
+			if err := json.Unmarshal([]byte(annotationsByFileStr), &annotationsByFile); err != nil {
+				c.JSON(http.StatusBadRequest, gin.H{"error": "Invalid annotations_by_file JSON"})
+				return
+			}
+		}
+
 		tempDir := "uploads/temp/"
 		os.MkdirAll(tempDir, os.ModePerm)
 
@@ -237,6 +249,10 @@ func UploadImages(imageCollection *mongo.Collection) gin.HandlerFunc {
 
 		for _, file := range files {
 			go func(file *multipart.FileHeader) {
+				annotations := annotations
+				if fileAnnotations, ok := annotationsByFile[file.Filename]; ok {
+					annotations = fileAnnotations
+				}
 				timestamp := time.Now().UnixNano()
 				tempPath := filepath.Join(tempDir, fmt.Sprintf("%d_%s", timestamp, file.Filename))
 				if err := c.SaveUploadedFile(file, tempPath); err != nil {
@@ -256,17 +272,19 @@ func UploadImages(imageCollection *mongo.Collection) gin.HandlerFunc {
 				imgConfig.Width = 0
 				imgConfig.Height = 0
 			}
+			contentHash := contentHashOf(data)
 			base64Str := "data:image/jpeg;base64," + base64.StdEncoding.EncodeToString(data)				// **Check if image already exists**
 				filter := bson.M{"project_id": projectID, "name": file.Filename}
 				update := bson.M{
 					"$set": bson.M{
-						"path":        tempPath,
-						"base64":      base64Str,
-						"width":       imgConfig.Width,
-						"height":      imgConfig.Height,
-						"annotations": annotations, // replace or merge
-						"status":      "pending",
-						"updated_at":  time.Now(),
+						"path":         tempPath,
+						"base64":       base64Str,
+						"width":        imgConfig.Width,
+						"height":       imgConfig.Height,
+						"content_hash": contentHash,
+						"annotations":  annotations, // replace or merge
+						"status":       "pending",
+						"updated_at":   time.Now(),
 					},
 					"$setOnInsert": bson.M{
 						"project_id": projectID,
@@ -314,6 +332,13 @@ func UploadImages(imageCollection *mongo.Collection) gin.HandlerFunc {
 	}
 }
 
+// contentHashOf returns the hex SHA-256 of the image bytes; the ML server uses the same hash
+// to attach annotations without re-uploading the file
+func contentHashOf(data []byte) string {
+	sum := sha256.Sum256(data)
+	return hex.EncodeToString(sum[:])
+}
+
 // helper to convert annotations slice to JSON
 func annotationsToJSON(annotations []models.Annotation) json.RawMessage {
 	b, _ := json.Marshal(annotations)
@@ -457,3 +482,76 @@ func SaveGroundTruth(imageCollection *mongo.Collection) gin.HandlerFunc {
 // 		})
 // 	}
 // }
+
+// AttachAnnotationsByHash stores annotations for an image the backend already has, identified by
+// the SHA-256 of its bytes, so the ML server doesn't have to upload the file again.
+// Responds 404 with "known": false when no image of the project has that hash; the caller then
+// falls back to /images/upload with the bytes.
+func AttachAnnotationsByHash(imageCollection *mongo.Collection) gin.HandlerFunc {
+	return func(c *gin.Context) {
+		var req struct {
+			ProjectID   string              `json:"project_id"`
+			Filename    string              `json:"filename"`
+			ContentHash string              `json:"content_hash"`
+			Annotations []models.Annotation `json:"annotations"`
+		}
+		if err := c.ShouldBindJSON(&req); err != nil {
+			c.JSON(http.StatusBadRequest, gin.H{"error": "Invalid request", "details": err.Error()})
+			return
+		}
+		if req.ContentHash == "" || req.Filename == "" {
+			c.JSON(http.StatusBadRequest, gin.H{"error": "Missing content_hash or filename"})
+			return
+		}
+		projectID, err := primitive.ObjectIDFromHex(req.ProjectID)
+		if err != nil {
+			c.JSON(http.StatusBadRequest, gin.H{"error": "Invalid project_id"})
+			return
+		}
+
+		// Prefer the image with the same name; any image of the project with the same bytes will do
+		var existing models.Image
+		err = imageCollection.FindOne(context.Background(), bson.M{
+			"project_id": projectID, "name": req.Filename, "content_hash": req.ContentHash,
+		}).Decode(&existing)
+		if err != nil {
+			err = imageCollection.FindOne(context.Background(), bson.M{
+				"project_id": projectID, "content_hash": req.ContentHash,
+			}).Decode(&existing)
+		}
+		if err != nil {
+			c.JSON(http.StatusNotFound, gin.H{"error": "Unknown content hash", "known": false})
+			return
+		}
+
+		filter := bson.M{"project_id": projectID, "name": req.Filename}
+		update := bson.M{
+			"$set": bson.M{
+				"path":         existing.Path,
+				"base64":       existing.Base64,
+				"width":        existing.Width,
+				"height":       existing.Height,
+				"content_hash": req.ContentHash,
+				"annotations":  req.Annotations,
+				"status":       "pending",
+				"updated_at":   time.Now(),
+			},
+			"$setOnInsert": bson.M{
+				"project_id": projectID,
+				"name":       req.Filename,
+				"created_at": time.Now(),
+			},
+		}
+		opts := options.Update().SetUpsert(true)
+		if _, err := imageCollection.UpdateOne(context.Background(), filter, update, opts); err != nil {
+			c.JSON(http.StatusInternalServerError, gin.H{"error": "Failed to update image", "details": err.Error()})
+			return
+		}
+
+		c.JSON(http.StatusOK, gin.H{
+			"known":       true,
+			"filename":    req.Filename,
+			"annotations": len(req.Annotations),
+		})
+	}
+}
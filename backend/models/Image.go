@@ -54,6 +54,7 @@ type Image struct {
     Base64      string             `bson:"base64" json:"base64"`
     Width       int                `bson:"width" json:"width"`
     Height      int                `bson:"height" json:"height"`
+    ContentHash string             `bson:"content_hash,omitempty" json:"content_hash,omitempty"`
     Status      string             `bson:"status" json:"status"`
     Annotations []Annotation       `bson:"annotations" json:"annotations"`
     Meta        Meta               `bson:"meta" json:"meta"`
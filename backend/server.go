@@ -97,6 +97,7 @@ func main() {
 	{
 		imageGroup.POST("/upload", controllers.UploadImages(imageCollection))
 		imageGroup.POST("/save-groundtruth", controllers.SaveGroundTruth(imageCollection))
+		imageGroup.POST("/annotate-by-hash", controllers.AttachAnnotationsByHash(imageCollection))
 	}
 
 	// Project routes